@@ -0,0 +1 @@
+# Init benchmarks package
\ No newline at end of file
@@ -0,0 +1,327 @@
+"""
+解析器效能測試：以合成對帳單與截圖分別計時各階段，結果可存成 JSON 並與先前的基準比較。
+
+    python -m benchmarks.bench_parsers                          # small + medium
+    python -m benchmarks.bench_parsers --preset large --output base.json
+    python -m benchmarks.bench_parsers --compare base.json      # 變慢超過門檻時 exit code 為 1
+
+每個案例在獨立的子程序中執行，峰值 RSS 只反映該案例。
+先執行一次暖機 (不計時)，各階段再取 --repeat 次中最快的一次 (OCR 模型載入只計一次)。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from unittest import mock
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from benchmarks.synthetic import make_pdf, make_screenshot, PDF_PASSWORD
+
+# (交易筆數, 頁數)
+PRESETS = {
+    "small": [(10, 1)],
+    "medium": [(200, 20)],
+    "large": [(2000, 200)],
+}
+LAYOUTS = ("post", "tbb", "generic")
+
+# generic 版面使用的設定 (固定於此，不受 banks_config.json 修改影響，結果才能跨 commit 比較)
+GENERIC_CONFIG = {
+    "regex_pattern": r"(\d{3,4}/\d{2}/\d{2})\s+([^\s\d]+)\s+([\d,]+)(?=\s|$)",
+    "groups": {"date": 1, "summary": 2, "amount": 3, "time": None, "ref": None},
+    "expense_keywords": ["支出", "提款", "扣款"],
+    "account_pattern": r"帳號[:\s]*\d+(\d{5})",
+    "account_group": 1,
+}
+
+# 比較時低於此差距 (秒) 的變化視為誤差
+NOISE_FLOOR = 0.005
+
+def _get_parser(layout):
+    import parsers
+    if layout == "post":
+        return parsers.get_parser("700")
+    if layout == "tbb":
+        return parsers.get_parser("050")
+    return parsers.GenericParser(GENERIC_CONFIG)
+
+def _rss_mb():
+    """回傳 (目前, 峰值) RSS (MB)，不支援的平台為 None"""
+    current = peak = None
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 單位為 KB，macOS 為 bytes
+        peak = maxrss / 1024 / 1024 if sys.platform == "darwin" else maxrss / 1024
+    return current, peak
+
+def _best(runs):
+    """各階段取最快的一次"""
+    return {stage: round(min(run[stage] for run in runs), 6) for stage in runs[0]}
+
+def _time_pdf(parser, path):
+    """單次計時：pdf_open、text_extraction、regex_extraction (不含前兩者) 與完整 parse_pdf"""
+    import pdfplumber
+    from parsers.base import iter_page_texts
+
+    open_time = 0.0
+    original_open = pdfplumber.open
+
+    def timed_open(*args, **kwargs):
+        nonlocal open_time
+        start = time.perf_counter()
+        try:
+            return original_open(*args, **kwargs)
+        finally:
+            open_time += time.perf_counter() - start
+
+    with open(path, "rb") as f, mock.patch.object(pdfplumber, "open", timed_open):
+        start = time.perf_counter()
+        texts = list(iter_page_texts(f, PDF_PASSWORD))
+        extract_time = time.perf_counter() - start
+
+    # 以已擷取的文字取代 PDF 讀取，只計算比對 / 切區塊的時間
+    module = sys.modules[type(parser).__module__]
+    with mock.patch.object(module, "iter_page_texts", lambda stream, password: iter(texts)):
+        start = time.perf_counter()
+        list(parser.iter_transactions(None, PDF_PASSWORD, {}))
+        regex_time = time.perf_counter() - start
+
+    with open(path, "rb") as f:
+        start = time.perf_counter()
+        _, transactions = parser.parse_pdf(f, PDF_PASSWORD)
+        total_time = time.perf_counter() - start
+
+    return {
+        "pdf_open": open_time,
+        "text_extraction": extract_time - open_time,
+        "regex_extraction": regex_time,
+        "total": total_time,
+    }, len(transactions), len(texts)
+
+def _run_pdf_case(case, repeat):
+    parser = _get_parser(case["layout"])
+    baseline_rss, _ = _rss_mb()
+    # 第一次執行會載入字型 CMap 等資料，不列入計時
+    _time_pdf(parser, case["path"])
+    runs = []
+    for _ in range(repeat):
+        stages, count, pages = _time_pdf(parser, case["path"])
+        runs.append(stages)
+    stages = _best(runs)
+    _, peak_rss = _rss_mb()
+    return {
+        "transactions": count,
+        "pages": pages,
+        "stages": stages,
+        "throughput": {
+            "transactions_per_sec": round(count / stages["total"], 1) if stages["total"] else None,
+            "pages_per_sec": round(pages / stages["total"], 1) if stages["total"] else None,
+        },
+        "baseline_rss_mb": baseline_rss and round(baseline_rss, 1),
+        "peak_rss_mb": peak_rss and round(peak_rss, 1),
+    }
+
+def _run_ocr_case(case, repeat):
+    try:
+        import cv2  # noqa: F401
+        import easyocr  # noqa: F401
+    except ImportError as e:
+        return {"skipped": f"缺少套件 {e.name}"}
+    from parsers.utils import get_reader
+
+    parser = _get_parser(case["layout"])
+    if case.get("ocr_config"):
+        parser.ocr_config = {**(parser.ocr_config or {}), **case["ocr_config"]}
+    images = []
+    for path in case["paths"]:
+        with open(path, "rb") as f:
+            images.append(f.read())
+    baseline_rss, _ = _rss_mb()
+
+    start = time.perf_counter()
+    get_reader()
+    model_load = time.perf_counter() - start
+
+    # 第一次推論包含模型初始化，不列入計時
+    parser.recognize_batch([parser.preprocess_screenshot(image) for image in images])
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        processed = [parser.preprocess_screenshot(image) for image in images]
+        preprocess_time = time.perf_counter() - start
+        start = time.perf_counter()
+        parser.recognize_batch(processed)
+        inference_time = time.perf_counter() - start
+        runs.append({
+            "ocr_preprocess": preprocess_time,
+            "ocr_inference": inference_time,
+            "total": preprocess_time + inference_time,
+        })
+    stages = {"ocr_model_load": round(model_load, 6), **_best(runs)}
+    _, peak_rss = _rss_mb()
+    return {
+        "images": len(images),
+        "stages": stages,
+        "throughput": {
+            "images_per_sec": round(len(images) / stages["total"], 2) if stages["total"] else None,
+        },
+        "baseline_rss_mb": baseline_rss and round(baseline_rss, 1),
+        "peak_rss_mb": peak_rss and round(peak_rss, 1),
+    }
+
+def _run_case(case, repeat):
+    """子程序進入點"""
+    if case["kind"] == "ocr":
+        return _run_ocr_case(case, repeat)
+    return _run_pdf_case(case, repeat)
+
+def build_cases(workdir, layouts, sizes, screenshots, image_size, font_path, ocr_config=None):
+    """產生測試檔案，回傳案例列表"""
+    cases = []
+    for layout in layouts:
+        for transactions, pages in sizes:
+            data, pages = make_pdf(layout, transactions, pages, seed=transactions)
+            name = f"{layout}-{transactions}tx-{pages}p"
+            path = os.path.join(workdir, f"{name}.pdf")
+            with open(path, "wb") as f:
+                f.write(data)
+            cases.append({"name": name, "kind": "pdf", "layout": layout, "path": path})
+
+    if screenshots:
+        for layout in ("post", "tbb"):
+            name = f"ocr-{layout}-{screenshots}x{image_size[0]}x{image_size[1]}"
+            paths = []
+            for i in range(screenshots):
+                path = os.path.join(workdir, f"{name}-{i}.png")
+                with open(path, "wb") as f:
+                    f.write(make_screenshot(layout, image_size, seed=i, font_path=font_path))
+                paths.append(path)
+            cases.append({
+                "name": name, "kind": "ocr", "layout": layout, "paths": paths, "ocr_config": ocr_config,
+            })
+    return cases
+
+def run(cases, repeat):
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for case in cases:
+        print(f"執行 {case['name']} ...", file=sys.stderr)
+        # 每個案例一個新的子程序，峰值 RSS 才不會受前一個案例影響
+        with context.Pool(1) as pool:
+            results[case["name"]] = {
+                "kind": case["kind"], "layout": case["layout"],
+                **pool.apply(_run_case, (case, repeat)),
+            }
+    return results
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(results):
+    for name, result in results.items():
+        if "skipped" in result:
+            print(f"{name}: 略過 ({result['skipped']})")
+            continue
+        stages = " ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in result["stages"].items())
+        throughput = " ".join(f"{key}={value}" for key, value in result["throughput"].items())
+        print(f"{name}: {stages} | {throughput} | peak_rss={result['peak_rss_mb']}MB")
+
+def compare(baseline, results, threshold):
+    """逐階段與基準比較，回傳變慢超過 threshold (比例) 的項目數"""
+    regressions = 0
+    for name, result in results.items():
+        base = baseline.get("cases", {}).get(name)
+        if not base or "stages" not in base or "stages" not in result:
+            continue
+        for stage, seconds in result["stages"].items():
+            before = base["stages"].get(stage)
+            if before is None:
+                continue
+            change = (seconds - before) / before if before else 0.0
+            regressed = change > threshold and seconds - before > NOISE_FLOOR
+            regressions += regressed
+            mark = " ← 變慢" if regressed else ""
+            print(f"{name:<32} {stage:<18} {before * 1000:>10.1f}ms → {seconds * 1000:>10.1f}ms {change:>+8.1%}{mark}")
+    return regressions
+
+def _parse_size(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="解析器效能測試")
+    arg_parser.add_argument("--preset", default="small,medium",
+                            help=f"逗號分隔：{', '.join(PRESETS)} (預設 small,medium)")
+    arg_parser.add_argument("--transactions", type=int, help="自訂交易筆數 (取代 --preset)")
+    arg_parser.add_argument("--pages", type=int, default=1, help="自訂頁數 (單頁放不下時自動增加)")
+    arg_parser.add_argument("--layouts", default=",".join(LAYOUTS), help="逗號分隔：post, tbb, generic")
+    arg_parser.add_argument("--screenshots", type=int, default=8, help="每種版面的截圖張數，0 表示不測 OCR")
+    arg_parser.add_argument("--image-size", type=_parse_size, default=(720, 1280), help="截圖尺寸，如 720x1280")
+    arg_parser.add_argument("--font", help="繪製截圖用的字型檔 (需含中文字形)")
+    arg_parser.add_argument("--ocr-config", type=json.loads,
+                            help='覆寫截圖前處理設定 (JSON)，如 \'{"max_width": 720, "auto_crop": true}\'')
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--output", help="將結果寫入 JSON")
+    arg_parser.add_argument("--compare", help="與先前輸出的 JSON 比較")
+    arg_parser.add_argument("--threshold", type=float, default=0.15, help="變慢超過此比例視為退步 (預設 0.15)")
+    args = arg_parser.parse_args(argv)
+
+    if args.transactions is not None:
+        sizes = [(args.transactions, args.pages)]
+    else:
+        sizes = [size for preset in args.preset.split(",") for size in PRESETS[preset.strip()]]
+    layouts = [layout.strip() for layout in args.layouts.split(",") if layout.strip()]
+
+    with tempfile.TemporaryDirectory(prefix="tuql-bench-") as workdir:
+        cases = build_cases(workdir, layouts, sizes, args.screenshots, args.image_size, args.font,
+                            args.ocr_config)
+        results = run(cases, args.repeat)
+
+    print_results(results)
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": args.repeat,
+        },
+        "cases": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n與 {baseline['meta'].get('commit')} 比較：")
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print(f"{regressions} 個階段變慢超過 {args.threshold:.0%}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
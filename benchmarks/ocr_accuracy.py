@@ -0,0 +1,96 @@
+"""
+截圖辨識準確度比對：以真實截圖的參考集，比較目前的前處理設定與未縮小、未裁切的原始處理。
+
+    python -m benchmarks.ocr_accuracy path/to/reference
+
+參考集目錄中每張截圖 (png / jpg) 需有同名的 JSON：
+    {"bank_code": "050", "expected": {"date": "2023-05-20", "amount": 1200.0, ...}}
+只比對 expected 中列出的欄位。目前設定的欄位準確度低於原始處理時 exit code 為 1。
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+# 比較基準：整張原圖、不裁切、使用偵測模型
+RAW_CONFIG = {"max_width": 0, "crop": None, "auto_crop": False, "lines": None}
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+def load_reference(directory):
+    """回傳 [(名稱, 銀行代碼, 影像 bytes, 預期欄位)]"""
+    samples = []
+    for path in sorted(glob.glob(os.path.join(directory, "*"))):
+        stem, ext = os.path.splitext(path)
+        if ext.lower() not in IMAGE_EXTENSIONS or not os.path.exists(f"{stem}.json"):
+            continue
+        with open(f"{stem}.json", encoding="utf-8") as f:
+            label = json.load(f)
+        with open(path, "rb") as f:
+            samples.append((os.path.basename(path), str(label["bank_code"]), f.read(), label["expected"]))
+    return samples
+
+def evaluate(samples, ocr_config=None):
+    """依序辨識每張截圖，回傳 (正確欄位數, 欄位總數, 各張耗時 (秒), 錯誤明細)"""
+    import parser
+
+    correct = total = 0
+    timings, mistakes = [], []
+    for name, bank_code, content, expected in samples:
+        bank_parser = parser.get_parser(bank_code)
+        saved = bank_parser.ocr_config
+        if ocr_config is not None:
+            bank_parser.ocr_config = {**(saved or {}), **ocr_config}
+        try:
+            start = time.perf_counter()
+            try:
+                result = bank_parser.recognize_screenshot(content)
+            except Exception as e:
+                result = {"error": str(e)}
+            timings.append(time.perf_counter() - start)
+        finally:
+            bank_parser.ocr_config = saved
+
+        for field, value in expected.items():
+            total += 1
+            if result.get(field) == value:
+                correct += 1
+            else:
+                mistakes.append((name, field, value, result.get(field, result.get("error"))))
+    return correct, total, timings, mistakes
+
+def _report(label, correct, total, timings):
+    accuracy = correct / total if total else 0.0
+    average = sum(timings) / len(timings) if timings else 0.0
+    print(f"{label:<8} 欄位準確度 {correct}/{total} ({accuracy:.1%})，平均每張 {average * 1000:.0f}ms")
+    return accuracy
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="截圖辨識準確度比對")
+    arg_parser.add_argument("reference", help="參考集目錄")
+    arg_parser.add_argument("--ocr-config", type=json.loads, help="覆寫目前的前處理設定 (JSON)")
+    arg_parser.add_argument("--verbose", action="store_true", help="列出辨識錯誤的欄位")
+    args = arg_parser.parse_args(argv)
+
+    samples = load_reference(args.reference)
+    if not samples:
+        print("參考集中沒有可用的截圖")
+        return 1
+
+    from parsers.utils import get_reader
+    get_reader()
+    # 第一次推論包含模型初始化，不列入計時
+    evaluate(samples[:1])
+
+    raw = evaluate(samples, RAW_CONFIG)
+    current = evaluate(samples, args.ocr_config)
+    raw_accuracy = _report("原始", *raw[:3])
+    current_accuracy = _report("目前設定", *current[:3])
+    if args.verbose:
+        for name, field, expected, actual in current[3]:
+            print(f"  {name} {field}: 預期 {expected!r}，辨識為 {actual!r}")
+    return 1 if current_accuracy < raw_accuracy else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
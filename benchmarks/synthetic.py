@@ -0,0 +1,149 @@
+"""
+產生測試用的合成對帳單 PDF 與交易截圖 (內容為隨機資料，版面模仿各銀行的格式)。
+
+PDF 使用 reportlab 內建的 STSong-Light 字型 (不需字型檔，擷取出的文字為正確的 Unicode)；
+截圖需要含中文字形的字型檔才能正確繪出中文，未指定時使用 Pillow 的預設字型。
+"""
+import io
+import math
+import random
+from datetime import date, timedelta
+
+PDF_FONT = "STSong-Light"
+# 產生的 PDF 不加密 (pdfminer 無法正確還原加密 PDF 中 CID 字型的文字)
+PDF_PASSWORD = ""
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842   # A4 (pt)
+MARGIN = 40
+LINE_HEIGHT = 12
+
+POST_SUMMARIES = ["薪資", "利息", "轉入", "提款", "跨行轉出", "消費扣款", "存入", "繳費"]
+TBB_CATEGORIES = ["跨行轉帳", "自行轉帳", "全國繳費"]
+GENERIC_SUMMARIES = ["存款", "提款", "扣款", "轉帳", "支出", "利息"]
+
+# 每筆交易佔用的行數
+LINES_PER_TX = {"post": 1, "tbb": 6, "generic": 1}
+
+def _roc(day):
+    return f"{day.year - 1911:03d}/{day.month:02d}/{day.day:02d}"
+
+def _iter_days(rng, count, start=date(2023, 1, 1)):
+    day = start
+    for _ in range(count):
+        day += timedelta(days=rng.randint(0, 1))
+        yield day
+
+def _amount(rng):
+    return f"{rng.randint(1, 200000):,}"
+
+def _post_lines(rng, count):
+    for i, day in enumerate(_iter_days(rng, count)):
+        yield (f"{_roc(day)} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d} "
+               f"{rng.choice(POST_SUMMARIES)} R{i:07d} {_amount(rng)}")
+
+def _tbb_lines(rng, count):
+    for i, day in enumerate(_iter_days(rng, count)):
+        category = rng.choice(TBB_CATEGORIES)
+        yield f"轉出帳號: 0501234567{rng.randint(0, 99):02d}01"
+        yield f"{_roc(day)} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}"
+        yield category
+        if category == "跨行轉帳":
+            yield f"轉入帳號: 822{rng.randint(0, 10**10):010d}"
+            yield f"轉帳金額: ${_amount(rng)}"
+        elif category == "自行轉帳":
+            yield f"轉入: 050{rng.randint(0, 10**10):010d}"
+            yield f"轉帳金額: ${_amount(rng)}"
+        else:
+            yield f"銷帳編號: B{i:09d}"
+            yield f"繳費金額: ${_amount(rng)}"
+        yield ""
+
+def _generic_lines(rng, count):
+    for day in _iter_days(rng, count):
+        yield f"{day.year}/{day.month:02d}/{day.day:02d} {rng.choice(GENERIC_SUMMARIES)} {_amount(rng)}"
+
+_LINE_GENERATORS = {"post": _post_lines, "tbb": _tbb_lines, "generic": _generic_lines}
+_HEADERS = {
+    "post": ["中華郵政 存簿交易明細", "帳 號: 0001234-0567890"],
+    "tbb": ["臺灣中小企業銀行 網路銀行交易明細"],
+    "generic": ["交易明細", "帳號: 05000012345678"],
+}
+
+def page_capacity(layout):
+    """單頁可容納的交易筆數"""
+    lines = (PAGE_HEIGHT - 2 * MARGIN) // LINE_HEIGHT - len(_HEADERS[layout]) - 1
+    return lines // LINES_PER_TX[layout]
+
+def make_pdf(layout, transactions, pages=1, seed=0):
+    """
+    產生合成對帳單，回傳 (PDF bytes, 實際頁數)。
+    layout: 'post' / 'tbb' / 'generic'；交易平均分配到各頁，單頁放不下時自動增加頁數。
+    """
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+    from reportlab.pdfgen import canvas
+
+    if PDF_FONT not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(UnicodeCIDFont(PDF_FONT))
+
+    rng = random.Random(seed)
+    pages = max(pages, math.ceil(transactions / page_capacity(layout)), 1)
+    per_page = math.ceil(transactions / pages) if transactions else 0
+    lines = _LINE_GENERATORS[layout](rng, transactions)
+
+    buf = io.BytesIO()
+    pdf = canvas.Canvas(buf, pagesize=(PAGE_WIDTH, PAGE_HEIGHT))
+    remaining = transactions
+    for page in range(pages):
+        pdf.setFont(PDF_FONT, 9)
+        y = PAGE_HEIGHT - MARGIN
+        for header in _HEADERS[layout] + [f"第 {page + 1} 頁"]:
+            pdf.drawString(MARGIN, y, header)
+            y -= LINE_HEIGHT
+        for _ in range(min(per_page, remaining) * LINES_PER_TX[layout]):
+            pdf.drawString(MARGIN, y, next(lines))
+            y -= LINE_HEIGHT
+        remaining -= min(per_page, remaining)
+        pdf.showPage()
+    pdf.save()
+    return buf.getvalue(), pages
+
+def _screenshot_lines(layout, rng):
+    day = date(2023, 1, 1) + timedelta(days=rng.randint(0, 364))
+    clock = f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"
+    if layout == "tbb":
+        return [
+            "交易明細內容",
+            f"{day.year}/{day.month:02d}/{day.day:02d} {clock[:5]}",
+            f"金額 {_amount(rng)}",
+            f"摘要 {rng.choice(TBB_CATEGORIES)}",
+            f"收付行 T{rng.randint(0, 10**12):012d}",
+        ]
+    return [
+        f"帳號 0001234-05{rng.randint(0, 999):03d}",
+        f"{rng.choice(POST_SUMMARIES)} {_amount(rng)}",
+        "交易時間",
+        f"{_roc(day)} {clock}",
+        "交易序號",
+        f"序號 R{rng.randint(0, 10**7):07d}",
+    ]
+
+def make_screenshot(layout, size=(720, 1280), seed=0, font_path=None):
+    """產生模仿手機 App 交易明細的截圖，回傳 PNG bytes"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    rng = random.Random(seed)
+    width, height = size
+    font_size = max(height // 40, 12)
+    font = ImageFont.truetype(font_path, font_size) if font_path else ImageFont.load_default(font_size)
+
+    image = Image.new("RGB", size, (245, 245, 245))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, width, height // 12), fill=(30, 90, 160))
+    y = height // 8
+    for line in _screenshot_lines(layout, rng):
+        draw.text((width // 16, y), line, fill=(20, 20, 20), font=font)
+        y += font_size * 2
+
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
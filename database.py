@@ -1,27 +1,514 @@
+import asyncio
+import hashlib
+import os
+import queue
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import metrics
 
 DB_NAME = "finance.db"
 
-def get_db_connection():
-    """建立並回傳設有 row_factory 的資料庫連線"""
-    conn = sqlite3.connect(DB_NAME)
+# 連線池大小；同時也是執行 DB 工作的 thread 數量
+POOL_SIZE = int(os.environ.get("TUQL_DB_POOL_SIZE", "4"))
+
+# 每條連線建立時套用一次
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA cache_size = -16000",      # 約 16 MB page cache
+    "PRAGMA mmap_size = 268435456",    # 256 MB
+    "PRAGMA temp_store = MEMORY",
+)
+
+# 資料表 (新資料庫直接建立為最新結構)
+SCHEMA_TABLES = """
+CREATE TABLE IF NOT EXISTS accounts (
+    account_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account_name TEXT NOT NULL UNIQUE,
+    account_number TEXT NOT NULL,
+    bank_code TEXT NOT NULL,
+    initial_balance REAL DEFAULT 0.0
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account_id INTEGER NOT NULL,
+    trans_date TEXT NOT NULL,  -- ISO 'YYYY-MM-DD'
+    trans_time TEXT,           -- 'HH:MM:SS'
+    summary TEXT,
+    ref_no TEXT,
+    amount REAL NOT NULL,
+    trace_hash BLOB UNIQUE NOT NULL,  -- 16 bytes，見 transaction_service.compute_transaction_hash
+    trans_day INTEGER GENERATED ALWAYS AS (CAST(replace(trans_date, '-', '') AS INTEGER)) VIRTUAL,
+    FOREIGN KEY (account_id) REFERENCES accounts(account_id) ON DELETE CASCADE
+);
+-- 每個帳戶的交易彙總 (由下方 trigger 增量維護)，帳戶列表不需再掃描整張 transactions
+CREATE TABLE IF NOT EXISTS account_balances (
+    account_id INTEGER PRIMARY KEY,
+    total_amount REAL NOT NULL DEFAULT 0,
+    tx_count INTEGER NOT NULL DEFAULT 0,
+    last_trans_date TEXT
+);
+-- 月份 x 帳戶 x 摘要 x 收/支 的彙總 (由下方 trigger 增量維護)，統計報表不需掃描明細
+CREATE TABLE IF NOT EXISTS monthly_stats (
+    month INTEGER NOT NULL,          -- yyyymm
+    account_id INTEGER NOT NULL,
+    summary TEXT NOT NULL,
+    is_income INTEGER NOT NULL,      -- amount >= 0
+    tx_count INTEGER NOT NULL DEFAULT 0,
+    total_amount REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (month, account_id, summary, is_income)
+) WITHOUT ROWID;
+-- 摘要與序號的全文檢索 (trigram 分詞，中文可做任意子字串比對)，內容取自 transactions
+CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+    summary, ref_no,
+    content='transactions', content_rowid='transaction_id',
+    tokenize='trigram'
+);
+-- 每一列最後一次異動的紀錄 (由下方 trigger 維護)；MAX(change_id) 即為資料版本，
+-- 供 ETag 與 since=<change_id> 差異同步使用。同一列只保留最新一筆。
+CREATE TABLE IF NOT EXISTS change_log (
+    change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL,
+    row_id INTEGER NOT NULL,
+    op TEXT NOT NULL,               -- 'upsert' | 'delete'
+    UNIQUE (table_name, row_id)
+);
+-- 匯入預覽：解析結果暫存於伺服器端，確認匯入時只需傳回 token 與修改的部分
+CREATE TABLE IF NOT EXISTS import_previews (
+    preview_token TEXT PRIMARY KEY,
+    account_id INTEGER NOT NULL,
+    rows TEXT NOT NULL,             -- JSON: 每筆為 prepare_batch_row 的欄位 (不含 account_id，雜湊為 hex)，無效資料為 null
+    created_at INTEGER NOT NULL,    -- unix time
+    FOREIGN KEY (account_id) REFERENCES accounts (account_id) ON DELETE CASCADE
+);
+-- 背景匯入工作的佇列 (依 rowid 先進先出)，進度與結果也記錄於此
+CREATE TABLE IF NOT EXISTS import_jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,             -- 'pdf' | 'ocr'
+    status TEXT NOT NULL,           -- queued / running / succeeded / failed / cancelled
+    stage TEXT,                     -- 目前階段：parse / ocr / preview / save
+    done INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    account_id INTEGER,
+    bank_code TEXT NOT NULL,
+    files TEXT NOT NULL,            -- JSON: [{"filename", "path", "digest"}]
+    params TEXT,                    -- JSON: 工作參數 (不含密碼，密碼只保存在記憶體)，工作結束後清除
+    result TEXT,                    -- JSON
+    error TEXT,
+    created_at INTEGER NOT NULL,    -- unix time
+    started_at INTEGER,
+    finished_at INTEGER
+);
+"""
+
+# 索引與 trigger (於 migration 之後建立，確保欄位皆已存在)
+SCHEMA_INDEXES = """
+-- 列表查詢 (依帳戶/日期範圍 + keyset 分頁) 皆可走索引範圍掃描
+CREATE INDEX IF NOT EXISTS idx_transactions_account_day
+    ON transactions(account_id, trans_day, trans_time);
+CREATE INDEX IF NOT EXISTS idx_transactions_day
+    ON transactions(trans_day, trans_time);
+-- 匯入 worker 取出下一個排隊中的工作
+CREATE INDEX IF NOT EXISTS idx_import_jobs_status ON import_jobs(status);
+
+CREATE TRIGGER IF NOT EXISTS trg_accounts_insert_balance AFTER INSERT ON accounts
+BEGIN
+    INSERT OR IGNORE INTO account_balances (account_id) VALUES (NEW.account_id);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_accounts_delete_balance AFTER DELETE ON accounts
+BEGIN
+    DELETE FROM account_balances WHERE account_id = OLD.account_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_transactions_insert_balance AFTER INSERT ON transactions
+BEGIN
+    INSERT OR IGNORE INTO account_balances (account_id) VALUES (NEW.account_id);
+    UPDATE account_balances
+    SET total_amount = total_amount + NEW.amount,
+        tx_count = tx_count + 1,
+        last_trans_date = MAX(COALESCE(last_trans_date, NEW.trans_date), NEW.trans_date)
+    WHERE account_id = NEW.account_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_transactions_delete_balance AFTER DELETE ON transactions
+BEGIN
+    UPDATE account_balances
+    SET total_amount = total_amount - OLD.amount,
+        tx_count = tx_count - 1,
+        last_trans_date = (SELECT trans_date FROM transactions WHERE account_id = OLD.account_id
+                           ORDER BY trans_day DESC LIMIT 1)
+    WHERE account_id = OLD.account_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_transactions_update_balance
+AFTER UPDATE OF account_id, amount, trans_date ON transactions
+BEGIN
+    UPDATE account_balances
+    SET total_amount = total_amount - OLD.amount,
+        tx_count = tx_count - 1,
+        last_trans_date = (SELECT trans_date FROM transactions WHERE account_id = OLD.account_id
+                           ORDER BY trans_day DESC LIMIT 1)
+    WHERE account_id = OLD.account_id;
+    INSERT OR IGNORE INTO account_balances (account_id) VALUES (NEW.account_id);
+    UPDATE account_balances
+    SET total_amount = total_amount + NEW.amount,
+        tx_count = tx_count + 1,
+        last_trans_date = (SELECT trans_date FROM transactions WHERE account_id = NEW.account_id
+                           ORDER BY trans_day DESC LIMIT 1)
+    WHERE account_id = NEW.account_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_transactions_insert_stats AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO monthly_stats (month, account_id, summary, is_income, tx_count, total_amount)
+    VALUES (NEW.trans_day / 100, NEW.account_id, TRIM(COALESCE(NEW.summary, '')), NEW.amount >= 0, 1, NEW.amount)
+    ON CONFLICT (month, account_id, summary, is_income) DO UPDATE
+    SET tx_count = tx_count + 1, total_amount = total_amount + excluded.total_amount;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_transactions_delete_stats AFTER DELETE ON transactions
+BEGIN
+    UPDATE monthly_stats
+    SET tx_count = tx_count - 1, total_amount = total_amount - OLD.amount
+    WHERE month = OLD.trans_day / 100 AND account_id = OLD.account_id
+      AND summary = TRIM(COALESCE(OLD.summary, '')) AND is_income = (OLD.amount >= 0);
+    DELETE FROM monthly_stats
+    WHERE month = OLD.trans_day / 100 AND account_id = OLD.account_id
+      AND summary = TRIM(COALESCE(OLD.summary, '')) AND is_income = (OLD.amount >= 0)
+      AND tx_count <= 0;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_transactions_update_stats
+AFTER UPDATE OF account_id, amount, trans_date, summary ON transactions
+BEGIN
+    UPDATE monthly_stats
+    SET tx_count = tx_count - 1, total_amount = total_amount - OLD.amount
+    WHERE month = OLD.trans_day / 100 AND account_id = OLD.account_id
+      AND summary = TRIM(COALESCE(OLD.summary, '')) AND is_income = (OLD.amount >= 0);
+    DELETE FROM monthly_stats
+    WHERE month = OLD.trans_day / 100 AND account_id = OLD.account_id
+      AND summary = TRIM(COALESCE(OLD.summary, '')) AND is_income = (OLD.amount >= 0)
+      AND tx_count <= 0;
+    INSERT INTO monthly_stats (month, account_id, summary, is_income, tx_count, total_amount)
+    VALUES (NEW.trans_day / 100, NEW.account_id, TRIM(COALESCE(NEW.summary, '')), NEW.amount >= 0, 1, NEW.amount)
+    ON CONFLICT (month, account_id, summary, is_income) DO UPDATE
+    SET tx_count = tx_count + 1, total_amount = total_amount + excluded.total_amount;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_transactions_insert_fts AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO transactions_fts (rowid, summary, ref_no)
+    VALUES (NEW.transaction_id, NEW.summary, NEW.ref_no);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_transactions_delete_fts AFTER DELETE ON transactions
+BEGIN
+    INSERT INTO transactions_fts (transactions_fts, rowid, summary, ref_no)
+    VALUES ('delete', OLD.transaction_id, OLD.summary, OLD.ref_no);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_transactions_update_fts AFTER UPDATE OF summary, ref_no ON transactions
+BEGIN
+    INSERT INTO transactions_fts (transactions_fts, rowid, summary, ref_no)
+    VALUES ('delete', OLD.transaction_id, OLD.summary, OLD.ref_no);
+    INSERT INTO transactions_fts (rowid, summary, ref_no)
+    VALUES (NEW.transaction_id, NEW.summary, NEW.ref_no);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_transactions_insert_log AFTER INSERT ON transactions
+BEGIN
+    INSERT OR REPLACE INTO change_log (table_name, row_id, op) VALUES ('transactions', NEW.transaction_id, 'upsert');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_transactions_update_log AFTER UPDATE ON transactions
+BEGIN
+    INSERT OR REPLACE INTO change_log (table_name, row_id, op) VALUES ('transactions', NEW.transaction_id, 'upsert');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_transactions_delete_log AFTER DELETE ON transactions
+BEGIN
+    INSERT OR REPLACE INTO change_log (table_name, row_id, op) VALUES ('transactions', OLD.transaction_id, 'delete');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_accounts_insert_log AFTER INSERT ON accounts
+BEGIN
+    INSERT OR REPLACE INTO change_log (table_name, row_id, op) VALUES ('accounts', NEW.account_id, 'upsert');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_accounts_update_log AFTER UPDATE ON accounts
+BEGIN
+    INSERT OR REPLACE INTO change_log (table_name, row_id, op) VALUES ('accounts', NEW.account_id, 'upsert');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_accounts_delete_log AFTER DELETE ON accounts
+BEGIN
+    INSERT OR REPLACE INTO change_log (table_name, row_id, op) VALUES ('accounts', OLD.account_id, 'delete');
+END;
+"""
+
+def _connect():
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
-def init_db():
-    """初始化資料庫與資料表"""
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("PRAGMA foreign_keys = ON;")
-        cursor.executescript("""
-        CREATE TABLE IF NOT EXISTS accounts (
-            account_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            account_name TEXT NOT NULL UNIQUE,
-            account_number TEXT NOT NULL,
-            bank_code TEXT NOT NULL,
-            initial_balance REAL DEFAULT 0.0
-        );
-        CREATE TABLE IF NOT EXISTS transactions (
+class ConnectionPool:
+    """固定上限的 SQLite 連線池，連線建立後重複使用"""
+
+    def __init__(self, size):
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._all = []
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            conn = _connect()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+        self._slots.release()
+
+    def close_all(self):
+        with self._lock:
+            conns, self._all = self._all, []
+        for conn in conns:
+            conn.close()
+        self._idle = queue.LifoQueue()
+
+pool = ConnectionPool(POOL_SIZE)
+_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="tuql-db")
+
+@contextmanager
+def get_db_connection():
+    """
+    從連線池取得設有 row_factory 的資料庫連線。
+    區塊正常結束時 commit，發生例外時 rollback，最後歸還連線。
+    """
+    conn = pool.acquire()
+    changes = conn.total_changes
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        changed = conn.total_changes - changes
+        if changed:
+            metrics.DB_ROWS.inc(changed, operation=metrics.db_operation() or "other")
+        pool.release(conn)
+
+@contextmanager
+def get_standalone_connection():
+    """
+    不經過連線池的獨立連線，供長時間串流讀取 (例如匯出) 使用，
+    避免佔住連線池而讓一般請求等待。
+    """
+    conn = _connect()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+# RowStream 每次自 cursor 取出的筆數
+STREAM_FETCH_SIZE = 500
+
+class RowStream:
+    """
+    迭代時才以獨立連線執行查詢，並以 fetchmany 逐批 yield 資料列 (tuple 列表)，
+    不建立 Row / dict，供串流回應使用。
+    columns: 與 SELECT 順序相同的欄位名稱
+    limit: 最多讀取的筆數 (查詢需多取一筆)；讀完後 has_more 表示是否還有更多資料
+    """
+
+    def __init__(self, query, params=(), columns=(), limit=None, fetch_size=STREAM_FETCH_SIZE):
+        self.query = query
+        self.params = tuple(params)
+        self.columns = tuple(columns)
+        self.limit = limit
+        self.fetch_size = fetch_size
+        self.last_row = None
+        self.has_more = False
+
+    def __iter__(self):
+        with get_standalone_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(self.query, self.params)
+            remaining = self.limit
+            while remaining is None or remaining > 0:
+                size = self.fetch_size if remaining is None else min(self.fetch_size, remaining)
+                rows = cursor.fetchmany(size)
+                if not rows:
+                    return
+                if remaining is not None:
+                    remaining -= len(rows)
+                self.last_row = rows[-1]
+                yield rows
+            self.has_more = cursor.fetchone() is not None
+
+async def run_db(func, *args, **kwargs):
+    """
+    在專用的 DB thread 上執行同步函式，避免阻塞 event loop。
+    thread 數量與連線池大小相同，因此取得連線時不會互相等待。
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, metrics.in_context(metrics.run_db_operation, func, *args, **kwargs))
+
+def close_db():
+    """關閉連線池 (應用程式結束時呼叫)"""
+    _executor.shutdown(wait=True)
+    pool.close_all()
+
+def rebuild_account_balances(conn):
+    """依 transactions 重新計算所有帳戶的彙總 (不 commit，由呼叫端決定)"""
+    conn.execute("DELETE FROM account_balances")
+    conn.execute("""
+        INSERT INTO account_balances (account_id, total_amount, tx_count, last_trans_date)
+        SELECT a.account_id, COALESCE(SUM(t.amount), 0), COUNT(t.transaction_id), MAX(t.trans_date)
+        FROM accounts a
+        LEFT JOIN transactions t ON a.account_id = t.account_id
+        GROUP BY a.account_id
+    """)
+
+def rebuild_monthly_stats(conn):
+    """依 transactions 重新計算月份統計彙總 (不 commit，由呼叫端決定)"""
+    conn.execute("DELETE FROM monthly_stats")
+    conn.execute("""
+        INSERT INTO monthly_stats (month, account_id, summary, is_income, tx_count, total_amount)
+        SELECT trans_day / 100, account_id, TRIM(COALESCE(summary, '')), amount >= 0, COUNT(*), SUM(amount)
+        FROM transactions
+        GROUP BY 1, 2, 3, 4
+    """)
+
+def verify_account_balances(conn, tolerance=0.005):
+    """
+    比對 account_balances 與實際 SUM/COUNT/MAX。
+    回傳不一致的帳戶列表 (空列表代表一致)。
+    """
+    rows = conn.execute("""
+        SELECT a.account_id,
+               b.total_amount, b.tx_count, b.last_trans_date,
+               COALESCE(SUM(t.amount), 0) AS actual_total,
+               COUNT(t.transaction_id) AS actual_count,
+               MAX(t.trans_date) AS actual_last_date
+        FROM accounts a
+        LEFT JOIN account_balances b ON a.account_id = b.account_id
+        LEFT JOIN transactions t ON a.account_id = t.account_id
+        GROUP BY a.account_id
+    """).fetchall()
+
+    mismatches = []
+    for account_id, total, count, last_date, actual_total, actual_count, actual_last in rows:
+        if (total is None
+                or abs(total - actual_total) > tolerance
+                or count != actual_count
+                or last_date != actual_last):
+            mismatches.append({
+                "account_id": account_id,
+                "stored": {"total_amount": total, "tx_count": count, "last_trans_date": last_date},
+                "actual": {"total_amount": actual_total, "tx_count": actual_count, "last_trans_date": actual_last},
+            })
+    return mismatches
+
+def _migrate_account_balances(conn):
+    rebuild_account_balances(conn)
+
+def _legacy_trace_hash(account_id, date, time, ref_no, amount, source_type):
+    """migration 6 之前的 trace_hash (SHA-256 hex，含來源類型)"""
+    ref_str = str(ref_no) if ref_no is not None else ""
+    raw_id = f"{source_type}|{account_id}|{date}|{time}|{ref_str}|{amount}"
+    return hashlib.sha256(raw_id.encode()).hexdigest()
+
+def _migrate_canonical_dates(conn):
+    """
+    將既有的日期統一為 ISO 'YYYY-MM-DD' (含民國年)、時間為 'HH:MM:SS'，
+    重新計算 trace_hash，並加入 trans_day (yyyymmdd) 欄位與索引。
+    """
+    from dates import normalize_date, normalize_time
+
+    # 舊的 trigger/索引以 trans_date 為準，稍後由 SCHEMA_INDEXES 重建
+    for statement in (
+        "DROP TRIGGER IF EXISTS trg_transactions_delete_balance",
+        "DROP TRIGGER IF EXISTS trg_transactions_update_balance",
+        "DROP INDEX IF EXISTS idx_transactions_account_date",
+        "DROP INDEX IF EXISTS idx_transactions_date",
+    ):
+        conn.execute(statement)
+
+    rows = conn.execute("""
+        SELECT transaction_id, account_id, trans_date, trans_time, ref_no, amount, trace_hash
+        FROM transactions
+    """).fetchall()
+    for tx_id, account_id, date, time, ref_no, amount, trace_hash in rows:
+        try:
+            new_date = normalize_date(date)
+        except ValueError:
+            print(f"交易 {tx_id} 的日期無法解析，保留原值: {date}")
+            new_date = date
+        new_time = normalize_time(time)
+        if (new_date, new_time) == (date, time):
+            continue
+
+        # 資料表未記錄來源類型，依舊雜湊比對出原本是 BATCH 或 MANUAL
+        new_hash = trace_hash
+        for source_type in ("BATCH", "MANUAL"):
+            if _legacy_trace_hash(account_id, date, time, ref_no, amount, source_type) == trace_hash:
+                new_hash = _legacy_trace_hash(account_id, new_date, new_time, ref_no, amount, source_type)
+                break
+        try:
+            conn.execute("""
+                UPDATE transactions SET trans_date = ?, trans_time = ?, trace_hash = ?
+                WHERE transaction_id = ?
+            """, (new_date, new_time, new_hash, tx_id))
+        except sqlite3.IntegrityError:
+            # 與既有交易正規化後相同 (例如民國/西元各存一次)，保留舊雜湊避免刪除資料
+            print(f"交易 {tx_id} 正規化後與其他交易重複，保留原雜湊")
+            conn.execute("UPDATE transactions SET trans_date = ?, trans_time = ? WHERE transaction_id = ?",
+                         (new_date, new_time, tx_id))
+
+    conn.execute("""
+        ALTER TABLE transactions ADD COLUMN
+        trans_day INTEGER GENERATED ALWAYS AS (CAST(replace(trans_date, '-', '') AS INTEGER)) VIRTUAL
+    """)
+    rebuild_account_balances(conn)
+
+def _migrate_monthly_stats(conn):
+    rebuild_monthly_stats(conn)
+
+def _migrate_fulltext_index(conn):
+    conn.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')")
+
+def _migrate_change_log(conn):
+    # 既有資料視為一次新增，since=0 的差異同步即可取得完整資料
+    conn.execute("""
+        INSERT OR IGNORE INTO change_log (table_name, row_id, op)
+        SELECT 'accounts', account_id, 'upsert' FROM accounts
+    """)
+    conn.execute("""
+        INSERT OR IGNORE INTO change_log (table_name, row_id, op)
+        SELECT 'transactions', transaction_id, 'upsert' FROM transactions
+    """)
+
+def _migrate_compact_hashes(conn):
+    """
+    trace_hash 改為 16 bytes 的 BLOB (不含來源類型、金額正規化)，以新結構重建 transactions。
+    正規化後相同的交易 (例如同一筆分別由匯入與手動新增) 全部保留：
+    除了 ID 最小的一筆，其餘改用加上交易 ID 的雜湊 (之後不會被視為重複) 並印出提示。
+    """
+    from services.transaction_service import compute_transaction_hash
+
+    # 結構固定於此 (不引用 SCHEMA_TABLES)，之後的 migration 再修改 transactions 也不受影響
+    conn.execute("DROP TABLE IF EXISTS transactions_compact")
+    conn.execute("""
+        CREATE TABLE transactions_compact (
             transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
             account_id INTEGER NOT NULL,
             trans_date TEXT NOT NULL,
@@ -29,7 +516,124 @@ def init_db():
             summary TEXT,
             ref_no TEXT,
             amount REAL NOT NULL,
-            trace_hash TEXT UNIQUE NOT NULL,
+            trace_hash BLOB UNIQUE NOT NULL,
+            trans_day INTEGER GENERATED ALWAYS AS (CAST(replace(trans_date, '-', '') AS INTEGER)) VIRTUAL,
             FOREIGN KEY (account_id) REFERENCES accounts(account_id) ON DELETE CASCADE
-        );
-        """)
+        )
+    """)
+
+    columns = "transaction_id, account_id, trans_date, trans_time, summary, ref_no, amount"
+    def compact_rows(rows):
+        for tx_id, account_id, date, time, summary, ref_no, amount in rows:
+            yield (tx_id, account_id, date, time, summary, ref_no, amount,
+                   compute_transaction_hash(account_id, date, time, ref_no, amount))
+
+    conn.executemany(
+        f"INSERT OR IGNORE INTO transactions_compact ({columns}, trace_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        compact_rows(conn.execute(f"SELECT {columns} FROM transactions ORDER BY transaction_id"))
+    )
+    duplicates = conn.execute(f"""
+        SELECT {columns} FROM transactions
+        WHERE transaction_id NOT IN (SELECT transaction_id FROM transactions_compact)
+    """).fetchall()
+    salted = []
+    for tx_id, account_id, date, time, summary, ref_no, amount in duplicates:
+        print(f"交易 {tx_id} 與其他交易的日期、時間、序號、金額皆相同，保留並改用獨立雜湊")
+        digest = compute_transaction_hash(account_id, date, time, ref_no, amount)
+        salted.append((tx_id, account_id, date, time, summary, ref_no, amount,
+                       hashlib.blake2b(str(tx_id).encode(), key=digest, digest_size=16).digest()))
+    conn.executemany(
+        f"INSERT INTO transactions_compact ({columns}, trace_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", salted
+    )
+
+    # 保留 AUTOINCREMENT 的序號，已刪除交易的 ID 不會被重新使用 (change_log 仍記錄著它們)
+    seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transactions'").fetchone()
+    # 舊的 trigger/索引隨資料表刪除，稍後由 SCHEMA_INDEXES 重建；全文檢索以 rowid 對應，內容不變
+    conn.execute("DROP TABLE transactions")
+    conn.execute("ALTER TABLE transactions_compact RENAME TO transactions")
+    # 暫存的預覽是以舊雜湊計算的，直接捨棄 (重新上傳即可)
+    conn.execute("DELETE FROM import_previews")
+    if seq:
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'transactions'", seq)
+
+# (版本號, migration)；依序套用於 PRAGMA user_version 較舊的資料庫
+MIGRATIONS = [
+    (1, _migrate_account_balances),
+    (2, _migrate_canonical_dates),
+    (3, _migrate_monthly_stats),
+    (4, _migrate_fulltext_index),
+    (5, _migrate_change_log),
+    (6, _migrate_compact_hashes),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def _apply_migration(conn, target, migrate):
+    """
+    在單一交易中執行 migration 並更新 user_version。
+    migration 內只能使用 execute (executescript 會先 commit)；失敗時整步 rollback，下次啟動重新執行。
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        migrate(conn)
+        conn.execute(f"PRAGMA user_version = {target}")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+def init_db():
+    """初始化資料庫與資料表，並套用尚未執行的 migration"""
+    # isolation_level=None：交易完全由 BEGIN / COMMIT 控制，不自動開始
+    conn = sqlite3.connect(DB_NAME, isolation_level=None)
+    try:
+        conn.execute("PRAGMA foreign_keys = ON")
+        # WAL 會保存在資料庫檔案中，讀取不會被寫入阻擋
+        conn.execute("PRAGMA journal_mode = WAL")
+
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        is_new = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions'"
+        ).fetchone() is None
+
+        if is_new:
+            # 新資料庫直接建立最新結構，與版本號一起寫入
+            try:
+                conn.executescript(f"BEGIN; {SCHEMA_TABLES}; PRAGMA user_version = {SCHEMA_VERSION}; COMMIT;")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+        else:
+            # 補上新增的資料表 (皆為 IF NOT EXISTS)，既有資料表的變更由 migration 處理
+            conn.executescript(SCHEMA_TABLES)
+            for target, migrate in MIGRATIONS:
+                if version < target:
+                    _apply_migration(conn, target, migrate)
+
+        conn.executescript(SCHEMA_INDEXES)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="TUQL 資料庫維護工具")
+    arg_parser.add_argument("command", choices=["verify-balances", "rebuild-balances", "rebuild-stats"])
+    args = arg_parser.parse_args()
+
+    init_db()
+    with sqlite3.connect(DB_NAME) as conn:
+        if args.command == "rebuild-stats":
+            rebuild_monthly_stats(conn)
+            conn.commit()
+            print("月份統計已重建")
+            raise SystemExit(0)
+        if args.command == "rebuild-balances":
+            rebuild_account_balances(conn)
+            conn.commit()
+            print("帳戶彙總已重建")
+        mismatches = verify_account_balances(conn)
+        for m in mismatches:
+            print(f"帳戶 {m['account_id']} 不一致: stored={m['stored']} actual={m['actual']}")
+        print("帳戶彙總一致" if not mismatches else f"共 {len(mismatches)} 個帳戶不一致")
+        raise SystemExit(1 if mismatches else 0)
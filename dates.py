@@ -0,0 +1,60 @@
+import re
+from datetime import date
+
+# 年/月/日，分隔符號可為 / - . 或空白；年份 2-3 碼視為民國年
+_DATE_PATTERN = re.compile(r"^\s*(\d{2,4})\s*[/\-.\s]\s*(\d{1,2})\s*[/\-.\s]\s*(\d{1,2})\s*$")
+_COMPACT_DATE_PATTERN = re.compile(r"^\s*(\d{4})(\d{2})(\d{2})\s*$")
+_TIME_PATTERN = re.compile(r"^\s*(\d{1,2}):(\d{2})(?::(\d{2}))?\s*$")
+
+ROC_YEAR_OFFSET = 1911
+
+def normalize_date(value):
+    """
+    將各種日期格式統一為 ISO 'YYYY-MM-DD'。
+    支援 '2023/05/20'、'2023-5-20'、'20230520' 及民國年 '112/05/20'。
+    無法解析時拋出 ValueError。
+    """
+    text = str(value or "")
+    match = _DATE_PATTERN.match(text) or _COMPACT_DATE_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"日期格式錯誤: {value}")
+
+    y, m, d = (int(p) for p in match.groups())
+    if y < ROC_YEAR_OFFSET:
+        y += ROC_YEAR_OFFSET
+    try:
+        return date(y, m, d).isoformat()
+    except ValueError:
+        raise ValueError(f"日期格式錯誤: {value}")
+
+def normalize_time(value):
+    """將 'H:MM' / 'HH:MM:SS' 統一為 'HH:MM:SS'；空值視為 '00:00:00'，無法解析時原樣回傳"""
+    text = str(value or "").strip()
+    if not text:
+        return "00:00:00"
+    match = _TIME_PATTERN.match(text)
+    if not match:
+        return text
+    h, m, s = match.groups()
+    return f"{int(h):02d}:{m}:{s or '00'}"
+
+def parse_month(value):
+    """'YYYY-MM' -> (year, month)；格式錯誤時拋出 ValueError"""
+    try:
+        y, m = (int(p) for p in str(value).split("-"))
+    except ValueError:
+        raise ValueError(f"月份格式錯誤: {value}")
+    if not 1 <= m <= 12:
+        raise ValueError(f"月份格式錯誤: {value}")
+    return y, m
+
+def to_day(iso_date):
+    """'YYYY-MM-DD' -> yyyymmdd 整數 (與 transactions.trans_day 相同)"""
+    return int(iso_date.replace("-", ""))
+
+def try_normalize_date(value):
+    """解析失敗時回傳原值 (供解析器預覽使用，由使用者在畫面上修正)"""
+    try:
+        return normalize_date(value)
+    except ValueError:
+        return value
@@ -1,15 +1,42 @@
 #%% main.py
 from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 import os
 import database
-from routers import transactions, accounts, imports
+from services import parse_service, ocr_service, import_job_service, asset_service
+from routers import transactions, accounts, imports, stats, exports, assets, metrics
 
 app = FastAPI()
+# 請求耗時與各階段耗時 (/metrics)，TUQL_SLOW_REQUEST_MS 設定時印出慢請求
+app.add_middleware(metrics.MetricsMiddleware)
 
-# 初始化資料庫
-database.init_db()
+# 解析/OCR 子程序 (forkserver、spawn) 會以 __mp_main__ 重新 import 本模組，
+# 因此初始化放在 startup 中，import 時不做任何資料庫或檔案的工作
+@app.on_event("startup")
+def initialize():
+    # 初始化資料庫 (須在匯入工作恢復之前)
+    database.init_db()
+    # 首頁與其引用的檔案加上內容雜湊並預先壓縮，保留在記憶體中 (由 /、/assets 提供)
+    asset_service.build()
+
+@app.on_event("startup")
+def warmup_ocr():
+    if ocr_service.OCR_WARMUP:
+        ocr_service.warmup()
+
+@app.on_event("startup")
+async def start_import_jobs():
+    await import_job_service.start()
+
+@app.on_event("shutdown")
+async def stop_import_jobs():
+    await import_job_service.stop()
+
+@app.on_event("shutdown")
+def close_database():
+    ocr_service.shutdown()
+    parse_service.shutdown()
+    database.close_db()
 
 # 掛載靜態檔案
 if not os.path.exists("static"):
@@ -20,11 +47,10 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 app.include_router(transactions.router, tags=["Transactions"])
 app.include_router(accounts.router, tags=["Accounts"])
 app.include_router(imports.router, tags=["Imports"])
-
-@app.get("/", response_class=HTMLResponse)
-async def index():
-    with open("static/index.html", encoding="utf-8") as f:
-        return f.read()
+app.include_router(stats.router, tags=["Stats"])
+app.include_router(exports.router, tags=["Exports"])
+app.include_router(assets.router, tags=["Assets"])
+app.include_router(metrics.router, tags=["Metrics"])
 
 #%%
 if __name__ == "__main__":
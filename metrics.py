@@ -0,0 +1,226 @@
+import bisect
+import contextvars
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 請求耗時超過此值 (毫秒) 時印出各階段耗時，0 表示停用
+SLOW_REQUEST_MS = float(os.environ.get("TUQL_SLOW_REQUEST_MS", "0"))
+
+# 直方圖的區間上限 (秒)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """只會增加的計數 (依 labels 分開累計)"""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+class Histogram:
+    """累計分布 (Prometheus histogram：各區間的累計次數、總和與次數)"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [各區間次數..., 總和, 次數]
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(entry)) for key, entry in self._values.items())
+        for key, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                yield (f"{self.name}_bucket",
+                       _format_labels(self.labelnames, key, [("le", _format_value(float(bound)))]), cumulative)
+            yield f"{self.name}_bucket", _format_labels(self.labelnames, key, [("le", "+Inf")]), entry[-1]
+            yield f"{self.name}_sum", _format_labels(self.labelnames, key), entry[-2]
+            yield f"{self.name}_count", _format_labels(self.labelnames, key), entry[-1]
+
+# 讀取時才計算的數值 (例如快取統計)：函式回傳 [(名稱, 類型, 說明, [(labels dict, 數值)])]
+_collectors = []
+
+def register_collector(func):
+    _collectors.append(func)
+    return func
+
+def render():
+    """所有指標的 Prometheus text format (0.0.4)"""
+    lines = []
+    with _registry_lock:
+        registered = list(_registry)
+    for metric in registered:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {_format_value(value)}")
+    for collect in _collectors:
+        try:
+            families = collect()
+        except Exception as e:
+            print(f"Metrics collector failed: {e}")
+            continue
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+# ---------- 應用程式的指標 ----------
+
+REQUEST_SECONDS = Histogram(
+    "tuql_http_request_duration_seconds", "HTTP 請求耗時 (至回應送完為止)", ("method", "route", "status")
+)
+STAGE_SECONDS = Histogram(
+    "tuql_stage_duration_seconds", "匯入流程各階段耗時", ("stage", "bank_code")
+)
+OCR_IMAGES = Counter("tuql_ocr_images_total", "送入 OCR 模型的影像張數", ("bank_code",))
+DB_SECONDS = Histogram(
+    "tuql_db_operation_duration_seconds", "資料庫操作 (run_db 執行的函式) 耗時", ("operation",)
+)
+DB_ROWS = Counter(
+    "tuql_db_rows_changed_total", "資料庫操作新增/修改/刪除的資料列數 (含 trigger 維護的彙總表)", ("operation",)
+)
+
+# ---------- 各階段耗時 (同一請求/工作內累計，供慢請求紀錄使用) ----------
+
+# {階段: [總秒數, 次數]}；None 表示目前不在請求或工作中
+_stages = contextvars.ContextVar("tuql_stages", default=None)
+_stages_lock = threading.Lock()
+# 目前 run_db 執行的函式名稱 (資料庫指標的 label)
+_operation = contextvars.ContextVar("tuql_db_operation", default="")
+
+def add_stage_time(stage, seconds, count=1):
+    """將耗時計入目前請求/工作的各階段統計 (不記錄到直方圖)"""
+    stages = _stages.get()
+    if stages is None:
+        return
+    with _stages_lock:
+        entry = stages.setdefault(stage, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += count
+
+@contextmanager
+def track(stage):
+    """只計入目前請求/工作的階段統計；用於迴圈內或子程序中 (結果另行傳回)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_stage_time(stage, time.perf_counter() - start)
+
+@contextmanager
+def timer(stage, bank_code=""):
+    """記錄到 tuql_stage_duration_seconds，並計入目前請求/工作的階段統計"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start, bank_code)
+
+def record_stage(stage, seconds, bank_code=""):
+    STAGE_SECONDS.observe(seconds, stage=stage, bank_code=bank_code)
+    add_stage_time(stage, seconds)
+
+@contextmanager
+def collect_stages():
+    """在區塊內收集各階段耗時，yield 收集用的 dict ({階段: [總秒數, 次數]})"""
+    stages = {}
+    token = _stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _stages.reset(token)
+
+def summarize_stages(stages):
+    """{階段: 毫秒}，依耗時由大到小排列"""
+    with _stages_lock:
+        items = sorted(stages.items(), key=lambda item: -item[1][0])
+    return {stage: round(seconds * 1000, 1) for stage, (seconds, _) in items}
+
+def in_context(func, *args, **kwargs):
+    """
+    包裝成在目前 context 中執行的函式，交給 run_in_executor 使用。
+    (run_in_executor 不會複製 contextvars，否則 thread 中的耗時無法計入目前請求)
+    """
+    return functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+
+def db_operation():
+    return _operation.get()
+
+def run_db_operation(func, *args, **kwargs):
+    """在 DB thread 中執行 func，記錄耗時 (tuql_db_operation_duration_seconds 與階段 db.<函式名稱>)"""
+    name = getattr(func, "__name__", "unknown")
+    _operation.set(name)
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        DB_SECONDS.observe(elapsed, operation=name)
+        add_stage_time(f"db.{name}", elapsed)
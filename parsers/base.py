@@ -1,22 +1,147 @@
 # parsers/base.py
 from abc import ABC, abstractmethod
+import pdfplumber
+from pdfminer.pdfpage import PDFPage
+import metrics
+from .utils import get_reader, preprocess_image, line_boxes, DEFAULT_PREPROCESS, OCR_BATCH_SIZE
+
+# 跨頁比對時，保留到下一頁的最大行數
+CARRY_LINES = 5
+
+def iter_page_texts(pdf_stream, password):
+    """
+    逐頁 yield 頁面文字。
+    頁面物件用完即釋放 (不經過 pdf.pages，避免所有頁面與其快取同時留在記憶體)。
+    """
+    try:
+        with metrics.track("pdf_open"):
+            pdf = pdfplumber.open(pdf_stream, password=password)
+    except Exception as e:
+        raise Exception(f"PDF 開啟失敗: {str(e)}")
+
+    with pdf:
+        doctop = 0
+        for i, page_obj in enumerate(PDFPage.create_pages(pdf.doc)):
+            page = pdfplumber.page.Page(pdf, page_obj, page_number=i + 1, initial_doctop=doctop)
+            try:
+                with metrics.track("extract_text"):
+                    text = page.extract_text() or ""
+                yield text
+            finally:
+                doctop += page.height
+                page.close()
+
+def iter_text_matches(page_texts, pattern, carry_lines=CARRY_LINES):
+    """
+    對逐頁文字執行 pattern.finditer，逐筆 yield match。
+    每頁最後一筆比對之後的文字 (最多 carry_lines 行) 會接在下一頁前面，跨頁的資料仍可比對。
+    """
+    carry = None
+    for text in page_texts:
+        buffer = text if carry is None else carry + "\n" + text
+        end = 0
+        for match in pattern.finditer(buffer):
+            end = match.end()
+            yield match
+        carry = "\n".join(buffer[end:].split("\n")[-carry_lines:])
 
 class BankParser(ABC):
     """銀行解析器基礎介面"""
-    
-    @abstractmethod
+
+    # 解析邏輯變更 (輸出可能不同) 時遞增，使舊的快取結果失效
+    VERSION = 1
+
+    def cache_version(self):
+        """快取 key 使用的解析器版本"""
+        return f"{type(self).__name__}:{self.VERSION}"
+
     def parse_pdf(self, pdf_stream, password, **kwargs):
         """
         解析 PDF
         回傳: (account_number, transactions)
         kwargs 可能包含 'target_account' (str) 用於特定帳號過濾
         """
-        pass
+        meta = {}
+        transactions = list(self.iter_transactions(pdf_stream, password, meta, **kwargs))
+        return meta.get("account_number", "Unknown"), transactions
 
     @abstractmethod
+    def iter_transactions(self, pdf_stream, password, meta, **kwargs):
+        """
+        逐頁 (或逐個交易區塊) 解析 PDF，每解析出一筆交易就 yield。
+        meta: dict，解析過程中填入 'account_number' (迭代結束後才保證完整)
+        kwargs 與 parse_pdf 相同
+        """
+        pass
+
+    # 截圖辨識時傳給 readtext 的參數；None 表示不支援截圖辨識
+    OCR_OPTIONS = None
+    # 截圖前處理設定，只需列出與 DEFAULT_PREPROCESS 不同的項目
+    OCR_PREPROCESS = {}
+    # banks_config.json 中該銀行的 "ocr" 設定 (建立解析器時由 registry 指定)
+    ocr_config = None
+
+    @property
+    def ocr_preprocess(self):
+        """實際使用的前處理設定 (DEFAULT_PREPROCESS ← OCR_PREPROCESS ← ocr_config)"""
+        return {**DEFAULT_PREPROCESS, **self.OCR_PREPROCESS, **(self.ocr_config or {})}
+
+    def preprocess_screenshot(self, image_bytes):
+        """依本銀行的前處理設定解碼並處理截圖"""
+        return preprocess_image(image_bytes, self.ocr_preprocess)
+
     def recognize_screenshot(self, image_bytes):
         """
         解析圖片
         回傳: 交易資料字典
         """
-        pass
\ No newline at end of file
+        if self.OCR_OPTIONS is None:
+            return {}
+        result = self.recognize_batch([self.preprocess_screenshot(image_bytes)])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def recognize_batch(self, images):
+        """
+        批次辨識已經過 preprocess_screenshot 的影像。
+        有設定 lines 時略過文字偵測，直接辨識各文字行；否則相同尺寸的影像一次送入模型。
+        回傳與 images 對應的列表：交易資料字典，或解析失敗時的 Exception
+        """
+        if self.OCR_OPTIONS is None:
+            return [{} for _ in images]
+
+        reader = get_reader()
+        lines = self.ocr_preprocess["lines"]
+        batch_texts = [None] * len(images)
+        if lines is not None:
+            for i, image in enumerate(images):
+                batch_texts[i] = reader.recognize(
+                    image, horizontal_list=line_boxes(image, lines), free_list=[],
+                    batch_size=OCR_BATCH_SIZE, **self.OCR_OPTIONS
+                )
+        else:
+            by_shape = {}
+            for i, image in enumerate(images):
+                by_shape.setdefault(image.shape, []).append(i)
+            for indexes in by_shape.values():
+                shape_texts = reader.readtext_batched(
+                    [images[i] for i in indexes], batch_size=OCR_BATCH_SIZE, **self.OCR_OPTIONS
+                )
+                for i, texts in zip(indexes, shape_texts):
+                    batch_texts[i] = texts
+
+        results = []
+        for texts in batch_texts:
+            try:
+                results.append(self.parse_ocr_text(texts))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def parse_ocr_text(self, texts):
+        """
+        解析 OCR 辨識出的文字列表 (readtext 的結果)
+        回傳: 交易資料字典
+        """
+        raise NotImplementedError
@@ -1,25 +1,34 @@
+import hashlib
+import json
 import re
-import pdfplumber
-from .base import BankParser
+from dates import try_normalize_date
+from .base import BankParser, iter_page_texts, iter_text_matches
 
 class GenericParser(BankParser):
+    # Placeholder: Generic OCR not yet implemented (recognize_screenshot returns {})
+    OCR_OPTIONS = None
+
     def __init__(self, config):
         self.config = config
+        # 建立時即編譯，同一實例可重複用於多次解析
+        self.pattern = re.compile(config["regex_pattern"])
+        self.groups = config.get("groups", {})
+        self.account_pattern = re.compile(config["account_pattern"]) if "account_pattern" in config else None
+        self.ocr_config = config.get("ocr")
         
-    def parse_pdf(self, pdf_stream, password, **kwargs):
-        try:
-            with pdfplumber.open(pdf_stream, password=password) as pdf:
-                full_text = "\n".join([page.extract_text() or "" for page in pdf.pages])
-        except Exception as e:
-            raise Exception(f"PDF 開啟失敗: {str(e)}")
+    def cache_version(self):
+        # 設定內容不同即視為不同版本
+        digest = hashlib.sha256(json.dumps(self.config, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        return f"{super().cache_version()}:{digest}"
 
-        regex = self.config.get("regex_pattern")
-        groups = self.config.get("groups", {})
-        
-        pattern = re.compile(regex)
-        transactions = []
-        
-        for match in pattern.finditer(full_text):
+    def iter_transactions(self, pdf_stream, password, meta, **kwargs):
+        groups = self.groups
+        meta["account_number"] = "Generic"
+        page_texts = iter_page_texts(pdf_stream, password)
+        if self.account_pattern is not None:
+            page_texts = self._scan_account(page_texts, meta)
+
+        for match in iter_text_matches(page_texts, self.pattern):
             date = self._get_group_val(match, groups.get("date"))
             time = self._get_group_val(match, groups.get("time")) or "00:00:00"
             summary = self._get_group_val(match, groups.get("summary")) or "Generic Import"
@@ -48,36 +57,32 @@ class GenericParser(BankParser):
                 else:
                     amount = abs(amount)
             
-            transactions.append({
-                "date": date,
+            yield {
+                "date": try_normalize_date(date),
                 "time": time,
                 "summary": summary.strip(),
                 "ref_no": ref_no.strip(),
                 "amount": amount
-            })
-        
-        # Try to find account number if configured
-        account_no = "Generic"
-        if "account_pattern" in self.config:
-            acc_match = re.search(self.config["account_pattern"], full_text)
-            if acc_match:
-                 # If account_group is specified, use it, else group 1
-                 grp = self.config.get("account_group", 1)
-                 try:
-                     raw_acc = acc_match.group(grp).strip()
-                     # Optional: Logic to clean account number (keep last 5 digits etc) - keep simple for now
-                     account_no = raw_acc
-                 except IndexError:
-                     pass
+            }
 
-        return account_no, transactions
+    def _scan_account(self, page_texts, meta):
+        """原樣傳遞頁面文字，並以第一個符合 account_pattern 的帳號填入 meta"""
+        account_found = False
+        for page_text in page_texts:
+            if not account_found:
+                acc_match = self.account_pattern.search(page_text)
+                if acc_match:
+                    account_found = True
+                    # If account_group is specified, use it, else group 1
+                    grp = self.config.get("account_group", 1)
+                    try:
+                        meta["account_number"] = acc_match.group(grp).strip()
+                    except IndexError:
+                        pass
+            yield page_text
 
     def _get_group_val(self, match, group_idx):
         if group_idx is not None and isinstance(group_idx, int) and 1 <= group_idx <= len(match.groups()):
             val = match.group(group_idx)
             return val if val else ""
         return ""
-
-    def recognize_screenshot(self, image_bytes):
-        # Placeholder: Generic OCR not yet implemented
-        return {}
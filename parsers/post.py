@@ -1,41 +1,44 @@
 import re
-import pdfplumber
-from .base import BankParser
-from .utils import reader, preprocess_image
+from dates import try_normalize_date
+from .base import BankParser, iter_page_texts, iter_text_matches
 from .registry import register_parser
 
 @register_parser('700')
 class PostOfficeParser(BankParser):
-    def parse_pdf(self, pdf_stream, password, **kwargs):
-        try:
-            with pdfplumber.open(pdf_stream, password=password) as pdf:
-                full_text = "\n".join([page.extract_text() for page in pdf.pages])
-        except Exception as e:
-            raise Exception(f"PDF 開啟失敗: {str(e)}")
+    INCOME_KEYWORDS = ["薪資", "利息", "轉入", "存入", "退款"]
+    ACCOUNT_PATTERN = re.compile(r"帳\s+號[:：\s]*([\d\*\-]+)")
+    ITEM_PATTERN = re.compile(r"(\d{3}/\d{2}/\d{2})\s+(\d{2}:\d{2}:\d{2})\s+(\S+)\s+(.*?)\s+([\d,]+)(?=\n|$)")
 
-        acc_match = re.search(r"帳\s+號[:：\s]*([\d\*\-]+)", full_text)
-        raw_acc = acc_match.group(1).strip() if acc_match else "Unknown"
-        last_5_acc = raw_acc[-5:] if len(raw_acc) >= 5 else raw_acc
-        account_no_parsed = last_5_acc.replace('*', '').replace('-', '')
-        
-        INCOME_KEYWORDS = ["薪資", "利息", "轉入", "存入", "退款"]
-        item_pattern = re.compile(r"(\d{3}/\d{2}/\d{2})\s+(\d{2}:\d{2}:\d{2})\s+(\S+)\s+(.*?)\s+([\d,]+)(?=\n|$)")
-        
-        transactions = []
-        for match in item_pattern.finditer(full_text):
+    def iter_transactions(self, pdf_stream, password, meta, **kwargs):
+        meta["account_number"] = "Unknown"
+        page_texts = self._scan_account(iter_page_texts(pdf_stream, password), meta)
+
+        for match in iter_text_matches(page_texts, self.ITEM_PATTERN):
             date, time, summary, ref_no, amount = match.groups()
             amount_val = float(amount.replace(',', ''))
-            if not any(kw in summary for kw in INCOME_KEYWORDS):
+            if not any(kw in summary for kw in self.INCOME_KEYWORDS):
                 amount_val = -abs(amount_val)
-            transactions.append({
-                "date": date, "time": time, "summary": summary,
+            yield {
+                "date": try_normalize_date(date), "time": time, "summary": summary,
                 "ref_no": ref_no.strip(), "amount": amount_val
-            })
-        return account_no_parsed, transactions
+            }
+
+    def _scan_account(self, page_texts, meta):
+        """原樣傳遞頁面文字，並以第一個找到的帳號填入 meta"""
+        account_found = False
+        for page_text in page_texts:
+            if not account_found:
+                acc_match = self.ACCOUNT_PATTERN.search(page_text)
+                if acc_match:
+                    raw_acc = acc_match.group(1).strip()
+                    last_5_acc = raw_acc[-5:] if len(raw_acc) >= 5 else raw_acc
+                    meta["account_number"] = last_5_acc.replace('*', '').replace('-', '')
+                    account_found = True
+            yield page_text
+
+    OCR_OPTIONS = {"detail": 0, "paragraph": True}
 
-    def recognize_screenshot(self, image_bytes):
-        processed_img = preprocess_image(image_bytes)
-        result = reader.readtext(processed_img, detail=0, paragraph=True)
+    def parse_ocr_text(self, result):
         full_text = " ".join(result).split("交易") # 郵局特徵分割點
         
         # 預設值
@@ -59,7 +62,7 @@ class PostOfficeParser(BankParser):
             if len(full_text) > 1:
                 d_match = re.search(r"(\d{3}/\d{2}/\d{2})", full_text[1])
                 t_match = re.search(r"(\d{2}:\d{2}:\d{2})", full_text[1])
-                if d_match: data["date"] = d_match.group(1)
+                if d_match: data["date"] = try_normalize_date(d_match.group(1))
                 if t_match: data["time"] = t_match.group(1)
             
             # 序號 (通常在第三段)
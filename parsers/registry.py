@@ -1,36 +1,138 @@
 import json
 import os
+import re
+import threading
 from .generic import GenericParser
+from .utils import validate_preprocess_options
 
 PARSER_REGISTRY = {}
 CONFIG_FILE = os.path.join(os.path.dirname(__file__), 'banks_config.json')
 
+# 解析器皆為無狀態，每個銀行代碼只建立一個實例
+# config_stamp 為設定檔的 (mtime, size)，變動時重新載入設定
+_cache = {"config_stamp": None, "configs": {}, "parsers": {}}
+_cache_lock = threading.Lock()
+
 def register_parser(bank_code):
     """Decorator to register a bank parser class"""
     def decorator(cls):
         PARSER_REGISTRY[bank_code] = cls
+        _cache["parsers"].pop(bank_code, None)
         return cls
     return decorator
 
-def get_parser(bank_code):
-    """Factory function to get a parser instance"""
-    
-    # 1. Check Registry (Custom Python Implementations)
-    if bank_code in PARSER_REGISTRY:
-        return PARSER_REGISTRY[bank_code]()
+def validate_bank_config(bank_code, config):
+    """檢查單一銀行設定，格式錯誤時拋出 ValueError"""
+    if not isinstance(config, dict):
+        raise ValueError(f"{bank_code}: 設定必須為物件")
 
-    # 2. Check Configuration (Generic Parser)
-    if os.path.exists(CONFIG_FILE):
+    if not config.get("regex_pattern"):
+        raise ValueError(f"{bank_code}: 缺少 regex_pattern")
+    try:
+        pattern = re.compile(config["regex_pattern"])
+    except re.error as e:
+        raise ValueError(f"{bank_code}: regex_pattern 無效 ({e})")
+
+    groups = config.get("groups", {})
+    if not isinstance(groups, dict):
+        raise ValueError(f"{bank_code}: groups 必須為物件")
+    for name in ("date", "amount"):
+        if groups.get(name) is None:
+            raise ValueError(f"{bank_code}: groups 缺少 {name}")
+    for name, idx in groups.items():
+        if idx is None:
+            continue
+        if not isinstance(idx, int) or not 1 <= idx <= pattern.groups:
+            raise ValueError(f"{bank_code}: groups.{name} 超出 regex_pattern 的群組範圍")
+
+    if "account_pattern" in config:
+        try:
+            account_pattern = re.compile(config["account_pattern"])
+        except re.error as e:
+            raise ValueError(f"{bank_code}: account_pattern 無效 ({e})")
+        grp = config.get("account_group", 1)
+        if not isinstance(grp, int) or not 0 <= grp <= account_pattern.groups:
+            raise ValueError(f"{bank_code}: account_group 超出 account_pattern 的群組範圍")
+
+    for key in ("income_keywords", "expense_keywords"):
+        if key in config and not (
+            isinstance(config[key], list) and all(isinstance(kw, str) for kw in config[key])
+        ):
+            raise ValueError(f"{bank_code}: {key} 必須為字串陣列")
+
+    if "ocr" in config:
+        try:
+            validate_preprocess_options(config["ocr"])
+        except ValueError as e:
+            raise ValueError(f"{bank_code}: {e}")
+
+def load_bank_configs(path=CONFIG_FILE):
+    """讀取並驗證設定檔，格式錯誤的銀行會被略過 (並印出原因)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    if not isinstance(raw, dict):
+        raise ValueError("banks_config.json 最外層必須為物件")
+
+    configs = {}
+    for bank_code, config in raw.items():
         try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-                if bank_code in config:
-                    return GenericParser(config[bank_code])
+            validate_bank_config(bank_code, config)
+        except ValueError as e:
+            print(f"Invalid bank config skipped: {e}")
+            continue
+        configs[bank_code] = config
+    return configs
+
+def _config_stamp():
+    try:
+        stat = os.stat(CONFIG_FILE)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _refresh_configs():
+    """設定檔有變動時重新載入，並清除已建立的解析器 (需持有 _cache_lock)"""
+    stamp = _config_stamp()
+    if stamp == _cache["config_stamp"]:
+        return
+
+    configs = {}
+    if stamp is not None:
+        try:
+            configs = load_bank_configs()
         except Exception as e:
             print(f"Failed to load bank config: {e}")
+            # 保留上一次成功載入的設定
+            configs = _cache["configs"]
+
+    _cache["config_stamp"] = stamp
+    _cache["configs"] = configs
+    # 自訂解析器也會套用設定檔中的 ocr 前處理設定，一併重建
+    _cache["parsers"] = {}
+
+def _build_parser(bank_code):
+    # 1. Check Registry (Custom Python Implementations)
+    if bank_code in PARSER_REGISTRY:
+        instance = PARSER_REGISTRY[bank_code]()
+        instance.ocr_config = _cache["configs"].get(bank_code, {}).get("ocr")
+        return instance
+
+    # 2. Check Configuration (Generic Parser)
+    if bank_code in _cache["configs"]:
+        return GenericParser(_cache["configs"][bank_code])
 
     # 3. Fallback (Default to Post Office if available in registry)
     if '700' in PARSER_REGISTRY:
-        return PARSER_REGISTRY['700']()
-        
+        return _cache["parsers"].get('700') or _build_parser('700')
+
     raise ValueError(f"No parser found for bank code: {bank_code}")
+
+def get_parser(bank_code):
+    """Factory function to get a parser instance (cached per bank code)"""
+    with _cache_lock:
+        _refresh_configs()
+        parser_instance = _cache["parsers"].get(bank_code)
+        if parser_instance is None:
+            parser_instance = _build_parser(bank_code)
+            _cache["parsers"][bank_code] = parser_instance
+        return parser_instance
@@ -1,154 +1,173 @@
+import functools
 import re
-import pdfplumber
-from .base import BankParser
-from .utils import reader, preprocess_image
+from dates import try_normalize_date
+from .base import BankParser, iter_page_texts
 from .registry import register_parser
 
+# 同一份對帳單的日期大量重複，轉換結果直接快取
+_normalize_date = functools.lru_cache(maxsize=4096)(try_normalize_date)
+
 @register_parser('050')
 class TBBParser(BankParser):
     """台灣企銀 (050) 解析器"""
     
-    def parse_pdf(self, pdf_stream, password, **kwargs):
+    BLOCK_SPLIT = re.compile(r"(?=轉出帳號\s*:)")
+    # 掃描區塊一次即取得所有欄位的記號。搜尋只停在 / : 與標籤的第一個字，日期、時間以 lookbehind 確認；
+    # 欄位值放在 lookahead 中不消耗字元，且各記號互不重疊，每個欄位的第一筆與分別 re.search 的結果相同。
+    TOKEN_PATTERN = re.compile(r"""
+        [/:轉銷繳](?:
+              出帳號(?<=轉出帳號)\s*:\s*(?=(?P<account>\S*))
+            | 入帳號(?<=轉入帳號)\s*:\s*(?=(?P<payee_account>\S*))
+            | 入(?<=轉入)\s*:\s*(?=(?P<payee>\S*))
+            | 帳編號(?<=銷帳編號)\s*:\s*(?=(?P<bill>(?P<bill_word>\w*)\S*))
+            | (?:帳金額(?<=轉帳金額)|費金額(?<=繳費金額))\s*:\s*\$(?=(?P<amount>[\d,]+))
+            | (?<=\d{3}/)(?=\d{2}/\d{2})(?P<date>)     # 停在 YYY/MM/DD 的第一個 /
+            | (?<=\d{2}:)(?=\d{2})(?P<time>)            # 停在 HH:MM 的 :
+        )""", re.VERBOSE)
+    KNOWN_CATEGORIES = ("跨行轉帳", "自行轉帳", "全國繳費")
+    # 各類別的序號欄位：跨行轉帳 -> 轉入帳號，自行轉帳 -> 轉入，全國繳費 -> 銷帳編號
+    REF_FIELDS = {"跨行轉帳": "payee_account", "自行轉帳": "payee", "全國繳費": "bill"}
+
+    def iter_transactions(self, pdf_stream, password, meta, **kwargs):
         target_account = kwargs.get('target_account')
 
-        # 簡易實作：假設台企銀 PDF 也是純文字流 (若為表格需改用 table extraction)
-        try:
-            with pdfplumber.open(pdf_stream, password=password) as pdf:
-                full_text = "\n".join([page.extract_text() for page in pdf.pages])
-                # print(full_text)
-        except Exception as e:
-            raise Exception(f"PDF 開啟失敗: {str(e)}")
-
         # 1. 決定回傳的帳號
         # 若有指定 target_account，則回傳該帳號 (假設過濾後都是該帳號的交易)
-        # 若無，則嘗試從第一筆抓取或回傳 Unknown
-        if target_account:
-            account_no_parsed = target_account
-        else:
-            acc_match = re.search(r"轉出帳號\s*:\s*([^\s]+)", full_text)
-            if acc_match:
-                full_acc = acc_match.group(1)
-                account_no_parsed = full_acc[-5:] if len(full_acc) >= 5 else full_acc
-            else:
-                account_no_parsed = "Unknown"
+        # 若無，則從第一個交易區塊抓取或回傳 Unknown
+        meta["account_number"] = target_account or "Unknown"
 
         # 2. 抓取交易
-        transactions = []
-        
-        # 使用 Block Splitting 策略
-        blocks = re.split(r"(?=轉出帳號\s*:)", full_text)
-        blocks = [b for b in blocks if "轉出帳號" in b]
-        
-        for block in blocks:
-            # [Filter Logic] 
-            # 依據使用者所選的帳號(只有5碼 ex: 63701)比對每一筆交易紀錄的轉出帳號後五碼(ex: XXX01)
-            # 若兩者的末2碼正確，才可被append (若不符則跳過整筆交易)
-            should_process = True # 預設為處理 (若無 target_account 則全部轉入)
-
-            if target_account:
-                should_process = False # 若有指定目標帳號，則預設不處理，需比對成功才改為 True
-                acc_match = re.search(r"轉出帳號\s*:\s*([^\s]+)", block)
-                
-                if acc_match:
-                    block_acc = acc_match.group(1).strip()
-                    # 比對末2碼
-                    if len(target_account) >= 2 and len(block_acc) >= 2:
-                        if target_account[-2:] == block_acc[-2:]:
-                            should_process = True
-                
-            if not should_process:
+        for block in self._iter_blocks(iter_page_texts(pdf_stream, password)):
+            fields = self._tokenize(block)
+            if not target_account and meta["account_number"] == "Unknown" and "account" in fields:
+                full_acc = fields["account"]
+                meta["account_number"] = full_acc[-5:] if len(full_acc) >= 5 else full_acc
+
+            tx = self._build_transaction(block, fields, target_account)
+            if tx:
+                yield tx
+
+    def _iter_blocks(self, page_texts):
+        """
+        使用 Block Splitting 策略，逐頁切出以「轉出帳號:」開頭的交易區塊。
+        每頁最後一個區塊可能延續到下一頁，保留到下一頁文字接上後再切。
+        """
+        pending = None
+        for page_text in page_texts:
+            text = page_text if pending is None else pending + "\n" + page_text
+            *blocks, pending = self.BLOCK_SPLIT.split(text)
+            for block in blocks:
+                if "轉出帳號" in block:
+                    yield block
+            if "轉出帳號" not in pending:
+                # 尚未出現任何區塊 (如表頭頁)，只需保留最後一行供跨頁接合
+                pending = pending.rsplit("\n", 1)[-1]
+        if pending is not None and "轉出帳號" in pending:
+            yield pending
+
+    def _tokenize(self, block):
+        """掃描區塊一次，回傳各欄位第一個非空的值；日期另記錄位置 (date_pos)"""
+        fields = {}
+        for match in self.TOKEN_PATTERN.finditer(block):
+            name = match.lastgroup
+            if name == "bill" and "bill_word" not in fields and match.group("bill_word"):
+                # 銷帳編號的 \w+ 值 (fallback 用) 可能出現在較後面的同名欄位
+                fields["bill_word"] = match.group("bill_word")
+            if name in fields:
                 continue
-
-            # 1. Date (用來定位 Category)
-            date_match = re.search(r"(\d{3}/\d{2}/\d{2})", block)
-            if not date_match: continue
-            date_str = date_match.group(1)
-
-            # Date Conversion (ROC to AD)
-            try:
-                y, m, d = date_str.split('/')
-                formatted_date = f"{int(y)+1911}/{m}/{d}"
-            except:
-                formatted_date = date_str
-
-            # 2. Category & Summary
-            # 摘要統一使用交易類別的內容(如：跨行轉帳、自行轉帳、全國繳費等)
-            # 類別通常位於日期行的下一行開頭
-            summary = "TBB交易"
-            category = "一般交易"
-            
-            lines = [l.strip() for l in block.split('\n') if l.strip()]
-            date_idx = -1
-            for i, line in enumerate(lines):
-                if date_str in line:
-                    date_idx = i
+            if name == "date":
+                pos = match.start() - 3
+                fields["date"] = block[pos:pos + 9]
+                fields["date_pos"] = pos
+            elif name == "time":
+                pos = match.start() - 2
+                fields["time"] = block[pos:pos + 5]
+            else:
+                value = match.group(name)
+                if value:
+                    fields[name] = value
+        return fields
+
+    def _parse_block(self, block, target_account=None):
+        """解析單一交易區塊，不符合目標帳號或缺少必要欄位時回傳 None"""
+        return self._build_transaction(block, self._tokenize(block), target_account)
+
+    def _build_transaction(self, block, fields, target_account=None):
+        """以 _tokenize 取得的欄位組成交易"""
+        # [Filter Logic] 
+        # 依據使用者所選的帳號(只有5碼 ex: 63701)比對每一筆交易紀錄的轉出帳號後五碼(ex: XXX01)
+        # 若兩者的末2碼正確，才可被append (若不符則跳過整筆交易)
+        if target_account:
+            block_acc = fields.get("account", "")
+            if len(target_account) < 2 or len(block_acc) < 2 or target_account[-2:] != block_acc[-2:]:
+                return None
+
+        # 1. Date (用來定位 Category)
+        if "date" not in fields:
+            return None
+
+        # Date Conversion (ROC to ISO AD)
+        formatted_date = _normalize_date(fields["date"])
+
+        # 2. Category & Summary
+        # 摘要統一使用交易類別的內容(如：跨行轉帳、自行轉帳、全國繳費等)
+        # 類別通常位於日期行的下一行開頭 (略過空白行)
+        summary = "TBB交易"
+        category = "一般交易"
+
+        cat_line = self._next_line(block, fields["date_pos"])
+        if cat_line:
+            # 嘗試找尋已知類別，找不到時取該行第一個字
+            for known_cat in self.KNOWN_CATEGORIES:
+                if known_cat in cat_line:
+                    category = known_cat
                     break
-            
-            # 嘗試找尋已知類別
-            found_cat = False
-            if date_idx != -1 and date_idx + 1 < len(lines):
-                cat_line = lines[date_idx + 1]
-                for known_cat in ["跨行轉帳", "自行轉帳", "全國繳費"]:
-                    if known_cat in cat_line:
-                        category = known_cat
-                        summary = known_cat
-                        found_cat = True
-                        break
-            
-            if not found_cat:
-                 # Fallback, just pick first word of next line
-                 if date_idx != -1 and date_idx + 1 < len(lines):
-                     summary = lines[date_idx + 1].split()[0]
-                     category = summary # treat as category
-
-            # 3. Ref No
-            # 跨行轉帳 -> 轉入帳號
-            # 自行轉帳 -> 轉入
-            # 全國繳費 -> 銷帳編號
-            ref_no = ""
-            if category == "跨行轉帳":
-                m = re.search(r"轉入帳號\s*:\s*([^\s]+)", block)
-                if m: ref_no = m.group(1)
-            elif category == "自行轉帳":
-                m = re.search(r"轉入\s*:\s*([^\s]+)", block)
-                if m: ref_no = m.group(1)
-            elif category == "全國繳費":
-                m = re.search(r"銷帳編號\s*:\s*([^\s]+)", block)
-                if m: ref_no = m.group(1)
-            
-            if not ref_no: 
-                # 通用 fallback
-                if "銷帳編號" in block:
-                    m = re.search(r"銷帳編號\s*:\s*(\w+)", block)
-                    if m: ref_no = m.group(1)
-                else: 
-                    ref_no = "PDF_IMPORT"
-
-            # 4. Amount
-            amt_match = re.search(r"(?:轉帳金額|繳費金額)\s*:\s*\$([\d,]+)", block)
-            if not amt_match: continue
-            amount = float(amt_match.group(1).replace(',', ''))
-            amount = -abs(amount) # 視為支出
-
-            # 5. Time
-            time_match = re.search(r"(\d{2}:\d{2})", block)
-            time_str = time_match.group(1) if time_match else "00:00"
-            formatted_time = f"{time_str}:00"
-
-            transactions.append({
-                "date": formatted_date,
-                "time": formatted_time,
-                "summary": summary,
-                "ref_no": ref_no,
-                "amount": amount
-            })
-        
-        return account_no_parsed, transactions
-
-    def recognize_screenshot(self, image_bytes):
-        processed_img = preprocess_image(image_bytes)
-        # detail=0: 只回傳文字列表，不含座標
-        result = reader.readtext(processed_img, detail=0) 
+            else:
+                category = cat_line.split()[0]
+            summary = category
+
+        # 3. Ref No
+        ref_no = fields.get(self.REF_FIELDS.get(category), "")
+        if not ref_no:
+            # 通用 fallback
+            if "銷帳編號" in block:
+                ref_no = fields.get("bill_word", "")
+            else:
+                ref_no = "PDF_IMPORT"
+
+        # 4. Amount
+        if "amount" not in fields:
+            return None
+        amount = float(fields["amount"].replace(',', ''))
+        amount = -abs(amount) # 視為支出
+
+        # 5. Time
+        time_str = fields.get("time", "00:00")
+        formatted_time = f"{time_str}:00"
+
+        return {
+            "date": formatted_date,
+            "time": formatted_time,
+            "summary": summary,
+            "ref_no": ref_no,
+            "amount": amount
+        }
+
+    @staticmethod
+    def _next_line(block, pos):
+        """pos 所在行之後第一個非空白的行 (去除前後空白)，沒有時回傳空字串"""
+        end = block.find("\n", pos)
+        while end != -1:
+            start, end = end + 1, block.find("\n", end + 1)
+            line = block[start:end if end != -1 else None].strip()
+            if line:
+                return line
+        return ""
+
+    # detail=0: 只回傳文字列表，不含座標
+    OCR_OPTIONS = {"detail": 0}
+
+    def parse_ocr_text(self, result):
         full_text = " ".join(result)
         full_text = full_text.split("交易明細內容")[-1]
         
@@ -161,7 +180,7 @@ class TBBParser(BankParser):
         # 2. 日期 (支援 2023/05/20 或 112/05/20)
         date_match = full_text.split("摘要")[0].split()[0]
         date_match = re.search(r"(\d{3,4}[/\-]\d{2}[/\-]\d{2})", date_match)
-        if date_match: data["date"] = date_match.group(1)
+        if date_match: data["date"] = try_normalize_date(date_match.group(1))
 
         # 3. 時間
         time_match = full_text.split("摘要")[0].split()[1] + ":00"
@@ -1,15 +1,182 @@
-import easyocr
-import cv2
-import numpy as np
+import os
+import threading
 
-# 全域初始化，確保只載入一次模型
-print("正在載入 OCR 模型...")
-reader = easyocr.Reader(['ch_tra', 'en'], gpu=True)
+# OCR 引擎設定 (模型在第一次辨識時才載入)
+OCR_GPU = os.environ.get("TUQL_OCR_GPU", "1").lower() in ("1", "true", "yes")
+OCR_LANGS = [lang.strip() for lang in os.environ.get("TUQL_OCR_LANGS", "ch_tra,en").split(",") if lang.strip()]
+# CPU 推論使用的 thread 數量，0 表示使用 torch 預設值
+OCR_THREADS = int(os.environ.get("TUQL_OCR_THREADS", "0"))
+# 批次辨識時，辨識模型每次推論的文字區塊數
+OCR_BATCH_SIZE = int(os.environ.get("TUQL_OCR_BATCH_SIZE", "16"))
 
-def preprocess_image(image_bytes):
-    """共用的影像前處理 (轉灰階 + CLAHE)"""
+_reader = None
+_reader_lock = threading.Lock()
+
+def get_reader():
+    """取得 OCR reader，第一次呼叫時才載入模型 (只載入一次)"""
+    global _reader
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                import easyocr
+                if OCR_THREADS:
+                    import torch
+                    torch.set_num_threads(OCR_THREADS)
+                print("正在載入 OCR 模型...")
+                _reader = easyocr.Reader(OCR_LANGS, gpu=OCR_GPU)
+    return _reader
+
+# 截圖前處理的預設值；各解析器以 OCR_PREPROCESS 覆寫，banks_config.json 中各銀行的 "ocr" 可再覆寫
+# 預設不縮小、不裁切 (與原本的辨識輸入相同)；以 benchmarks/ocr_accuracy.py 確認參考集的欄位準確度未下降後，
+# 再於各銀行的設定中開啟 max_width / auto_crop / lines
+# max_width: 截圖寬度超過時等比例縮小到此寬度 (不放大)，0 表示不縮小
+# crop: 只保留 [左, 上, 右, 下] 範圍 (相對於原圖寬高的比例 0~1)，None 表示整張
+# auto_crop: 裁掉四周只有背景色的區域
+# clahe: 是否做對比增強 (CLAHE)
+# lines: 略過文字偵測模型，直接辨識指定的文字行
+#        None: 使用偵測模型；"auto": 以水平投影找出文字行 (適用單色背景、一行一個欄位的版面)；
+#        [[左, 上, 右, 下], ...]: 版面固定時各文字行的範圍 (相對於裁切後影像的比例)
+DEFAULT_PREPROCESS = {
+    "max_width": int(os.environ.get("TUQL_OCR_MAX_WIDTH", "0")),
+    "crop": None,
+    "auto_crop": False,
+    "clahe": True,
+    "lines": None,
+}
+# 與背景色灰階差異超過此值的像素視為文字 (auto_crop / lines="auto")
+INK_THRESHOLD = 48
+# auto_crop 與自動偵測的文字行外圍保留的像素
+CONTENT_MARGIN = 8
+
+def _check_box(box, name):
+    if not (isinstance(box, (list, tuple)) and len(box) == 4
+            and all(isinstance(v, (int, float)) and not isinstance(v, bool) and 0 <= v <= 1 for v in box)
+            and box[0] < box[2] and box[1] < box[3]):
+        raise ValueError(f"{name} 必須為 [左, 上, 右, 下]，數值介於 0~1 且左 < 右、上 < 下")
+
+def validate_preprocess_options(options):
+    """檢查截圖前處理設定 (只需包含要覆寫的項目)，格式錯誤時拋出 ValueError"""
+    if not isinstance(options, dict):
+        raise ValueError("ocr 設定必須為物件")
+    unknown = set(options) - set(DEFAULT_PREPROCESS)
+    if unknown:
+        raise ValueError(f"ocr 設定包含未知項目: {', '.join(sorted(unknown))}")
+    if "max_width" in options:
+        width = options["max_width"]
+        if not isinstance(width, int) or isinstance(width, bool) or width < 0:
+            raise ValueError("ocr.max_width 必須為非負整數")
+    if options.get("crop") is not None:
+        _check_box(options["crop"], "ocr.crop")
+    for key in ("auto_crop", "clahe"):
+        if key in options and not isinstance(options[key], bool):
+            raise ValueError(f"ocr.{key} 必須為 true / false")
+    lines = options.get("lines")
+    if lines is not None and lines != "auto":
+        if not isinstance(lines, list) or not lines:
+            raise ValueError('ocr.lines 必須為 null、"auto" 或文字行範圍的陣列')
+        for box in lines:
+            _check_box(box, "ocr.lines 的每一項")
+
+def _ink_mask(gray):
+    """與背景色 (出現最多的灰階值) 差異明顯的像素"""
+    import numpy as np
+
+    background = int(np.bincount(gray.ravel(), minlength=256).argmax())
+    return np.abs(gray.astype(np.int16) - background) > INK_THRESHOLD
+
+def _spans(flags, min_gap=1):
+    """flags 中連續為 True 的區段 [(開始, 結束)]，間隔不超過 min_gap 的區段會合併"""
+    import numpy as np
+
+    idx = np.flatnonzero(flags)
+    if not len(idx):
+        return []
+    breaks = np.flatnonzero(np.diff(idx) > min_gap)
+    starts = np.concatenate(([idx[0]], idx[breaks + 1]))
+    ends = np.concatenate((idx[breaks], [idx[-1]])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+def _content_box(gray):
+    """包含所有文字像素的範圍 (x0, y0, x1, y1)，整張都是背景時回傳 None"""
+    import numpy as np
+
+    ink = _ink_mask(gray)
+    rows = np.flatnonzero(ink.any(axis=1))
+    cols = np.flatnonzero(ink.any(axis=0))
+    if not len(rows):
+        return None
+    height, width = gray.shape
+    return (max(cols[0] - CONTENT_MARGIN, 0), max(rows[0] - CONTENT_MARGIN, 0),
+            min(cols[-1] + 1 + CONTENT_MARGIN, width), min(rows[-1] + 1 + CONTENT_MARGIN, height))
+
+def detect_text_lines(gray, min_height=6):
+    """
+    以水平投影找出文字行，回傳 easyocr 的 horizontal_list 格式 [[x_min, x_max, y_min, y_max], ...]。
+    高度小於 min_height 的區段 (分隔線、雜點) 會被略過。
+    """
+    ink = _ink_mask(gray)
+    height, width = gray.shape
+    boxes = []
+    for top, bottom in _spans(ink.any(axis=1), min_gap=2):
+        if bottom - top < min_height:
+            continue
+        cols = _spans(ink[top:bottom].any(axis=0))
+        boxes.append([
+            max(cols[0][0] - CONTENT_MARGIN, 0), min(cols[-1][1] + CONTENT_MARGIN, width),
+            max(top - CONTENT_MARGIN // 2, 0), min(bottom + CONTENT_MARGIN // 2, height),
+        ])
+    return boxes
+
+def line_boxes(gray, lines):
+    """依前處理設定的 lines 取得要辨識的文字行 (horizontal_list 格式)，None 表示需使用偵測模型"""
+    if lines is None:
+        return None
+    if lines == "auto":
+        return detect_text_lines(gray)
+    height, width = gray.shape
+    return [
+        [round(left * width), round(right * width), round(top * height), round(bottom * height)]
+        for left, top, right, bottom in lines
+    ]
+
+def preprocess_image(image_bytes, options=None):
+    """
+    共用的影像前處理：解碼為灰階 → 裁切 → 縮小到目標寬度 → 裁掉背景邊界 → CLAHE。
+    options: 前處理設定 (見 DEFAULT_PREPROCESS)，None 表示使用預設值
+    """
+    import cv2
+    import numpy as np
+
+    options = {**DEFAULT_PREPROCESS, **(options or {})}
     nparr = np.frombuffer(image_bytes, np.uint8)
+    # 先解碼為彩色再轉灰階：PNG 直接以 IMREAD_GRAYSCALE 解碼的灰階值與此略有差異 (±1)，會改變辨識輸入
     img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("無法讀取影像")
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-    return clahe.apply(gray)
\ No newline at end of file
+
+    height, width = gray.shape
+    if options["crop"] is not None:
+        left, top, right, bottom = options["crop"]
+        gray = gray[round(top * height):round(bottom * height), round(left * width):round(right * width)]
+        if not gray.size:
+            raise ValueError("裁切範圍內沒有影像")
+
+    # 縮放比例以原圖寬度計算，不論是否裁切，文字縮小的倍數都相同
+    max_width = options["max_width"]
+    if max_width and width > max_width:
+        scale = max_width / width
+        size = (max(round(gray.shape[1] * scale), 1), max(round(gray.shape[0] * scale), 1))
+        gray = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+    if options["auto_crop"]:
+        box = _content_box(gray)
+        if box is not None:
+            x0, y0, x1, y1 = box
+            gray = gray[y0:y1, x0:x1]
+
+    if options["clahe"]:
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+        return clahe.apply(gray)
+    # 裁切後為原陣列的 view，複製一份以釋放整張影像
+    return gray.copy()
@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Request, Response
+from services import asset_service
+from routers.caching import is_not_modified
+
+router = APIRouter()
+
+# 雜湊網址的內容永遠不變，瀏覽器直接使用快取，不再驗證
+IMMUTABLE = "public, max-age=31536000, immutable"
+# 首頁網址固定，每次載入以 ETag 驗證 (未變動時回傳 304)
+REVALIDATE = "no-cache"
+
+def _accepted_encodings(header):
+    """Accept-Encoding 中可接受 (q > 0) 的編碼"""
+    accepted = set()
+    for item in (header or "").split(","):
+        name, _, params = item.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+def asset_response(request: Request, asset, cache_control):
+    headers = {"ETag": asset["etag"], "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if is_not_modified(request, asset["etag"]):
+        return Response(status_code=304, headers=headers)
+
+    body = asset["body"]
+    accepted = _accepted_encodings(request.headers.get("accept-encoding"))
+    for encoding in ("br", "gzip"):
+        if asset[encoding] is not None and encoding in accepted:
+            body = asset[encoding]
+            headers["Content-Encoding"] = encoding
+            break
+    return Response(body, media_type=asset["media_type"], headers=headers)
+
+@router.get("/", include_in_schema=False)
+async def index(request: Request):
+    asset = asset_service.get_index()
+    if asset is None:
+        return Response("index.html not found", status_code=404)
+    return asset_response(request, asset, REVALIDATE)
+
+@router.get("/assets/{path:path}", include_in_schema=False)
+async def get_asset(request: Request, path: str):
+    asset = asset_service.get_asset(path)
+    if asset is None:
+        return Response(status_code=404)
+    return asset_response(request, asset, IMMUTABLE)
@@ -0,0 +1,37 @@
+from fastapi import Request, Response
+from database import run_db
+from services import change_service
+from routers.responses import FastJSONResponse
+
+def make_etag(version):
+    return f'W/"{version}"'
+
+def is_not_modified(request: Request, etag):
+    """比對 If-None-Match (弱比較)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    strip_weak = lambda tag: tag.strip().removeprefix("W/")
+    return strip_weak(etag) in (strip_weak(tag) for tag in header.split(","))
+
+async def conditional_json(request: Request, build):
+    """
+    以資料版本作為 ETag 的 GET 回應：版本未變時回傳 304，否則呼叫 build(version) 產生內容。
+    build 可回傳可序列化的內容，或已建立的 Response (例如 stream_rows 的串流回應)。
+    版本在讀取資料前取得，因此 ETag 永遠不會比內容新。
+    {"success": False, ...} 的錯誤回應不加 ETag，避免之後以 304 沿用快取的錯誤。
+    """
+    version = await run_db(change_service.get_data_version)
+    etag = make_etag(version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    content = await build(version)
+    if isinstance(content, dict) and content.get("success") is False:
+        return FastJSONResponse(content)
+    if isinstance(content, Response):
+        content.headers.update(headers)
+        return content
+    return FastJSONResponse(content, headers=headers)
@@ -0,0 +1,47 @@
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Optional
+import os
+import tempfile
+from services import export_service
+
+router = APIRouter()
+
+@router.get("/api/export")
+async def export_ledger(
+    format: str = "csv",
+    account_id: Optional[int] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+):
+    if format not in export_service.EXPORT_FORMATS:
+        return {"success": False, "message": f"不支援的匯出格式: {format}"}
+
+    filters = {"account_id": account_id, "start_date": start_date, "end_date": end_date}
+    filename = f"ledger.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+    try:
+        if format == "parquet":
+            # Parquet 的 footer 需在最後寫入，先以 row group 寫到暫存檔再串流回傳
+            fd, path = tempfile.mkstemp(suffix=".parquet")
+            os.close(fd)
+            try:
+                await run_in_threadpool(export_service.write_parquet, export_service.iter_rows(**filters), path)
+            except Exception:
+                os.remove(path)
+                raise
+            return FileResponse(
+                path, media_type=export_service.MEDIA_TYPES[format], filename=filename,
+                background=BackgroundTask(os.remove, path)
+            )
+
+        return StreamingResponse(
+            export_service.iter_export(format, **filters),
+            media_type=export_service.MEDIA_TYPES[format],
+            headers=headers
+        )
+    except (ValueError, RuntimeError) as e:
+        return {"success": False, "message": str(e)}
@@ -1,70 +1,208 @@
-from fastapi import APIRouter, UploadFile, File, Form, Body
-from typing import List
-import io
-import parser
-from database import get_db_connection
-from services import transaction_service
+from fastapi import APIRouter, UploadFile, File, Form, Body, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+import asyncio
+import json
+import os
+from starlette.concurrency import run_in_threadpool
+from database import run_db
+from services import transaction_service, account_service, parse_service, ocr_service, cache_service, preview_service, import_job_service
 
 router = APIRouter()
 
 @router.post("/api/pdf-preview")
 async def pdf_preview(
-    file: UploadFile = File(...), 
+    files: List[UploadFile] = File(None),
+    file: UploadFile = File(None),
     password: str = Form(...),
     bank_code: str = Form(...),
-    target_account: str = Form(None) 
+    target_account: str = Form(None),
+    account_id: Optional[int] = Form(None)
 ):
+    """
+    可一次上傳多個 PDF (files)，各檔案在獨立子程序中平行解析。
+    指定 account_id 時，解析結果暫存於伺服器並回傳 preview_token 與各筆是否重複，
+    確認匯入時以 /api/save-batch {"preview_token": ...} 送出即可，不需傳回整份資料。
+    """
+    uploads = (files or []) + ([file] if file else [])
+    if not uploads:
+        return {"success": False, "message": "未上傳檔案"}
+
+    results = await asyncio.gather(
+        *(_parse_upload(upload, password, bank_code, target_account) for upload in uploads),
+        return_exceptions=True
+    )
+
+    data, errors = parse_service.merge_results([upload.filename for upload in uploads], results)
+    if data is None:
+        return {"success": False, "message": f"解析失敗: {'; '.join(errors)}"}
+
+    if account_id:
+        preview = await run_db(preview_service.create_preview, account_id, data["transactions"])
+        data["preview_token"] = preview["token"]
+        data["duplicates"] = preview["duplicates"]
+
+    return {
+        "success": True, 
+        "data": data,
+        "errors": errors
+    }
+
+async def _parse_upload(upload, password, bank_code, target_account):
+    """
+    將上傳的 PDF 落地為暫存檔後交由解析子程序處理 (相同檔案使用快取的解析結果)
+    """
+    await upload.seek(0)
+    path, digest = await run_in_threadpool(parse_service.save_upload, upload.file)
     try:
-        content = await file.read()
-        pdf_stream = io.BytesIO(content)
-        
-        parser_instance = parser.get_parser(bank_code)
-        acc_num, txs = parser_instance.parse_pdf(
-            pdf_stream, 
-            password, 
-            target_account=target_account
-        )
-        
-        return {
-            "success": True, 
-            "data": {
-                "account_number": acc_num,
-                "transactions": txs,
-                "count": len(txs)
-            }
-        }
-    except Exception as e:
-        return {"success": False, "message": f"解析失敗: {str(e)}"}
+        return await parse_service.parse_cached(path, digest, bank_code, password, target_account)
+    finally:
+        os.remove(path)
     
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+async def _iter_ndjson(request: Request):
+    """逐行解析串流上傳的 NDJSON，無法解析的行回傳 None"""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _parse_ndjson_line(line)
+    if buffer.strip():
+        yield _parse_ndjson_line(buffer)
+
+def _parse_ndjson_line(line):
+    try:
+        item = json.loads(line)
+        return item if isinstance(item, dict) else None
+    except ValueError:
+        return None
+
+def _merge_outcome(total, outcome):
+    for key, indexes in outcome.items():
+        total[key].extend(indexes)
+
 @router.post("/api/save-batch")
-async def save_batch(payload: dict = Body(...)):
-    account_id = payload.get("account_id")
-    transactions = payload.get("transactions", [])
-    
-    if not account_id:
-        return {"success": False, "message": "未指定匯入帳戶"}
+async def save_batch(request: Request, account_id: Optional[int] = None):
+    """
+    一般 JSON: {"account_id": 1, "transactions": [...]}
+    預覽 token: {"preview_token": "...", "exclude": [索引], "edits": {"索引": {交易}}}
+    NDJSON 串流: Content-Type: application/x-ndjson，每行一筆交易，帳戶以 ?account_id= 指定
+    """
+    outcome = {"inserted": [], "duplicates": [], "invalid": []}
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+
+    if content_type in NDJSON_TYPES:
+        if not account_id:
+            return {"success": False, "message": "未指定匯入帳戶"}
+
+        # 累積到一個 commit 區塊就寫入，不需將整個上傳內容載入記憶體
+        total = 0
+        pending = []
+        async for tx in _iter_ndjson(request):
+            if tx is None:
+                outcome["invalid"].append(total)
+            else:
+                pending.append((total, tx))
+            total += 1
+            if len(pending) >= transaction_service.BATCH_COMMIT_SIZE:
+                success, result = await _save_rows(account_id, pending)
+                if not success:
+                    return {"success": False, "message": result}
+                _merge_outcome(outcome, result)
+                pending = []
+        if pending:
+            success, result = await _save_rows(account_id, pending)
+            if not success:
+                return {"success": False, "message": result}
+            _merge_outcome(outcome, result)
+        outcome["invalid"].sort()
+    else:
+        try:
+            payload = await request.json()
+        except ValueError:
+            return {"success": False, "message": "資料格式錯誤"}
+        if not isinstance(payload, dict):
+            return {"success": False, "message": "資料格式錯誤"}
+
+        if payload.get("preview_token"):
+            success, result = await run_db(
+                preview_service.save_preview,
+                payload["preview_token"], payload.get("exclude"), payload.get("edits")
+            )
+            if not success:
+                return {"success": False, "message": result}
+            total = result.pop("total")
+            return {
+                "success": True,
+                "message": f"成功匯入 {len(result['inserted'])} 筆 (共 {total} 筆)",
+                **result
+            }
 
-    saved_count = transaction_service.create_transactions_batch(account_id, transactions, "BATCH")
+        account_id = payload.get("account_id")
+        transactions = payload.get("transactions", [])
 
-    return {"success": True, "message": f"成功匯入 {saved_count} 筆 (共 {len(transactions)} 筆)"}
+        if not account_id:
+            return {"success": False, "message": "未指定匯入帳戶"}
+        if not isinstance(transactions, list):
+            return {"success": False, "message": "資料格式錯誤"}
+        total = len(transactions)
+
+        success, outcome = await run_db(transaction_service.create_transactions_batch, account_id, transactions)
+        if not success:
+            return {"success": False, "message": outcome}
+
+    return {
+        "success": True,
+        "message": f"成功匯入 {len(outcome['inserted'])} 筆 (共 {total} 筆)",
+        **outcome
+    }
+
+async def _save_rows(account_id, indexed_rows):
+    """寫入一個區塊的 (原始索引, 交易)，並把結果對應回原始索引；回傳 (成功與否, 結果或錯誤訊息)"""
+    indexes = [i for i, _ in indexed_rows]
+    success, result = await run_db(
+        transaction_service.create_transactions_batch,
+        account_id, [tx for _, tx in indexed_rows]
+    )
+    if not success:
+        return False, result
+    return True, {key: [indexes[i] for i in positions] for key, positions in result.items()}
 
 @router.post("/api/ocr-identify")
 async def ocr_identify(
     files: List[UploadFile] = File(...),
-    bank_code: str = Form(...) 
+    bank_code: str = Form(...),
+    stream: bool = False
 ):
-    results = []
+    """
+    批次辨識多張截圖。
+    stream=true 時以 NDJSON 逐張回傳辨識完成的結果 (依完成順序)：
+    {"index": 上傳順序, "filename": ..., "success": true, "data": {...}} 或 {"success": false, "message": ...}
+    """
+    readers = [file.read for file in files]
+
+    if stream:
+        async def body():
+            async for index, result in ocr_service.iter_recognize(bank_code, readers):
+                item = {"index": index, "filename": files[index].filename}
+                if isinstance(result, Exception):
+                    item.update(success=False, message=str(result))
+                else:
+                    item.update(success=True, data=result)
+                yield (json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8")
+        return StreamingResponse(body(), media_type="application/x-ndjson")
+
+    results = [None] * len(files)
     errors = []
-    
-    parser_instance = parser.get_parser(bank_code)
-    
-    for file in files:
-        try:
-            content = await file.read()
-            data = parser_instance.recognize_screenshot(content)
-            results.append(data)
-        except Exception as e:
-            errors.append(f"{file.filename}: {str(e)}")
+    async for index, result in ocr_service.iter_recognize(bank_code, readers):
+        if isinstance(result, Exception):
+            errors.append(f"{files[index].filename}: {str(result)}")
+        else:
+            results[index] = result
+    results = [data for data in results if data is not None]
             
     if not results and errors:
         return {"success": False, "message": "; ".join(errors)}
@@ -77,32 +215,81 @@ async def ocr_identify(
 
 @router.post("/api/save-manual")
 async def save_manual(payload: dict = Body(...)):
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        
-        target_acc_num = payload.get('account_number', 'Manual-Import')
-        
-        cursor.execute("SELECT account_id FROM accounts WHERE account_number = ?", (target_acc_num,))
-        row = cursor.fetchone()
-        
-        if row:
-            account_id = row[0]
-        else:
-            cursor.execute("INSERT INTO accounts (account_name, account_number) VALUES (?, ?)", 
-                           ("中華郵政(OCR)", target_acc_num))
-            account_id = cursor.lastrowid
-        
-    success, msg = transaction_service.create_transaction(
+    target_acc_num = payload.get('account_number', 'Manual-Import')
+    account_id = await run_db(account_service.get_or_create_account, target_acc_num)
+
+    success, msg = await run_db(
+        transaction_service.create_transaction,
         account_id,
         payload['date'],
         payload['time'],
         payload['summary'],
         payload['ref_no'],
-        payload['amount'],
-        "MANUAL"
+        payload['amount']
     )
     
     if success:
         return {"success": True}
     else:
         return {"success": False, "message": msg or "此筆資料已存在"}
+
+@router.post("/api/import-jobs")
+async def submit_import_job(
+    files: List[UploadFile] = File(...),
+    bank_code: str = Form(...),
+    kind: str = Form("pdf"),
+    password: str = Form(None),
+    target_account: str = Form(None),
+    account_id: Optional[int] = Form(None),
+    auto_save: bool = Form(False)
+):
+    """
+    以背景工作匯入 (可一次排入多份對帳單或截圖)，立即回傳 job_id。
+    進度以 GET /api/import-jobs/{job_id} 輪詢，或 /api/import-jobs/{job_id}/events (SSE) 接收。
+    kind=pdf 且指定 account_id 時，結果含 preview_token；auto_save=true 則直接匯入。
+    """
+    if kind == "pdf" and not password:
+        return {"success": False, "message": "請輸入密碼"}
+    try:
+        job_id = await import_job_service.submit(
+            kind, bank_code, [(upload.filename, upload.file) for upload in files],
+            account_id=account_id, password=password, target_account=target_account, auto_save=auto_save
+        )
+    except ValueError as e:
+        return {"success": False, "message": str(e)}
+    return {"success": True, "data": {"job_id": job_id}}
+
+@router.get("/api/import-jobs")
+async def list_import_jobs(limit: int = 20):
+    return {"success": True, "data": await run_db(import_job_service.list_jobs, limit)}
+
+@router.get("/api/import-jobs/{job_id}")
+async def get_import_job(job_id: str):
+    job = await run_db(import_job_service.get_job, job_id)
+    if job is None:
+        return {"success": False, "message": "找不到匯入工作"}
+    return {"success": True, "data": job}
+
+@router.get("/api/import-jobs/{job_id}/events")
+async def import_job_events(job_id: str):
+    """Server-Sent Events：狀態改變時送出一次工作狀態，工作結束後關閉連線"""
+    async def body():
+        async for job in import_job_service.watch(job_id):
+            if job is None:
+                yield b": ping\n\n"
+            else:
+                yield f"data: {json.dumps(job, ensure_ascii=False)}\n\n".encode("utf-8")
+    return StreamingResponse(
+        body(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/api/import-jobs/{job_id}/cancel")
+async def cancel_import_job(job_id: str):
+    success, msg = await import_job_service.cancel(job_id)
+    return {"success": success, "message": msg}
+
+@router.get("/api/cache-stats")
+async def cache_stats():
+    """解析 / OCR 結果快取的命中統計"""
+    return {"success": True, **(await run_in_threadpool(cache_service.get_stats))}
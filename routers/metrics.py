@@ -0,0 +1,60 @@
+import time
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+import metrics
+
+router = APIRouter()
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _route_label(scope):
+    """以路由樣板作為 label (如 /api/transaction/{tx_id})，避免每個網址各自一組數值"""
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    if scope["path"].startswith("/static/"):
+        return "/static"
+    return "unmatched"
+
+class MetricsMiddleware:
+    """
+    記錄每個請求的耗時 (至回應內容送完為止，包含串流回應)，
+    並收集請求中各階段的耗時；超過 SLOW_REQUEST_MS 時印出各階段明細。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        response = {"status": 500, "streaming": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                headers = dict(message.get("headers") or [])
+                response["streaming"] = headers.get(b"content-type", b"").startswith(b"text/event-stream")
+            await send(message)
+
+        with metrics.collect_stages() as stages:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                elapsed = time.perf_counter() - start
+                route = _route_label(scope)
+                metrics.REQUEST_SECONDS.observe(
+                    elapsed, method=scope["method"], route=route, status=response["status"]
+                )
+                # SSE 連線本來就會持續很久，不列入慢請求
+                if metrics.SLOW_REQUEST_MS and elapsed * 1000 >= metrics.SLOW_REQUEST_MS and not response["streaming"]:
+                    breakdown = ", ".join(
+                        f"{stage}={ms:g}ms" for stage, ms in metrics.summarize_stages(stages).items()
+                    )
+                    print(f"Slow request: {scope['method']} {scope['path']} ({route}) "
+                          f"{response['status']} {elapsed * 1000:.0f}ms [{breakdown or '無階段紀錄'}]")
@@ -0,0 +1,39 @@
+import json
+from fastapi.responses import JSONResponse, StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # orjson 為選用套件，未安裝時使用標準 json
+    orjson = None
+
+def dumps(value):
+    """序列化為 UTF-8 JSON bytes (支援 tuple)"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """直接以 dumps 序列化，不經過 jsonable_encoder"""
+
+    def render(self, content):
+        return dumps(content)
+
+def stream_rows(rows, head=None, tail=None, headers=None):
+    """
+    以 chunked JSON 串流 RowStream：
+        {...head, "columns": [...], "data": [[...], [...]], ...tail()}
+    每批資料列直接由 tuple 序列化後送出，不建立 dict，也不保留整份回應。
+    tail: 資料列讀完後才呼叫，回傳要放在最後的欄位 (例如 next_cursor)
+    """
+    def generate():
+        yield dumps({**(head or {}), "columns": rows.columns})[:-1] + b',"data":['
+        separator = b""
+        for batch in rows:
+            # 去掉外層的 [ ]，各批次以逗號相接
+            yield separator + dumps(batch)[1:-1]
+            separator = b","
+        end = dumps(tail() if tail else {})
+        yield b"]" + (b"," + end[1:] if end != b"{}" else b"}")
+
+    # 同步 generator 由 Starlette 在 thread pool 中迭代，查詢不會阻塞 event loop
+    return StreamingResponse(generate(), media_type="application/json", headers=headers)
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Request
+from typing import Optional
+from database import run_db
+from services import stats_service
+from routers.caching import conditional_json
+
+router = APIRouter()
+
+@router.get("/api/stats")
+async def get_stats(
+    request: Request,
+    month: Optional[str] = None,
+    year: Optional[str] = None,
+    account_id: Optional[int] = None
+):
+    async def build(version):
+        try:
+            data = await run_db(stats_service.get_monthly_stats, month=month, year=year, account_id=account_id)
+            return {"success": True, "data": data}
+        except ValueError as e:
+            return {"success": False, "message": str(e)}
+    return await conditional_json(request, build)
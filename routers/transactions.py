@@ -1,32 +1,70 @@
-from fastapi import APIRouter, Body
-from database import get_db_connection
-from services import transaction_service
+from fastapi import APIRouter, Body, Request
+from typing import Optional
+from database import run_db
+from services import transaction_service, change_service
+from routers.caching import conditional_json
+from routers.responses import stream_rows
 
 router = APIRouter()
 
 @router.get("/api/transactions")
-async def get_transactions():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT t.*, a.account_name FROM transactions t 
-        JOIN accounts a ON t.account_id = a.account_id 
-        ORDER BY t.trans_date DESC, t.trans_time DESC
-    """)
-    data = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return data
+async def get_transactions(
+    request: Request,
+    account_id: Optional[int] = None,
+    month: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    cursor: Optional[str] = None,
+    limit: int = transaction_service.DEFAULT_PAGE_SIZE
+):
+    async def build(version):
+        try:
+            page = transaction_service.list_transactions(
+                account_id=account_id, month=month,
+                start_date=start_date, end_date=end_date,
+                min_amount=min_amount, max_amount=max_amount,
+                cursor=cursor, limit=limit
+            )
+        except ValueError as e:
+            return {"success": False, "message": str(e)}
+        return stream_rows(
+            page, {"success": True, "version": version},
+            lambda: {"next_cursor": transaction_service.next_cursor(page)}
+        )
+    return await conditional_json(request, build)
+
+@router.get("/api/transactions/search")
+async def search_transactions(
+    request: Request,
+    q: str,
+    account_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = transaction_service.DEFAULT_PAGE_SIZE
+):
+    async def build(version):
+        try:
+            page = transaction_service.search_transactions(q, account_id=account_id, cursor=cursor, limit=limit)
+        except ValueError as e:
+            return {"success": False, "message": str(e)}
+        return stream_rows(
+            page, {"success": True}, lambda: {"next_cursor": transaction_service.next_cursor(page)}
+        )
+    return await conditional_json(request, build)
+
+@router.get("/api/changes")
+async def get_changes(since: int = 0, limit: int = change_service.DEFAULT_CHANGE_LIMIT):
+    data = await run_db(change_service.get_changes, since, limit)
+    return {"success": True, **data}
 
 @router.delete("/api/transaction/{tx_id}")
 async def delete_transaction(tx_id: int):
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM transactions WHERE transaction_id = ?", (tx_id,))
-            if cursor.rowcount == 0:
-                return {"success": False, "message": "找不到該筆交易"}
-            conn.commit()
-        return {"success": True}
+        success, msg = await run_db(transaction_service.delete_transaction, tx_id)
+        if success:
+            return {"success": True}
+        return {"success": False, "message": msg}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
@@ -40,7 +78,8 @@ async def edit_transaction(tx_id: int, item: dict = Body(...)):
     account_id = item.get("account_id") 
 
     try:
-        success, msg = transaction_service.update_transaction(
+        success, msg = await run_db(
+            transaction_service.update_transaction,
             tx_id, account_id, date, time, summary, ref_no, amount
         )
         if success:
@@ -60,7 +99,7 @@ async def check_duplicates(payload: dict = Body(...)):
         return {"success": False, "message": "未指定帳戶"}
 
     try:
-        results = transaction_service.check_duplicates(account_id, transactions, exclude_id)
+        results = await run_db(transaction_service.check_duplicates, account_id, transactions, exclude_id)
         return {"success": True, "duplicates": results}
     except Exception as e:
         return {"success": False, "message": str(e)}
@@ -0,0 +1,91 @@
+import sqlite3
+from database import get_db_connection, RowStream
+
+ACCOUNT_FIELDS = (
+    "account_id", "account_name", "account_number", "bank_code", "initial_balance",
+    "balance", "tx_count", "last_trans_date"
+)
+# Balances come from the trigger-maintained account_balances table.
+ACCOUNT_QUERY = """
+    SELECT a.account_id, a.account_name, a.account_number, a.bank_code, a.initial_balance,
+           (a.initial_balance + COALESCE(b.total_amount, 0)) as balance,
+           COALESCE(b.tx_count, 0) as tx_count, b.last_trans_date
+    FROM accounts a
+    LEFT JOIN account_balances b ON a.account_id = b.account_id
+"""
+
+def list_accounts():
+    """
+    Returns all accounts with their current balance.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(ACCOUNT_QUERY)
+        return [dict(row) for row in cursor.fetchall()]
+
+def stream_accounts():
+    """Same rows as list_accounts, as a RowStream of ACCOUNT_FIELDS tuples"""
+    return RowStream(ACCOUNT_QUERY, columns=ACCOUNT_FIELDS)
+
+def create_account(name, number, bank_code, init_balance=0):
+    """
+    Inserts a new account.
+    Returns (True, account_id) or (False, error message).
+    """
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO accounts (account_name, account_number, bank_code, initial_balance)
+                VALUES (?, ?, ?, ?)
+            """, (name, number, bank_code, init_balance))
+            return True, cursor.lastrowid
+    except sqlite3.IntegrityError:
+        return False, "帳戶暱稱已存在"
+
+def update_account(acc_id, name, number, bank_code, init_balance):
+    """
+    Updates an existing account.
+    Returns (success, error message or None).
+    """
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE accounts
+                SET account_name = ?, account_number = ?, bank_code = ?, initial_balance = ?
+                WHERE account_id = ?
+            """, (name, number, bank_code, init_balance, acc_id))
+            return True, None
+    except sqlite3.IntegrityError:
+        return False, "帳戶暱稱已存在"
+
+def delete_account(acc_id):
+    """
+    Deletes an account that has no transactions.
+    Returns (success, error message or None).
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM transactions WHERE account_id = ?", (acc_id,))
+        if cursor.fetchone()[0] > 0:
+            return False, "此帳戶尚有交易資料，無法刪除"
+
+        cursor.execute("DELETE FROM accounts WHERE account_id = ?", (acc_id,))
+        return True, None
+
+def get_or_create_account(account_number, account_name="中華郵政(OCR)"):
+    """
+    Looks up an account by its (short) account number, creating it if missing.
+    Returns account_id.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT account_id FROM accounts WHERE account_number = ?", (account_number,))
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+
+        cursor.execute("INSERT INTO accounts (account_name, account_number) VALUES (?, ?)",
+                       (account_name, account_number))
+        return cursor.lastrowid
@@ -0,0 +1,161 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+
+try:
+    import brotli
+except ImportError:  # brotli 為選用套件，未安裝時只提供 gzip
+    brotli = None
+
+STATIC_DIR = "static"
+INDEX_FILE = "index.html"
+# 加上內容雜湊的檔案以此路徑提供 (內容不變則網址不變，可永久快取)
+ASSET_PREFIX = "/assets/"
+# 開發用：每次取得首頁時檢查 static 目錄是否有變動，有變動就重新建立
+RELOAD = os.environ.get("TUQL_STATIC_RELOAD", "0").lower() in ("1", "true", "yes")
+
+HASH_LENGTH = 10
+# 只有這些類型會改寫內部引用並預先壓縮
+TEXT_EXTENSIONS = (".html", ".js", ".css", ".svg", ".json")
+# 小於此大小的檔案不壓縮
+MIN_COMPRESS_SIZE = 256
+
+# JS 的 import / export ... from，CSS 的 url()，HTML 的 src / href
+JS_IMPORT_PATTERN = re.compile(r"""(\bfrom\s*|\bimport\s*\(?\s*)(['"])([^'"]+)\2""")
+CSS_URL_PATTERN = re.compile(r"""(url\(\s*)(['"]?)([^'")]+)\2""")
+HTML_LINK_PATTERN = re.compile(r"""(\b(?:src|href)=)(['"])([^'"]+)\2""")
+REFERENCE_PATTERNS = {".js": JS_IMPORT_PATTERN, ".css": CSS_URL_PATTERN, ".html": HTML_LINK_PATTERN}
+
+_lock = threading.Lock()
+# assets: {雜湊後的相對路徑: asset}；index: 首頁的 asset；stamp: 建立時 static 目錄的狀態
+_state = {"assets": {}, "index": None, "stamp": None}
+
+def _static_stamp():
+    """static 目錄下所有檔案的 (路徑, mtime, 大小)"""
+    entries = []
+    for root, _, files in os.walk(STATIC_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(entries))
+
+def _make_asset(body, media_type):
+    """預先產生壓縮版本；壓縮後沒有變小的版本不保留"""
+    asset = {
+        "body": body,
+        "media_type": media_type,
+        "etag": f'"{hashlib.sha256(body).hexdigest()[:HASH_LENGTH * 2]}"',
+        "gzip": None,
+        "br": None,
+    }
+    if len(body) >= MIN_COMPRESS_SIZE and media_type.startswith(("text/", "application/", "image/svg")):
+        compressed = gzip.compress(body, compresslevel=9, mtime=0)
+        if len(compressed) < len(body):
+            asset["gzip"] = compressed
+        if brotli is not None:
+            compressed = brotli.compress(body, quality=11)
+            if len(compressed) < len(body):
+                asset["br"] = compressed
+    return asset
+
+def _media_type(path):
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or path.endswith((".js", ".json", ".svg")):
+        media_type += "; charset=utf-8"
+    return media_type
+
+class _Builder:
+    """依引用關係由內而外建立：被引用的檔案先取得雜湊網址，引用它的檔案才能改寫後計算雜湊"""
+
+    def __init__(self):
+        self.assets = {}
+        self.urls = {}
+        self.building = set()
+
+    def resolve(self, ref, base_dir):
+        """引用字串 -> static 目錄內的相對路徑；外部網址或不存在的檔案回傳 None"""
+        path = ref.split("?", 1)[0].split("#", 1)[0]
+        if not path or "://" in path or path.startswith(("data:", "//")):
+            return None
+        if path.startswith("/static/"):
+            path = path[len("/static/"):]
+        elif path.startswith("/"):
+            return None
+        else:
+            path = posixpath.join(base_dir, path)
+        path = posixpath.normpath(path)
+        if path.startswith("..") or not os.path.isfile(os.path.join(STATIC_DIR, path)):
+            return None
+        return path
+
+    def rewrite(self, text, path):
+        pattern = REFERENCE_PATTERNS.get(os.path.splitext(path)[1])
+        if pattern is None:
+            return text
+        base_dir = posixpath.dirname(path)
+
+        def replace(match):
+            target = self.resolve(match.group(3), base_dir)
+            if target is None:
+                return match.group(0)
+            return f"{match.group(1)}{match.group(2)}{self.url(target)}{match.group(2)}"
+        return pattern.sub(replace, text)
+
+    def read(self, path):
+        with open(os.path.join(STATIC_DIR, path), "rb") as f:
+            body = f.read()
+        if path.endswith(TEXT_EXTENSIONS):
+            body = self.rewrite(body.decode("utf-8"), path).encode("utf-8")
+        return body
+
+    def url(self, path):
+        """回傳檔案的雜湊網址 (必要時先建立)"""
+        if path in self.urls:
+            return self.urls[path]
+        if path in self.building:
+            # 循環引用：回頭的那一條改用未加雜湊的網址 (瀏覽器會再驗證，但仍可正常載入)
+            return f"/static/{path}"
+        self.building.add(path)
+        try:
+            body = self.read(path)
+        finally:
+            self.building.discard(path)
+        stem, ext = posixpath.splitext(path)
+        hashed = f"{stem}.{hashlib.sha256(body).hexdigest()[:HASH_LENGTH]}{ext}"
+        self.assets[hashed] = _make_asset(body, _media_type(path))
+        self.urls[path] = ASSET_PREFIX + hashed
+        return self.urls[path]
+
+def build():
+    """
+    讀取 static 目錄，建立首頁引用到的所有檔案 (含遞迴引用) 的雜湊版本與壓縮版本，全部保留在記憶體中。
+    首頁中對 /static/... 的引用改寫為 /assets/<名稱>.<雜湊>.<副檔名>。
+    """
+    stamp = _static_stamp()
+    builder = _Builder()
+    index = None
+    if os.path.isfile(os.path.join(STATIC_DIR, INDEX_FILE)):
+        index = _make_asset(builder.read(INDEX_FILE), "text/html; charset=utf-8")
+    with _lock:
+        _state.update(assets=builder.assets, index=index, stamp=stamp)
+
+def _reload_if_changed():
+    if RELOAD and _static_stamp() != _state["stamp"]:
+        build()
+
+def get_index():
+    """首頁的 asset，static 目錄沒有 index.html 時為 None"""
+    _reload_if_changed()
+    return _state["index"]
+
+def get_asset(path):
+    """雜湊後的相對路徑 (如 'modules/api.1a2b3c4d5e.js') 對應的 asset，不存在時為 None"""
+    return _state["assets"].get(path)
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import threading
+import metrics
+
+# 解析 / OCR 結果的本機快取 (以檔案內容的 SHA-256 等組成 key)
+# 注意：內容為解密後的交易明細 (明文 JSON)，目錄不可提交至版本控制或對外分享
+CACHE_DIR = os.environ.get("TUQL_CACHE_DIR", os.path.join(".cache", "results"))
+# 快取總大小上限 (MB)，超過時刪除最久未使用的項目；0 表示停用快取
+CACHE_MAX_MB = float(os.environ.get("TUQL_CACHE_MAX_MB", "256"))
+# 清理時降到上限的這個比例，避免每次寫入都觸發清理
+EVICT_TARGET_RATIO = 0.9
+
+_lock = threading.Lock()
+# total_bytes 為 None 表示尚未掃描快取目錄
+_state = {"total_bytes": None}
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+def enabled():
+    return CACHE_MAX_MB > 0
+
+def make_key(kind, content_digest, bank_code, parser_version, **params):
+    """
+    kind: 'pdf' / 'ocr'
+    content_digest: 檔案內容的 SHA-256 (hex)
+    params: 其他會影響結果的參數 (如 target_account、password)，None 視為空字串
+    """
+    parts = [kind, content_digest, str(bank_code), str(parser_version)]
+    parts += [f"{name}={'' if value is None else value}" for name, value in sorted(params.items())]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+def _path(key):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.json")
+
+def _iter_entries():
+    """(路徑, 大小, 最後使用時間)"""
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            yield path, stat.st_size, stat.st_mtime
+
+def _total_bytes():
+    """需持有 _lock"""
+    if _state["total_bytes"] is None:
+        _state["total_bytes"] = sum(size for _, size, _ in _iter_entries())
+    return _state["total_bytes"]
+
+def get(key):
+    """回傳快取的結果，不存在時回傳 None"""
+    if not enabled():
+        return None
+    path = _path(key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            value = json.load(f)
+        # 以 mtime 記錄最後使用時間 (LRU)
+        os.utime(path)
+    except (OSError, ValueError):
+        with _lock:
+            _stats["misses"] += 1
+        return None
+    with _lock:
+        _stats["hits"] += 1
+    return value
+
+def put(key, value):
+    """寫入快取 (value 需可轉為 JSON)，寫入後若超過大小上限則清理；寫入失敗時略過"""
+    if not enabled():
+        return
+    path = _path(key)
+    data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        with _lock:
+            total = _total_bytes()
+            try:
+                total -= os.path.getsize(path)
+            except OSError:
+                pass
+            os.replace(tmp_path, path)
+            _state["total_bytes"] = total + len(data)
+            _stats["stores"] += 1
+            if _state["total_bytes"] > CACHE_MAX_MB * 1024 * 1024:
+                _evict(CACHE_MAX_MB * 1024 * 1024 * EVICT_TARGET_RATIO)
+    except OSError as e:
+        print(f"Failed to write result cache: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+def _evict(target_bytes):
+    """刪除最久未使用的項目，直到總大小不超過 target_bytes (需持有 _lock)"""
+    entries = sorted(_iter_entries(), key=lambda entry: entry[2])
+    total = sum(size for _, size, _ in entries)
+    for path, size, _ in entries:
+        if total <= target_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        _stats["evictions"] += 1
+    _state["total_bytes"] = total
+
+def clear():
+    """刪除所有快取項目"""
+    with _lock:
+        for path, _, _ in list(_iter_entries()):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        _state["total_bytes"] = 0
+
+def get_stats():
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else None,
+            "size_bytes": _total_bytes() if enabled() else 0,
+            "max_bytes": int(CACHE_MAX_MB * 1024 * 1024),
+        }
+
+@metrics.register_collector
+def _collect_metrics():
+    stats = get_stats()
+    return [
+        ("tuql_cache_hits_total", "counter", "解析結果快取命中次數", [({}, stats["hits"])]),
+        ("tuql_cache_misses_total", "counter", "解析結果快取未命中次數", [({}, stats["misses"])]),
+        ("tuql_cache_stores_total", "counter", "寫入解析結果快取的次數", [({}, stats["stores"])]),
+        ("tuql_cache_evictions_total", "counter", "因超過容量而刪除的快取筆數", [({}, stats["evictions"])]),
+        ("tuql_cache_size_bytes", "gauge", "解析結果快取目前大小", [({}, stats["size_bytes"])]),
+    ]
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="解析結果快取")
+    arg_parser.add_argument("command", choices=["stats", "clear"])
+    args = arg_parser.parse_args()
+
+    if args.command == "clear":
+        clear()
+        print("快取已清除")
+    else:
+        stats = get_stats()
+        entries = sum(1 for _ in _iter_entries())
+        print(f"{entries} 筆，{stats['size_bytes'] / 1024 / 1024:.1f} / {CACHE_MAX_MB:g} MB")
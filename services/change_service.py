@@ -0,0 +1,63 @@
+from database import get_db_connection
+from services import account_service, transaction_service
+
+# 單次差異同步最多處理的異動筆數
+DEFAULT_CHANGE_LIMIT = 1000
+# 每次 IN (...) 查詢的 ID 數量
+FETCH_CHUNK = 500
+
+def get_data_version():
+    """目前的資料版本 (change_log 最大的 change_id)，資料有任何異動就會遞增"""
+    with get_db_connection() as conn:
+        return conn.execute("SELECT COALESCE(MAX(change_id), 0) FROM change_log").fetchone()[0]
+
+def get_changes(since=0, limit=DEFAULT_CHANGE_LIMIT):
+    """
+    Returns rows inserted, updated or deleted after change_id `since`.
+
+    Result:
+        {"version": <pass as `since` next time>, "has_more": bool,
+         "transactions": [...], "deleted_transactions": [ids],
+         "accounts": [...full account list, only if anything changed] or None,
+         "deleted_accounts": [ids]}
+    """
+    limit = max(1, min(int(limit or DEFAULT_CHANGE_LIMIT), DEFAULT_CHANGE_LIMIT))
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT change_id, table_name, row_id, op FROM change_log
+            WHERE change_id > ?
+            ORDER BY change_id
+            LIMIT ?
+        """, (since, limit + 1))
+        changes = cursor.fetchall()
+
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        version = changes[-1]["change_id"] if changes else since
+
+        upserted_ids = [c["row_id"] for c in changes if c["table_name"] == "transactions" and c["op"] == "upsert"]
+        transactions = []
+        for i in range(0, len(upserted_ids), FETCH_CHUNK):
+            chunk = upserted_ids[i:i + FETCH_CHUNK]
+            cursor.execute(f"""
+                SELECT {transaction_service.TRANSACTION_COLUMNS}, a.account_name FROM transactions t
+                JOIN accounts a ON t.account_id = a.account_id
+                WHERE t.transaction_id IN ({','.join('?' * len(chunk))})
+            """, chunk)
+            transactions.extend(dict(row) for row in cursor.fetchall())
+
+    return {
+        "version": version,
+        "has_more": has_more,
+        "transactions": transactions,
+        "deleted_transactions": [
+            c["row_id"] for c in changes if c["table_name"] == "transactions" and c["op"] == "delete"
+        ],
+        # 帳戶數量少，且交易異動會影響餘額，有異動時直接回傳完整帳戶列表
+        "accounts": account_service.list_accounts() if changes else None,
+        "deleted_accounts": [
+            c["row_id"] for c in changes if c["table_name"] == "accounts" and c["op"] == "delete"
+        ],
+    }
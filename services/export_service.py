@@ -0,0 +1,155 @@
+import csv
+import io
+import json
+import sys
+from database import get_standalone_connection
+from dates import normalize_date, to_day
+
+EXPORT_COLUMNS = (
+    "transaction_id", "account_id", "account_name", "trans_date", "trans_time",
+    "summary", "ref_no", "amount"
+)
+EXPORT_FORMATS = ("csv", "ndjson", "parquet")
+
+# 每次自 cursor 取出的筆數；匯出全程只保留這個數量的資料列在記憶體中
+FETCH_SIZE = 1000
+# Parquet 每個 row group 的筆數
+PARQUET_ROW_GROUP_SIZE = 50000
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+def iter_rows(account_id=None, start_date=None, end_date=None, fetch_size=FETCH_SIZE):
+    """
+    Streams ledger rows (tuples in EXPORT_COLUMNS order), oldest first,
+    straight from a cursor with fetchmany().
+    """
+    conditions = []
+    params = []
+    if account_id is not None:
+        conditions.append("t.account_id = ?")
+        params.append(account_id)
+    if start_date:
+        conditions.append("t.trans_day >= ?")
+        params.append(to_day(normalize_date(start_date)))
+    if end_date:
+        conditions.append("t.trans_day <= ?")
+        params.append(to_day(normalize_date(end_date)))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    query = f"""
+        SELECT t.transaction_id, t.account_id, a.account_name, t.trans_date, t.trans_time,
+               t.summary, t.ref_no, t.amount
+        FROM transactions t
+        JOIN accounts a ON t.account_id = a.account_id
+        {where}
+        ORDER BY t.trans_day, t.trans_time, t.transaction_id
+    """
+    # 參數在呼叫時即驗證，實際查詢延後到開始迭代時
+    return _stream_query(query, tuple(params), fetch_size)
+
+def _stream_query(query, params, fetch_size):
+    with get_standalone_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield tuple(row)
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def iter_csv(rows):
+    """CSV (UTF-8, 含標題列)，每 FETCH_SIZE 筆輸出一個 bytes 區塊"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in _batched(rows, FETCH_SIZE):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def iter_ndjson(rows):
+    """每行一筆 JSON 物件，每 FETCH_SIZE 筆輸出一個 bytes 區塊"""
+    for batch in _batched(rows, FETCH_SIZE):
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n" for row in batch
+        ).encode("utf-8")
+
+def write_parquet(rows, sink):
+    """
+    以 row group 為單位寫入 Parquet (需要 pyarrow)。
+    sink: 檔案路徑或可寫入的二進位檔案物件
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("匯出 Parquet 需要安裝 pyarrow")
+
+    schema = pa.schema([
+        ("transaction_id", pa.int64()),
+        ("account_id", pa.int64()),
+        ("account_name", pa.string()),
+        ("trans_date", pa.string()),
+        ("trans_time", pa.string()),
+        ("summary", pa.string()),
+        ("ref_no", pa.string()),
+        ("amount", pa.float64()),
+    ])
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch in _batched(rows, PARQUET_ROW_GROUP_SIZE):
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                schema=schema
+            ))
+
+def iter_export(fmt, **filters):
+    """依格式回傳 bytes 區塊的 generator (CSV / NDJSON)"""
+    if fmt == "csv":
+        return iter_csv(iter_rows(**filters))
+    if fmt == "ndjson":
+        return iter_ndjson(iter_rows(**filters))
+    raise ValueError(f"不支援串流的匯出格式: {fmt}")
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="匯出交易明細")
+    arg_parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    arg_parser.add_argument("--account-id", type=int)
+    arg_parser.add_argument("--start-date")
+    arg_parser.add_argument("--end-date")
+    arg_parser.add_argument("--output", "-o", help="輸出檔案 (CSV/NDJSON 預設輸出至 stdout)")
+    args = arg_parser.parse_args()
+
+    filters = {"account_id": args.account_id, "start_date": args.start_date, "end_date": args.end_date}
+    if args.format == "parquet":
+        if not args.output:
+            arg_parser.error("Parquet 匯出需指定 --output")
+        write_parquet(iter_rows(**filters), args.output)
+    else:
+        out = open(args.output, "wb") if args.output else sys.stdout.buffer
+        try:
+            for chunk in iter_export(args.format, **filters):
+                out.write(chunk)
+        finally:
+            if args.output:
+                out.close()
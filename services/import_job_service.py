@@ -0,0 +1,370 @@
+import asyncio
+import functools
+import json
+import os
+import shutil
+import time
+import uuid
+from database import get_db_connection, run_db
+from services import parse_service, ocr_service, preview_service
+import metrics
+
+# 同時執行的匯入工作數量 (工作內的 PDF 另受 TUQL_PARSE_WORKERS 限制)
+JOB_WORKERS = int(os.environ.get("TUQL_IMPORT_WORKERS", "2"))
+# 上傳檔案在工作結束前存放的目錄 (含使用者上傳的 PDF 原檔，注意權限與備份)
+JOB_DIR = os.environ.get("TUQL_IMPORT_JOB_DIR", os.path.join(".cache", "jobs"))
+# 已結束的工作紀錄保留天數
+JOB_RETENTION_DAYS = float(os.environ.get("TUQL_IMPORT_JOB_RETENTION_DAYS", "7"))
+# 佇列沒有工作時，worker 重新檢查資料表的間隔 (秒)
+POLL_INTERVAL = 5
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+_workers = []
+# job_id -> 執行中的 asyncio.Task
+_running = {}
+# 已被 worker 取出、但尚未開始執行時收到的取消要求
+_cancel_requested = set()
+# job_id -> asyncio.Event，工作狀態改變時 set (供 watch 等待)
+_changed = {}
+# job_id -> PDF 密碼；只保存在記憶體中，不寫入資料庫 (程式重新啟動後即遺失)
+_passwords = {}
+PASSWORD_LOST = "請重新上傳並輸入密碼"
+_wakeup = None
+
+# ---------- 資料表存取 (於 DB thread 執行) ----------
+
+def _row_to_job(row, private=False):
+    job = {
+        "job_id": row["job_id"],
+        "kind": row["kind"],
+        "status": row["status"],
+        "stage": row["stage"],
+        "done": row["done"],
+        "total": row["total"],
+        "account_id": row["account_id"],
+        "bank_code": row["bank_code"],
+        "error": row["error"],
+        "created_at": row["created_at"],
+        "started_at": row["started_at"],
+        "finished_at": row["finished_at"],
+    }
+    files = json.loads(row["files"])
+    if private:
+        job["files"] = files
+        job["params"] = json.loads(row["params"] or "{}")
+    else:
+        job["files"] = [f["filename"] for f in files]
+    return job
+
+def _insert_job(job_id, kind, bank_code, account_id, files, params):
+    now = int(time.time())
+    with get_db_connection() as conn:
+        conn.execute("""
+            DELETE FROM import_jobs WHERE status IN (?, ?, ?) AND finished_at < ?
+        """, (*FINISHED_STATES, now - int(JOB_RETENTION_DAYS * 86400)))
+        conn.execute("""
+            INSERT INTO import_jobs (job_id, kind, status, total, account_id, bank_code, files, params, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (job_id, kind, QUEUED, len(files), account_id, bank_code,
+              json.dumps(files, ensure_ascii=False), json.dumps(params, ensure_ascii=False), now))
+
+def _claim_next_job():
+    """取出最早排隊的工作並標記為執行中；沒有工作時回傳 None"""
+    with get_db_connection() as conn:
+        row = conn.execute(
+            "SELECT * FROM import_jobs WHERE status = ? ORDER BY rowid LIMIT 1", (QUEUED,)
+        ).fetchone()
+        if not row:
+            return None
+        cursor = conn.execute("""
+            UPDATE import_jobs SET status = ?, started_at = ? WHERE job_id = ? AND status = ?
+        """, (RUNNING, int(time.time()), row["job_id"], QUEUED))
+        if cursor.rowcount == 0:
+            return None
+    return _row_to_job(row, private=True)
+
+def _update_progress(job_id, stage, done, total):
+    with get_db_connection() as conn:
+        conn.execute(
+            "UPDATE import_jobs SET stage = ?, done = ?, total = ? WHERE job_id = ?",
+            (stage, done, total, job_id)
+        )
+
+def _finish_job(job_id, status, result=None, error=None, only_queued=False):
+    """結束工作並清除參數；only_queued 時只處理仍在排隊的工作。回傳是否有更新"""
+    sql = """
+        UPDATE import_jobs SET status = ?, result = ?, error = ?, params = NULL, finished_at = ?
+        WHERE job_id = ?
+    """
+    values = [status, None if result is None else json.dumps(result, ensure_ascii=False),
+              error, int(time.time()), job_id]
+    if only_queued:
+        sql += " AND status = ?"
+        values.append(QUEUED)
+    with get_db_connection() as conn:
+        return conn.execute(sql, values).rowcount > 0
+
+def get_job(job_id):
+    """工作狀態 (含結果)；不存在時回傳 None"""
+    with get_db_connection() as conn:
+        row = conn.execute("SELECT * FROM import_jobs WHERE job_id = ?", (job_id,)).fetchone()
+    if not row:
+        return None
+    job = _row_to_job(row)
+    job["result"] = json.loads(row["result"]) if row["result"] else None
+    return job
+
+def list_jobs(limit=20):
+    """最近的工作 (不含結果)"""
+    with get_db_connection() as conn:
+        rows = conn.execute(
+            "SELECT * FROM import_jobs ORDER BY rowid DESC LIMIT ?", (limit,)
+        ).fetchall()
+    return [_row_to_job(row) for row in rows]
+
+def _recover_jobs():
+    """程式重新啟動時，將上次未完成的工作重新排入佇列"""
+    with get_db_connection() as conn:
+        conn.execute("""
+            UPDATE import_jobs SET status = ?, stage = NULL, done = 0, started_at = NULL
+            WHERE status = ?
+        """, (QUEUED, RUNNING))
+
+# ---------- 狀態通知 ----------
+
+def _notify(job_id):
+    event = _changed.pop(job_id, None)
+    if event:
+        event.set()
+
+def _wake():
+    if _wakeup is not None:
+        _wakeup.set()
+
+async def watch(job_id, heartbeat=15):
+    """
+    狀態有變化時 yield 工作狀態，工作結束 (或不存在) 後停止；
+    超過 heartbeat 秒沒有變化時 yield None (供 SSE 保持連線)
+    """
+    last = None
+    while True:
+        # 先登記再讀取，避免錯過讀取後到等待前的變化
+        changed = _changed.setdefault(job_id, asyncio.Event())
+        job = await run_db(get_job, job_id)
+        if job is None:
+            return
+        if job != last:
+            yield job
+            last = job
+        if job["status"] in FINISHED_STATES:
+            _changed.pop(job_id, None)
+            return
+        try:
+            await asyncio.wait_for(changed.wait(), heartbeat)
+        except asyncio.TimeoutError:
+            yield None
+
+# ---------- 提交與取消 ----------
+
+def _save_files(job_dir, files):
+    saved = []
+    for filename, fileobj in files:
+        suffix = os.path.splitext(filename or "")[1]
+        path, digest = parse_service.save_upload(fileobj, suffix, dir=job_dir)
+        saved.append({"filename": filename, "path": path, "digest": digest})
+    return saved
+
+async def submit(kind, bank_code, files, account_id=None, **params):
+    """
+    建立匯入工作並排入佇列，回傳 job_id。
+    kind: 'pdf' (params: password, target_account, auto_save) 或 'ocr'
+    files: [(檔名, 檔案物件)]，內容會先複製到 JOB_DIR
+    密碼只保存在記憶體中，資料庫只記錄 has_password
+    """
+    if kind not in ("pdf", "ocr"):
+        raise ValueError(f"不支援的工作類型: {kind}")
+    job_id = uuid.uuid4().hex
+    job_dir = os.path.join(JOB_DIR, job_id)
+    loop = asyncio.get_running_loop()
+    if "password" in params:
+        password = params.pop("password")
+        params["has_password"] = bool(password)
+        _passwords[job_id] = password
+    try:
+        os.makedirs(job_dir, exist_ok=True)
+        saved = await loop.run_in_executor(None, _save_files, job_dir, files)
+        await run_db(_insert_job, job_id, kind, bank_code, account_id, saved, params)
+    except BaseException:
+        _passwords.pop(job_id, None)
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+    _wake()
+    return job_id
+
+async def cancel(job_id):
+    """取消排隊中或執行中的工作，回傳 (success, msg)"""
+    task = _running.get(job_id)
+    if task is not None:
+        task.cancel()
+        return True, "已取消"
+
+    if await run_db(_finish_job, job_id, CANCELLED, error="已取消", only_queued=True):
+        _passwords.pop(job_id, None)
+        shutil.rmtree(os.path.join(JOB_DIR, job_id), ignore_errors=True)
+        _notify(job_id)
+        return True, "已取消"
+
+    job = await run_db(get_job, job_id)
+    if job is None:
+        return False, "找不到匯入工作"
+    if job["status"] == RUNNING:
+        # 剛被 worker 取出、尚未開始執行
+        _cancel_requested.add(job_id)
+        return True, "已取消"
+    return False, "工作已結束"
+
+# ---------- 執行 ----------
+
+async def _progress(job_id, stage, done, total):
+    await run_db(_update_progress, job_id, stage, done, total)
+    _notify(job_id)
+
+async def _run_pdf(job):
+    job_id, files, params = job["job_id"], job["files"], job["params"]
+    password = _passwords.get(job_id)
+    if password is None:
+        # 重新啟動前排入的工作：需要密碼的無法繼續
+        if params.get("has_password"):
+            raise RuntimeError(PASSWORD_LOST)
+        password = ""
+    results = [None] * len(files)
+    done = 0
+    await _progress(job_id, "parse", 0, len(files))
+
+    async def parse(index, f):
+        nonlocal done
+        try:
+            results[index] = await parse_service.parse_cached(
+                f["path"], f["digest"], job["bank_code"], password, params.get("target_account")
+            )
+        except Exception as e:
+            results[index] = e
+        done += 1
+        await _progress(job_id, "parse", done, len(files))
+
+    await asyncio.gather(*(parse(index, f) for index, f in enumerate(files)))
+
+    data, errors = parse_service.merge_results([f["filename"] for f in files], results)
+    if data is None:
+        raise RuntimeError(f"解析失敗: {'; '.join(errors)}")
+
+    if job["account_id"]:
+        await _progress(job_id, "preview", 0, 1)
+        preview = await run_db(preview_service.create_preview, job["account_id"], data["transactions"])
+        data["preview_token"] = preview["token"]
+        data["duplicates"] = preview["duplicates"]
+
+        if params.get("auto_save"):
+            await _progress(job_id, "save", 0, 1)
+            success, outcome = await run_db(preview_service.save_preview, preview["token"])
+            if not success:
+                raise RuntimeError(outcome)
+            data["saved"] = outcome
+
+    return {"data": data, "errors": errors}
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+async def _run_ocr(job):
+    job_id, files = job["job_id"], job["files"]
+    loop = asyncio.get_running_loop()
+    readers = [
+        functools.partial(loop.run_in_executor, None, _read_file, f["path"])
+        for f in files
+    ]
+    items = [None] * len(files)
+    done = 0
+    await _progress(job_id, "ocr", 0, len(files))
+
+    async for index, result in ocr_service.iter_recognize(job["bank_code"], readers):
+        item = {"index": index, "filename": files[index]["filename"]}
+        if isinstance(result, Exception):
+            item.update(success=False, message=str(result))
+        else:
+            item.update(success=True, data=result)
+        items[index] = item
+        done += 1
+        await _progress(job_id, "ocr", done, len(files))
+
+    if not any(item["success"] for item in items):
+        raise RuntimeError("; ".join(f"{item['filename']}: {item['message']}" for item in items))
+    return {"data": items}
+
+async def _run_job(job):
+    """結果另附各階段耗時 (stages，毫秒)"""
+    with metrics.collect_stages() as stages:
+        if job["kind"] == "ocr":
+            result = await _run_ocr(job)
+        else:
+            result = await _run_pdf(job)
+    result["stages"] = metrics.summarize_stages(stages)
+    return result
+
+async def _execute(job):
+    job_id = job["job_id"]
+    task = asyncio.create_task(_run_job(job))
+    _running[job_id] = task
+    if job_id in _cancel_requested:
+        task.cancel()
+    try:
+        # 不直接 await task：工作被取消時 worker 本身不應跟著結束
+        await asyncio.wait([task])
+    finally:
+        _running.pop(job_id, None)
+        _cancel_requested.discard(job_id)
+        _passwords.pop(job_id, None)
+
+    if task.cancelled():
+        await run_db(_finish_job, job_id, CANCELLED, error="已取消")
+    elif task.exception() is not None:
+        await run_db(_finish_job, job_id, FAILED, error=str(task.exception()))
+    else:
+        await run_db(_finish_job, job_id, SUCCEEDED, result=task.result())
+    shutil.rmtree(os.path.join(JOB_DIR, job_id), ignore_errors=True)
+    _notify(job_id)
+
+async def _worker():
+    while True:
+        # 先清除再查詢，查詢後才提交的工作仍會喚醒 worker
+        _wakeup.clear()
+        try:
+            job = await run_db(_claim_next_job)
+        except Exception as e:
+            print(f"Failed to claim import job: {e}")
+            job = None
+        if job is None:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await _execute(job)
+
+async def start():
+    """啟動 worker (應用程式啟動時呼叫)"""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    await run_db(_recover_jobs)
+    _workers.extend(asyncio.create_task(_worker()) for _ in range(JOB_WORKERS))
+
+async def stop():
+    """停止 worker 與執行中的工作；未完成的工作下次啟動時會重新執行"""
+    tasks = _workers + list(_running.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _workers.clear()
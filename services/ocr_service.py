@@ -0,0 +1,183 @@
+import asyncio
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from services import cache_service
+import metrics
+
+# thread: 在 web 程序內的專用 thread 執行 OCR
+# process: 在獨立的 OCR 程序執行 (模型只載入在該程序，web 程序不佔用記憶體)
+OCR_WORKER = os.environ.get("TUQL_OCR_WORKER", "thread").lower()
+# 啟動時在背景預先載入 OCR 模型，避免第一次辨識等待
+OCR_WARMUP = os.environ.get("TUQL_OCR_WARMUP", "0").lower() in ("1", "true", "yes")
+# 解碼與前處理影像的 thread 數量 (OpenCV 執行時會釋放 GIL)
+PREPROCESS_WORKERS = int(os.environ.get("TUQL_OCR_PREPROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+# 每次送入 OCR worker 的影像張數
+IMAGE_BATCH_SIZE = int(os.environ.get("TUQL_OCR_IMAGE_BATCH", "8"))
+# 所有請求合計、已讀入但尚未辨識完成的影像上限；額滿時暫停讀取上傳檔案
+QUEUE_SIZE = int(os.environ.get("TUQL_OCR_QUEUE_SIZE", "32"))
+
+_executor = None
+_executor_lock = threading.Lock()
+_preprocess_executor = ThreadPoolExecutor(max_workers=PREPROCESS_WORKERS, thread_name_prefix="tuql-ocr-pre")
+# 每個 event loop 一組名額 (正常執行時整個應用程式只有一個 loop)
+_queue_slots = weakref.WeakKeyDictionary()
+
+def _preprocess(bank_code, image_bytes):
+    import parser
+    with metrics.timer("ocr_preprocess", bank_code):
+        return parser.get_parser(bank_code).preprocess_screenshot(image_bytes)
+
+def _lookup_cache(bank_code, content):
+    """回傳 (快取 key, 快取的辨識結果或 None)"""
+    import parser
+    from parsers.utils import OCR_LANGS
+    bank_parser = parser.get_parser(bank_code)
+    cache_key = cache_service.make_key(
+        "ocr", hashlib.sha256(content).hexdigest(), bank_code, bank_parser.cache_version(),
+        langs=",".join(OCR_LANGS), preprocess=json.dumps(bank_parser.ocr_preprocess, sort_keys=True)
+    )
+    return cache_key, cache_service.get(cache_key)
+
+def _store_cache(entries):
+    for cache_key, value in entries:
+        cache_service.put(cache_key, value)
+
+def _recognize_batch(bank_code, images):
+    """回傳 (辨識結果, 耗時秒數)；process 模式下指標無法跨程序，由呼叫端記錄耗時"""
+    import parser
+    start = time.perf_counter()
+    results = parser.get_parser(bank_code).recognize_batch(images)
+    return results, time.perf_counter() - start
+
+def _load_model():
+    from parsers.utils import get_reader
+    get_reader()
+
+def _get_executor():
+    """第一次使用時才建立 executor (process 模式會在此啟動 OCR 程序)"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                if OCR_WORKER == "process":
+                    _executor = ProcessPoolExecutor(
+                        max_workers=1,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_load_model
+                    )
+                else:
+                    # OCR 模型本身會使用多個 CPU thread，一次只辨識一張
+                    _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tuql-ocr")
+    return _executor
+
+async def iter_recognize(bank_code, readers):
+    """
+    以批次方式辨識多張截圖。
+    readers: 依序讀取各張影像內容的 async 函式 (如 UploadFile.read)
+    依完成順序 yield (索引, 交易資料字典或 Exception)
+
+    影像在前處理 thread 中平行解碼，每 IMAGE_BATCH_SIZE 張組成一批送入 OCR worker
+    (內容相同的影像直接使用快取結果)；
+    佇列額滿 (QUEUE_SIZE) 時暫停讀取，等前面的批次完成後再繼續。
+    """
+    loop = asyncio.get_running_loop()
+    slots = _queue_slots.setdefault(loop, asyncio.Semaphore(QUEUE_SIZE))
+    completed = asyncio.Queue()
+
+    async def run_batch(items):
+        outcome = {}
+        try:
+            images = []
+            for index, cache_key, future in items:
+                try:
+                    images.append((index, cache_key, await future))
+                except Exception as e:
+                    outcome[index] = e
+            if images:
+                results, seconds = await loop.run_in_executor(
+                    _get_executor(),
+                    functools.partial(_recognize_batch, bank_code, [image for _, _, image in images])
+                )
+                metrics.record_stage("ocr_inference", seconds, bank_code)
+                metrics.OCR_IMAGES.inc(len(images), bank_code=bank_code)
+                outcome.update(zip((index for index, _, _ in images), results))
+                await loop.run_in_executor(_preprocess_executor, _store_cache, [
+                    (cache_key, result) for (_, cache_key, _), result in zip(images, results)
+                    if not isinstance(result, Exception)
+                ])
+        except Exception as e:
+            for index, _, _ in items:
+                outcome.setdefault(index, e)
+        finally:
+            for _ in items:
+                slots.release()
+        for item in outcome.items():
+            completed.put_nowait(item)
+
+    async def feed():
+        batch = []
+        try:
+            for index, read in enumerate(readers):
+                if batch and slots.locked():
+                    # 佇列已滿時先送出未滿的批次，避免持有名額的影像一直等不到批次湊滿
+                    batch_tasks.add(asyncio.create_task(run_batch(batch)))
+                    batch = []
+                await slots.acquire()
+                try:
+                    content = await read()
+                    cache_key, cached = await loop.run_in_executor(
+                        _preprocess_executor, _lookup_cache, bank_code, content
+                    )
+                except Exception as e:
+                    slots.release()
+                    completed.put_nowait((index, e))
+                    continue
+                except BaseException:
+                    slots.release()
+                    raise
+                if cached is not None:
+                    slots.release()
+                    completed.put_nowait((index, cached))
+                    continue
+                batch.append((index, cache_key, loop.run_in_executor(
+                    _preprocess_executor, metrics.in_context(_preprocess, bank_code, content)
+                )))
+                if len(batch) >= IMAGE_BATCH_SIZE:
+                    batch_tasks.add(asyncio.create_task(run_batch(batch)))
+                    batch = []
+        finally:
+            # 包含被取消的情況：已取得名額的影像都交給 run_batch，由它歸還名額
+            if batch:
+                batch_tasks.add(asyncio.create_task(run_batch(batch)))
+
+    batch_tasks = set()
+    feeder = asyncio.create_task(feed())
+    # feed 本身發生錯誤時結束等待，避免呼叫端永遠收不到剩餘的結果
+    feeder.add_done_callback(
+        lambda task: task.cancelled() or task.exception() is None
+        or completed.put_nowait((None, task.exception()))
+    )
+    try:
+        for _ in range(len(readers)):
+            index, result = await completed.get()
+            if index is None:
+                raise result
+            yield index, result
+    finally:
+        feeder.cancel()
+
+def warmup():
+    """在背景載入 OCR 模型，不等待完成"""
+    _get_executor().submit(_load_model)
+
+def shutdown():
+    _preprocess_executor.shutdown(wait=False, cancel_futures=True)
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from services import cache_service
+import metrics
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 同時解析的 PDF 數量 (每個工作一個子程序)
+PARSE_WORKERS = int(os.environ.get("TUQL_PARSE_WORKERS", str(os.cpu_count() or 2)))
+# 單一 PDF 的解析時間上限 (秒)，逾時即終止子程序
+PARSE_TIMEOUT = float(os.environ.get("TUQL_PARSE_TIMEOUT", "60"))
+# 子程序可額外使用的記憶體上限 (MB)，0 表示不限制
+PARSE_MEMORY_MB = int(os.environ.get("TUQL_PARSE_MEM_MB", "1024"))
+
+COPY_CHUNK_SIZE = 1024 * 1024
+# 等待子程序結果時，檢查是否被取消的間隔 (秒)
+CANCEL_POLL_INTERVAL = 0.2
+
+# forkserver 先載入解析器模組，之後每個工作由它 fork，不需重新 import
+if "forkserver" in multiprocessing.get_all_start_methods():
+    _context = multiprocessing.get_context("forkserver")
+    _context.set_forkserver_preload(["parsers"])
+else:
+    _context = multiprocessing.get_context("spawn")
+
+# 每個 thread 負責啟動並等待一個解析子程序，thread 數量即同時解析的上限
+_executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="tuql-parse")
+
+def save_upload(fileobj, suffix=".pdf", dir=None):
+    """將上傳檔案複製到暫存檔 (dir 為 None 時使用系統暫存目錄)，回傳 (路徑, 內容的 SHA-256)；呼叫端負責刪除檔案"""
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(suffix=suffix, dir=dir, delete=False) as tmp:
+        while True:
+            chunk = fileobj.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            tmp.write(chunk)
+        return tmp.name, digest.hexdigest()
+
+def _limit_memory(memory_mb):
+    """以目前的虛擬記憶體用量為基準設定 RLIMIT_AS (預先載入的模組不計入上限)"""
+    if not memory_mb or resource is None:
+        return
+    try:
+        with open("/proc/self/statm") as f:
+            base = int(f.read().split()[0]) * resource.getpagesize()
+    except OSError:
+        base = 0
+    limit = base + memory_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+def _parse_worker(conn, path, bank_code, password, kwargs, memory_mb):
+    """
+    子程序進入點：解析結果以 ("ok", (account_number, transactions), {階段: 秒數}) 或 ("error", 訊息) 傳回。
+    開啟 PDF 與擷取文字以外的時間計為 regex_parse。
+    """
+    try:
+        _limit_memory(memory_mb)
+        import parser
+        parser_instance = parser.get_parser(bank_code)
+        with metrics.collect_stages() as stages:
+            start = time.perf_counter()
+            with open(path, "rb") as f:
+                result = parser_instance.parse_pdf(f, password, **kwargs)
+            total = time.perf_counter() - start
+        timings = {stage: seconds for stage, (seconds, _) in stages.items()}
+        timings["regex_parse"] = max(total - sum(timings.values()), 0.0)
+        conn.send(("ok", result, timings))
+    except MemoryError:
+        conn.send(("error", f"超過記憶體上限 ({memory_mb} MB)"))
+    except Exception as e:
+        conn.send(("error", str(e)))
+    finally:
+        conn.close()
+
+def parser_version(bank_code):
+    """解析器版本 (快取 key 用)"""
+    import parser
+    return parser.get_parser(bank_code).cache_version()
+
+def parse_pdf_file(path, bank_code, password, timeout=PARSE_TIMEOUT, cancel=None, **kwargs):
+    """
+    在獨立子程序中解析 PDF 檔案，回傳 (account_number, transactions)。
+    逾時、被取消 (cancel 為 threading.Event)、超過記憶體上限或子程序異常結束時拋出例外，
+    子程序一律會被終止。
+    """
+    recv_conn, send_conn = _context.Pipe(duplex=False)
+    process = _context.Process(
+        target=_parse_worker,
+        args=(send_conn, path, bank_code, password, kwargs, PARSE_MEMORY_MB),
+        daemon=True
+    )
+    process.start()
+    send_conn.close()
+    try:
+        if not _wait_result(recv_conn, timeout, cancel):
+            raise TimeoutError(f"解析逾時 (超過 {timeout:g} 秒)")
+        try:
+            status, result, *timings = recv_conn.recv()
+        except EOFError:
+            process.join(1)
+            raise RuntimeError(f"解析程序異常結束 (exit code {process.exitcode})")
+    finally:
+        recv_conn.close()
+        if process.is_alive():
+            process.kill()
+        process.join()
+
+    if status == "error":
+        raise RuntimeError(result)
+    for stage, seconds in timings[0].items():
+        metrics.record_stage(stage, seconds, bank_code)
+    return result
+
+def _wait_result(conn, timeout, cancel):
+    """等待子程序傳回結果；逾時回傳 False，被取消時拋出 CancelledError"""
+    if cancel is None:
+        return conn.poll(timeout)
+    deadline = time.monotonic() + timeout
+    while not conn.poll(min(CANCEL_POLL_INTERVAL, max(deadline - time.monotonic(), 0))):
+        if cancel.is_set():
+            raise CancelledError("解析已取消")
+        if time.monotonic() >= deadline:
+            return False
+    return True
+
+async def run_parse(path, bank_code, password, **kwargs):
+    """
+    在解析專用的 thread 上執行 parse_pdf_file，超過 PARSE_WORKERS 的工作會排隊等待。
+    呼叫端的 task 被取消時，解析子程序也會一併終止。
+    """
+    loop = asyncio.get_running_loop()
+    cancel = threading.Event()
+    future = loop.run_in_executor(
+        _executor, metrics.in_context(parse_pdf_file, path, bank_code, password, cancel=cancel, **kwargs)
+    )
+    try:
+        return await future
+    except asyncio.CancelledError:
+        cancel.set()
+        raise
+
+async def parse_cached(path, digest, bank_code, password, target_account=None):
+    """
+    解析已落地的 PDF (digest 為 save_upload 回傳的 SHA-256)。
+    相同內容、銀行、目標帳號與密碼的檔案直接使用快取的解析結果。
+    """
+    loop = asyncio.get_running_loop()
+    cache_key = cache_service.make_key(
+        "pdf", digest, bank_code, parser_version(bank_code),
+        target_account=target_account, password=password
+    )
+    cached = await loop.run_in_executor(None, cache_service.get, cache_key)
+    if cached is not None:
+        return cached["account_number"], cached["transactions"]
+
+    acc_num, txs = await run_parse(path, bank_code, password, target_account=target_account)
+    await loop.run_in_executor(None, cache_service.put, cache_key, {"account_number": acc_num, "transactions": txs})
+    return acc_num, txs
+
+def merge_results(filenames, results):
+    """
+    合併多個檔案的解析結果 ((account_number, transactions) 或 Exception)。
+    回傳 (data, errors)；全部失敗時 data 為 None。
+    """
+    account_number = None
+    transactions = []
+    file_results = []
+    errors = []
+    for filename, result in zip(filenames, results):
+        if isinstance(result, Exception):
+            errors.append(f"{filename}: {str(result)}")
+            continue
+        acc_num, txs = result
+        account_number = account_number or acc_num
+        transactions.extend(txs)
+        file_results.append({"filename": filename, "account_number": acc_num, "count": len(txs)})
+
+    if not file_results:
+        return None, errors
+    return {
+        "account_number": account_number,
+        "transactions": transactions,
+        "count": len(transactions),
+        "files": file_results
+    }, errors
+
+def shutdown():
+    """停止接受新的解析工作 (應用程式結束時呼叫)"""
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,82 @@
+import json
+import os
+import secrets
+import time
+from database import get_db_connection
+from services import transaction_service
+
+# 預覽保留時間 (秒)，逾期未匯入即刪除
+PREVIEW_TTL = int(os.environ.get("TUQL_PREVIEW_TTL", "3600"))
+
+def create_preview(account_id, transactions):
+    """
+    將解析結果正規化、計算雜湊後暫存，並標記已存在的交易。
+    回傳 {"token": ..., "duplicates": [bool, ...]} (與 transactions 對應)
+    """
+    rows = []
+    for tx in transactions:
+        try:
+            rows.append(transaction_service.prepare_batch_row(account_id, tx))
+        except transaction_service.INVALID_ROW_ERRORS:
+            rows.append(None)
+
+    token = secrets.token_urlsafe(16)
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM import_previews WHERE created_at < ?", (int(time.time()) - PREVIEW_TTL,))
+        # 雜湊以 hex 存入 JSON，未修改的資料匯入時不需重新計算
+        cursor.execute("""
+            INSERT INTO import_previews (preview_token, account_id, rows, created_at)
+            VALUES (?, ?, ?, ?)
+        """, (token, account_id,
+              json.dumps([[*row[1:-1], row[-1].hex()] if row else None for row in rows], ensure_ascii=False),
+              int(time.time())))
+        found = transaction_service.find_existing_hashes(cursor, [row[-1] for row in rows if row])
+
+    duplicates = [bool(row) and row[-1] in found for row in rows]
+    return {"token": token, "duplicates": duplicates}
+
+def save_preview(token, exclude=None, edits=None):
+    """
+    匯入暫存的預覽。
+    exclude: 不匯入的索引；edits: {索引: 修改後的交易 dict}，只有修改過的資料需重新計算
+    回傳 (True, {"inserted", "duplicates", "invalid", "total"}) 或 (False, 錯誤訊息)
+    """
+    exclude = set(int(i) for i in exclude or [])
+    edits = {int(i): tx for i, tx in (edits or {}).items()}
+
+    with get_db_connection() as conn:
+        row = conn.execute("""
+            SELECT account_id, rows FROM import_previews
+            WHERE preview_token = ? AND created_at >= ?
+        """, (token, int(time.time()) - PREVIEW_TTL)).fetchone()
+    if not row:
+        return False, "預覽已過期或不存在，請重新上傳"
+
+    account_id = row["account_id"]
+    stored_rows = json.loads(row["rows"])
+
+    indexed_rows = []
+    invalid = []
+    for i, values in enumerate(stored_rows):
+        if i in exclude:
+            continue
+        try:
+            if i in edits:
+                indexed_rows.append((i, transaction_service.prepare_batch_row(account_id, edits[i])))
+            elif values is None:
+                invalid.append(i)
+            else:
+                indexed_rows.append((i, (account_id, *values[:-1], bytes.fromhex(values[-1]))))
+        except transaction_service.INVALID_ROW_ERRORS:
+            invalid.append(i)
+
+    success, outcome = transaction_service.insert_batch_rows(indexed_rows)
+    if not success:
+        return False, outcome
+    outcome["invalid"] = invalid
+    outcome["total"] = len(stored_rows) - len(exclude & set(range(len(stored_rows))))
+
+    with get_db_connection() as conn:
+        conn.execute("DELETE FROM import_previews WHERE preview_token = ?", (token,))
+    return True, outcome
@@ -0,0 +1,61 @@
+from database import get_db_connection
+from dates import parse_month
+
+def get_monthly_stats(month=None, year=None, account_id=None):
+    """
+    Returns pre-aggregated totals from the monthly_stats rollup.
+
+    month: 'YYYY-MM' or year: 'YYYY' (month takes precedence); neither means all months.
+    Result:
+        {"income": {"total", "count"}, "expense": {"total", "count"},
+         "rows": [{"month": "YYYY-MM", "account_id", "summary", "is_income", "count", "total"}, ...]}
+    """
+    conditions = []
+    params = []
+
+    if month:
+        y, m = parse_month(month)
+        conditions.append("month = ?")
+        params.append(y * 100 + m)
+    elif year:
+        try:
+            y = int(year)
+        except ValueError:
+            raise ValueError(f"年份格式錯誤: {year}")
+        conditions.append("month BETWEEN ? AND ?")
+        params.extend([y * 100 + 1, y * 100 + 12])
+
+    if account_id is not None:
+        conditions.append("account_id = ?")
+        params.append(account_id)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT month, account_id, summary, is_income, tx_count, total_amount
+            FROM monthly_stats
+            {where}
+            ORDER BY month, account_id, is_income DESC, total_amount
+        """, tuple(params))
+        raw = cursor.fetchall()
+
+    result = {
+        "income": {"total": 0, "count": 0},
+        "expense": {"total": 0, "count": 0},
+        "rows": []
+    }
+    for m, acc_id, summary, is_income, count, total in raw:
+        bucket = result["income" if is_income else "expense"]
+        bucket["total"] += total
+        bucket["count"] += count
+        result["rows"].append({
+            "month": f"{m // 100:04d}-{m % 100:02d}",
+            "account_id": acc_id,
+            "summary": summary,
+            "is_income": bool(is_income),
+            "count": count,
+            "total": total
+        })
+    return result
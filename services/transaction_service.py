@@ -1,20 +1,183 @@
 import hashlib
+import math
+import os
 import sqlite3
-from database import get_db_connection
+import metrics
+from database import get_db_connection, RowStream
+from dates import normalize_date, normalize_time, parse_month, to_day
 
-def compute_transaction_hash(account_id, date, time, ref_no, amount, source_type="MANUAL"):
+def canonical_amount(amount):
+    """金額的標準字串 (100、100.0、"100" 皆為 "100.0")；無法轉為數字時使用原字串"""
+    try:
+        # + 0.0 使 -0.0 與 0.0 相同
+        return repr(float(amount) + 0.0)
+    except (TypeError, ValueError):
+        return str(amount).strip()
+
+def compute_transaction_hash(account_id, date, time, ref_no, amount):
     """
-    Computes a standardized hash for a transaction.
-    Format: source_type|account_id|date|time|ref_no|amount
+    Computes the 16-byte dedup digest (BLAKE2b-128) of a transaction.
+    Format: account_id|date|time|ref_no|amount (amount canonicalized, source type not included)
+    date / time must already be normalized (normalize_date / normalize_time).
     """
-    # Ensure standard string representation and order: ref_no BEFORE amount
-    # Ensure ref_no is string (handle None)
     ref_str = str(ref_no) if ref_no is not None else ""
-    # Ensure amount is string representation of number
-    amount_str = str(amount)
-    
-    raw_id = f"{source_type}|{account_id}|{date}|{time}|{ref_str}|{amount_str}"
-    return hashlib.sha256(raw_id.encode()).hexdigest()
+    raw_id = f"{account_id}|{date}|{time or ''}|{ref_str}|{canonical_amount(amount)}"
+    return hashlib.blake2b(raw_id.encode(), digest_size=16).digest()
+
+# API 回傳的交易欄位 (trace_hash 僅供查重，不回傳)
+TRANSACTION_FIELDS = (
+    "transaction_id", "account_id", "trans_date", "trans_time", "summary", "ref_no", "amount", "trans_day"
+)
+TRANSACTION_COLUMNS = ", ".join(f"t.{name}" for name in TRANSACTION_FIELDS)
+# 列表/搜尋每一列的欄位 (RowStream 的 columns)
+PAGE_FIELDS = TRANSACTION_FIELDS + ("account_name",)
+
+DEFAULT_PAGE_SIZE = 200
+# 串流回應的記憶體用量與頁面大小無關，上限可以設高一些以減少往返次數
+MAX_PAGE_SIZE = 5000
+
+def _month_range(month):
+    """'YYYY-MM' -> (該月第一天, 下個月第一天)，皆為 trans_day 的 yyyymmdd 整數"""
+    y, m = parse_month(month)
+    next_y, next_m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return y * 10000 + m * 100 + 1, next_y * 10000 + next_m * 100 + 1
+
+def encode_cursor(row):
+    """以排序鍵 (日期, 時間, ID) 作為下一頁的 keyset cursor"""
+    return f"{row['trans_day']}|{row['trans_time'] or ''}|{row['transaction_id']}"
+
+def next_cursor(page):
+    """list_transactions / search_transactions 的 RowStream 讀完後，下一頁的 cursor (最後一頁為 None)"""
+    if not page.has_more:
+        return None
+    return encode_cursor(dict(zip(page.columns, page.last_row)))
+
+def decode_cursor(cursor):
+    try:
+        day, time, tx_id = cursor.rsplit('|', 2)
+        return int(day), time, int(tx_id)
+    except ValueError:
+        raise ValueError(f"無效的 cursor: {cursor}")
+
+def list_transactions(account_id=None, month=None, start_date=None, end_date=None,
+                      min_amount=None, max_amount=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Keyset-paginated transaction listing, newest first.
+    Returns a RowStream of PAGE_FIELDS tuples; after it is consumed,
+    next_cursor(page) gives the cursor of the following page (None on the last page).
+    Invalid filters raise ValueError here, before any query runs.
+
+    month: 'YYYY-MM' (takes precedence over start_date/end_date)
+    start_date / end_date: inclusive, any format accepted by dates.normalize_date
+    cursor: value returned as next_cursor by the previous page
+    """
+    conditions = []
+    params = []
+
+    if account_id is not None:
+        conditions.append("t.account_id = ?")
+        params.append(account_id)
+
+    if month:
+        start, end = _month_range(month)
+        conditions.append("t.trans_day >= ? AND t.trans_day < ?")
+        params.extend([start, end])
+    else:
+        if start_date:
+            conditions.append("t.trans_day >= ?")
+            params.append(to_day(normalize_date(start_date)))
+        if end_date:
+            conditions.append("t.trans_day <= ?")
+            params.append(to_day(normalize_date(end_date)))
+
+    if min_amount is not None:
+        conditions.append("t.amount >= ?")
+        params.append(min_amount)
+    if max_amount is not None:
+        conditions.append("t.amount <= ?")
+        params.append(max_amount)
+
+    return _page_stream(conditions, params, cursor, limit)
+
+def _page_stream(conditions, params, cursor, limit, source="transactions t"):
+    """依 (日期, 時間, ID) 由新到舊取得一頁的 RowStream"""
+    limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+    conditions = list(conditions)
+    params = list(params)
+
+    if cursor:
+        conditions.append("(t.trans_day, t.trans_time, t.transaction_id) < (?, ?, ?)")
+        params.extend(decode_cursor(cursor))
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    # 多取一筆用來判斷是否還有下一頁
+    params.append(limit + 1)
+
+    query = f"""
+        SELECT {TRANSACTION_COLUMNS}, a.account_name FROM {source}
+        JOIN accounts a ON t.account_id = a.account_id
+        {where}
+        ORDER BY t.trans_day DESC, t.trans_time DESC, t.transaction_id DESC
+        LIMIT ?
+    """
+    return RowStream(query, params, PAGE_FIELDS, limit)
+
+# trigram 分詞最短可檢索長度；更短的關鍵字改以 LIKE 比對
+FTS_MIN_TERM_LENGTH = 3
+
+def search_transactions(query, account_id=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Full-text search over summary and ref_no, newest first.
+    Whitespace-separated terms are AND-ed; each term matches any substring.
+    Returns a RowStream like list_transactions.
+    """
+    terms = (query or "").split()
+    if not terms:
+        raise ValueError("請輸入搜尋關鍵字")
+
+    conditions = []
+    params = []
+    source = "transactions t"
+
+    fts_terms = [t for t in terms if len(t) >= FTS_MIN_TERM_LENGTH]
+    if fts_terms:
+        source = "transactions_fts f JOIN transactions t ON t.transaction_id = f.rowid"
+        conditions.append("transactions_fts MATCH ?")
+        params.append(" AND ".join('"' + t.replace('"', '""') + '"' for t in fts_terms))
+
+    for term in terms:
+        if len(term) < FTS_MIN_TERM_LENGTH:
+            pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            conditions.append("(t.summary LIKE ? ESCAPE '\\' OR t.ref_no LIKE ? ESCAPE '\\')")
+            params.extend([pattern, pattern])
+
+    if account_id is not None:
+        conditions.append("t.account_id = ?")
+        params.append(account_id)
+
+    return _page_stream(conditions, params, cursor, limit, source)
+
+# 每次 IN (...) 查詢的雜湊數量 (低於 SQLite 參數上限)
+DUPLICATE_CHECK_CHUNK = 500
+
+def find_existing_hashes(cursor, hashes, exclude_tx_id=None):
+    """
+    Returns the subset of `hashes` already stored in transactions,
+    resolved with one chunked IN (...) lookup per DUPLICATE_CHECK_CHUNK hashes.
+    """
+    unique = list(dict.fromkeys(hashes))
+    found = set()
+    with metrics.timer("duplicate_check"):
+        for i in range(0, len(unique), DUPLICATE_CHECK_CHUNK):
+            chunk = unique[i:i + DUPLICATE_CHECK_CHUNK]
+            query = f"SELECT trace_hash FROM transactions WHERE trace_hash IN ({','.join('?' * len(chunk))})"
+            params = list(chunk)
+            if exclude_tx_id:
+                query += " AND transaction_id != ?"
+                params.append(exclude_tx_id)
+            cursor.execute(query, params)
+            found.update(row[0] for row in cursor.fetchall())
+    return found
 
 def check_duplicates(account_id, transactions, exclude_tx_id=None):
     """
@@ -23,70 +186,113 @@ def check_duplicates(account_id, transactions, exclude_tx_id=None):
     
     transactions: list of dicts with keys 'date', 'time', 'ref_no', 'amount'
     """
-    results = []
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        
-        for tx in transactions:
+    hashes = []
+    for tx in transactions:
+        try:
+            date = normalize_date(tx.get('date', ''))
+        except ValueError:
             date = tx.get('date', '')
-            time = tx.get('time', '')
-            ref_no = tx.get('ref_no', '')
-            amount = tx.get('amount', 0)
-            
-            # Check against BATCH format (source_type='BATCH')
-            hash_batch = compute_transaction_hash(account_id, date, time, ref_no, amount, "BATCH")
-            # Check against MANUAL format (source_type='MANUAL')
-            hash_manual = compute_transaction_hash(account_id, date, time, ref_no, amount, "MANUAL")
-            
-            query = """
-                SELECT 1 FROM transactions 
-                WHERE (trace_hash = ? OR trace_hash = ?)
-            """
-            params = [hash_batch, hash_manual]
-            
-            if exclude_tx_id:
-                query += " AND transaction_id != ?"
-                params.append(exclude_tx_id)
-            
-            cursor.execute(query, tuple(params))
-            exists = cursor.fetchone() is not None
-            results.append(exists)
-    return results
+        time = normalize_time(tx.get('time', ''))
+        hashes.append(compute_transaction_hash(account_id, date, time, tx.get('ref_no', ''), tx.get('amount', 0)))
+
+    with get_db_connection() as conn:
+        found = find_existing_hashes(conn.cursor(), hashes, exclude_tx_id)
+    return [t_hash in found for t_hash in hashes]
+
+# 批次匯入每次 commit 的筆數
+BATCH_COMMIT_SIZE = int(os.environ.get("TUQL_BATCH_COMMIT_SIZE", "1000"))
+
+# 無法轉為資料列的交易 (缺欄位、日期格式錯誤等)
+INVALID_ROW_ERRORS = (KeyError, TypeError, AttributeError, ValueError)
+
+def prepare_batch_row(account_id, tx):
+    """
+    將交易 dict 轉為寫入用的欄位 tuple:
+    (account_id, trans_date, trans_time, summary, ref_no, amount, trace_hash)
+    資料不完整 (缺欄位、日期或金額無法轉換) 時拋出 INVALID_ROW_ERRORS 中的例外
+    """
+    date = normalize_date(tx['date'])
+    time = normalize_time(tx.get('time'))
+    amount = float(tx['amount'])
+    # NaN 寫入 SQLite 會變成 NULL
+    if not math.isfinite(amount):
+        raise ValueError(f"金額格式錯誤: {tx['amount']}")
+    t_hash = compute_transaction_hash(account_id, date, time, tx.get('ref_no', ''), amount)
+    return (account_id, date, time, tx.get('summary', ''), tx.get('ref_no', ''), amount, t_hash)
+
+def create_transactions_batch(account_id, transactions, chunk_size=None, start_index=0):
+    """
+    Inserts a list of transactions into the database, committing every `chunk_size` rows.
+    Duplicates (already stored, or repeated within the batch) are skipped.
+
+    Returns (True, per-row outcome as input indexes, offset by start_index):
+        {"inserted": [...], "duplicates": [...], "invalid": [...]}
+    or (False, error message) when the account does not exist.
+    """
+    indexed_rows = []
+    invalid = []
+    for i, tx in enumerate(transactions, start_index):
+        try:
+            indexed_rows.append((i, prepare_batch_row(account_id, tx)))
+        except INVALID_ROW_ERRORS:
+            invalid.append(i)
+
+    success, outcome = insert_batch_rows(indexed_rows, chunk_size)
+    if not success:
+        return False, outcome
+    outcome["invalid"] = invalid
+    return True, outcome
 
-def create_transactions_batch(account_id, transactions, source_type="BATCH"):
+def insert_batch_rows(indexed_rows, chunk_size=None):
     """
-    Inserts a list of transactions into the database.
-    Ignores duplicates silently (via integrity error or check).
-    Returns count of successfully inserted records.
+    寫入 prepare_batch_row 產生的 (索引, 欄位 tuple)，每 chunk_size 筆 commit 一次。
+    回傳 (True, {"inserted": [...], "duplicates": [...]} (索引)) 或 (False, 錯誤訊息)
     """
-    saved_count = 0
+    chunk_size = max(1, chunk_size or BATCH_COMMIT_SIZE)
+    outcome = {"inserted": [], "duplicates": []}
+
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        for tx in transactions:
-            t_hash = compute_transaction_hash(
-                account_id, 
-                tx['date'], 
-                tx['time'], 
-                tx.get('ref_no', ''), 
-                tx['amount'], 
-                source_type
-            )
-            try:
-                cursor.execute("""
-                    INSERT INTO transactions (account_id, trans_date, trans_time, summary, ref_no, amount, trace_hash)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (account_id, tx['date'], tx['time'], tx.get('summary', ''), tx.get('ref_no', ''), tx['amount'], t_hash))
-                saved_count += 1
-            except sqlite3.IntegrityError:
-                continue
-        conn.commit()
-    return saved_count
+        for offset in range(0, len(indexed_rows), chunk_size):
+            rows = indexed_rows[offset:offset + chunk_size]
+
+            # 先取得寫入鎖，確保查重到寫入之間不會有其他連線插入相同雜湊
+            cursor.execute("BEGIN IMMEDIATE")
+            existing = find_existing_hashes(cursor, [values[-1] for _, values in rows])
+
+            to_insert = []
+            for i, values in rows:
+                t_hash = values[-1]
+                if t_hash in existing:
+                    outcome["duplicates"].append(i)
+                else:
+                    existing.add(t_hash)
+                    to_insert.append(values)
+                    outcome["inserted"].append(i)
 
-def create_transaction(account_id, date, time, summary, ref_no, amount, source_type="MANUAL"):
+            with metrics.timer("batch_insert"):
+                try:
+                    cursor.executemany("""
+                        INSERT INTO transactions (account_id, trans_date, trans_time, summary, ref_no, amount, trace_hash)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, to_insert)
+                except sqlite3.IntegrityError:
+                    # 重複的雜湊已在同一交易中排除，欄位也已驗證，剩下的只有帳戶不存在
+                    conn.rollback()
+                    return False, "匯入帳戶不存在"
+                conn.commit()
+    return True, outcome
+
+def create_transaction(account_id, date, time, summary, ref_no, amount):
     """
     Inserts a single transaction.
     """
-    t_hash = compute_transaction_hash(account_id, date, time, ref_no, amount, source_type)
+    try:
+        date = normalize_date(date)
+    except ValueError as e:
+        return False, str(e)
+    time = normalize_time(time)
+    t_hash = compute_transaction_hash(account_id, date, time, ref_no, amount)
     
     with get_db_connection() as conn:
         cursor = conn.cursor()
@@ -100,13 +306,30 @@ def create_transaction(account_id, date, time, summary, ref_no, amount, source_t
         except sqlite3.IntegrityError:
             return False, "Transaction already exists"
 
+def delete_transaction(tx_id):
+    """
+    Deletes a single transaction.
+    Returns (success, error message or None).
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM transactions WHERE transaction_id = ?", (tx_id,))
+        if cursor.rowcount == 0:
+            return False, "找不到該筆交易"
+    return True, None
+
 def update_transaction(tx_id, account_id, date, time, summary, ref_no, amount):
     """
     Updates an existing transaction and re-calculates hash.
     Checks for collisions.
     """
-    # Standardize on consistent hashing (treat edits as MANUAL)
-    new_hash = compute_transaction_hash(account_id, date, time, ref_no, amount, "MANUAL")
+    try:
+        date = normalize_date(date)
+    except ValueError as e:
+        return False, str(e)
+    time = normalize_time(time)
+
+    new_hash = compute_transaction_hash(account_id, date, time, ref_no, amount)
 
     with get_db_connection() as conn:
         cursor = conn.cursor()
@@ -1,6 +1,6 @@
 import { API } from './modules/api.js?v=6';
 import { UI, els } from './modules/ui.js?v=6';
-import { state, getFilteredTransactions } from './modules/state.js?v=6';
+import { state, getTransactionQuery, matchesCurrentView } from './modules/state.js?v=6';
 import * as Utils from './modules/utils.js?v=6';
 
 // --- Initialization ---
@@ -21,7 +21,10 @@ document.addEventListener('DOMContentLoaded', async () => {
     });
 
     els.ocrBatchList.addEventListener('input', (e) => {
-        if (e.target.tagName === 'INPUT') debouncedCheckBatchDuplicates();
+        if (e.target.tagName === 'INPUT') {
+            e.target.closest('.ocr-card').dataset.edited = '1';
+            debouncedCheckBatchDuplicates();
+        }
     });
 
     els.editInputs.forEach(input => {
@@ -49,43 +52,90 @@ async function loadAccounts() {
     }
 }
 
+// 載入全部交易時每頁的筆數 (後端 MAX_PAGE_SIZE；串流回應，頁面大小不影響伺服器記憶體)
+const LOAD_PAGE_SIZE = 5000;
+
 async function loadTransactions() {
     try {
-        const txs = await API.getTransactions();
-        // Normalize dates
-        state.allTransactions = txs.map(tx => ({
-            ...tx,
-            trans_date: Utils.normalizeDate(tx.trans_date)
-        }));
-        
-        // Sort
-        state.allTransactions.sort((a, b) => {
-            if (b.trans_date !== a.trans_date) return b.trans_date.localeCompare(a.trans_date);
-            return (b.trans_time || "").localeCompare(a.trans_time || "");
-        });
-
-        if (!state.currentYearMonth) initMonthPicker();
+        if (!state.currentYearMonth) await initMonthPicker();
+
+        // 依目前月份/帳戶向後端逐頁取得 (keyset cursor)
+        const txs = [];
+        let cursor = null;
+        let version = null;
+        do {
+            const res = await API.getTransactions({ ...getTransactionQuery(), cursor, limit: LOAD_PAGE_SIZE });
+            if (!res.success) throw new Error(res.message);
+            txs.push(...res.data);
+            if (version === null) version = res.version;
+            cursor = res.next_cursor;
+        } while (cursor);
+
+        state.transactions = txs.map(normalizeTx);
+        state.dataVersion = version;
         renderCurrentView();
     } catch (e) {
         UI.showStatus("載入交易失敗", 'error');
     }
 }
 
-// --- View & Navigation ---
+function normalizeTx(tx) {
+    return { ...tx, trans_date: Utils.normalizeDate(tx.trans_date) };
+}
 
-function initMonthPicker() {
-    const today = new Date();
-    const currentYM = Utils.formatDateYM(today);
-    
-    const hasDataCurrentMonth = state.allTransactions.some(tx => {
-        const txYearMonth = tx.trans_date.substring(0, 4) + '-' + tx.trans_date.substring(5, 7);
-        return txYearMonth === currentYM;
-    });
+function compareTx(a, b) {
+    if (b.trans_date !== a.trans_date) return b.trans_date.localeCompare(a.trans_date);
+    if ((b.trans_time || "") !== (a.trans_time || "")) return (b.trans_time || "").localeCompare(a.trans_time || "");
+    return b.transaction_id - a.transaction_id;
+}
 
-    if (hasDataCurrentMonth || state.allTransactions.length === 0) {
-        state.currentYearMonth = currentYM;
-    } else {
-        const lastTxDate = state.allTransactions[0].trans_date;
+// 新增/修改/刪除後只取回版本之後的異動，合併進目前的檢視
+async function syncChanges() {
+    if (state.dataVersion === null) {
+        await loadTransactions();
+        return loadAccounts();
+    }
+    try {
+        let res;
+        do {
+            res = await API.getChanges(state.dataVersion);
+            if (!res.success) throw new Error(res.message);
+
+            const changedIds = new Set([
+                ...res.deleted_transactions,
+                ...res.transactions.map(tx => tx.transaction_id)
+            ]);
+            state.transactions = state.transactions
+                .filter(tx => !changedIds.has(tx.transaction_id))
+                .concat(res.transactions.map(normalizeTx).filter(matchesCurrentView))
+                .sort(compareTx);
+
+            if (res.accounts) {
+                state.accounts = res.accounts;
+                UI.renderAccountCards(res.accounts, state.currentFilterAccountId);
+            }
+            state.dataVersion = res.version;
+        } while (res.has_more);
+        renderCurrentView();
+    } catch (e) {
+        await loadTransactions();
+        loadAccounts();
+    }
+}
+
+// --- View & Navigation ---
+
+async function initMonthPicker() {
+    const currentYM = Utils.formatDateYM(new Date());
+    state.currentYearMonth = currentYM;
+
+    // 本月無資料時，跳到最近一筆交易的月份
+    const [thisMonth, latest] = await Promise.all([
+        API.getTransactions({ month: currentYM, limit: 1 }),
+        API.getTransactions({ limit: 1 })
+    ]);
+    if (thisMonth.success && thisMonth.data.length === 0 && latest.success && latest.data.length > 0) {
+        const lastTxDate = Utils.normalizeDate(latest.data[0].trans_date);
         state.currentYearMonth = lastTxDate.substring(0, 4) + '-' + lastTxDate.substring(5, 7);
     }
     els.monthPicker.value = state.currentYearMonth;
@@ -93,7 +143,7 @@ function initMonthPicker() {
 
 window.handleMonthChange = () => {
     state.currentYearMonth = els.monthPicker.value;
-    renderCurrentView();
+    loadTransactions();
 };
 
 window.changeMonth = (step) => {
@@ -101,20 +151,20 @@ window.changeMonth = (step) => {
     const date = new Date(parseInt(y), parseInt(m) - 1 + step, 1);
     state.currentYearMonth = Utils.formatDateYM(date);
     els.monthPicker.value = state.currentYearMonth;
-    renderCurrentView();
+    loadTransactions();
 };
 
 window.resetToCurrentMonth = () => {
     const today = new Date();
     state.currentYearMonth = Utils.formatDateYM(today);
     els.monthPicker.value = state.currentYearMonth;
-    renderCurrentView();
+    loadTransactions();
 };
 
 window.filterByAccount = (accountId) => {
     state.currentFilterAccountId = accountId;
     loadAccounts(); // Refresh cards to show active state
-    renderCurrentView();
+    loadTransactions();
 };
 
 window.switchView = (view) => {
@@ -123,12 +173,18 @@ window.switchView = (view) => {
     renderCurrentView();
 };
 
-function renderCurrentView() {
-    const filtered = getFilteredTransactions();
+async function renderCurrentView() {
     if (state.currentView === 'details') {
-        UI.renderTxTable(filtered);
-    } else {
-        UI.renderStatsTable(filtered);
+        UI.renderTxTable(state.transactions);
+        return;
+    }
+    // 統計由後端月份彙總表提供，不需依賴明細
+    try {
+        const res = await API.getStats(getTransactionQuery());
+        if (!res.success) throw new Error(res.message);
+        UI.renderStatsTable(res.data);
+    } catch (e) {
+        UI.showStatus("載入統計失敗", 'error');
     }
 }
 
@@ -197,8 +253,7 @@ window.deleteTx = async (id) => {
     if (!confirm("確定刪除？")) return;
     const res = await API.deleteTransaction(id);
     if (res.success) {
-        loadTransactions();
-        loadAccounts(); // Recalculate balance
+        syncChanges(); // 同步交易與帳戶餘額
     } else {
         alert("刪除失敗");
     }
@@ -233,8 +288,8 @@ window.closeEditModal = () => {
 window.submitEdit = async () => {
     const form = UI.getEditFormData();
     
-    // Date/Time logic
-    const date = form.date.replace(/-/g, '/');
+    // Date/Time logic (日期存為 ISO YYYY-MM-DD)
+    const date = form.date;
     let time = form.originalTime || '00:00:00';
     if (form.timeDisplay !== time.substring(0, 5)) {
         time = form.timeDisplay ? form.timeDisplay + ':00' : '00:00:00';
@@ -254,8 +309,7 @@ window.submitEdit = async () => {
         const res = await API.updateTransaction(form.id, payload);
         if (res.success) {
             window.closeEditModal();
-            loadTransactions();
-            loadAccounts();
+            syncChanges();
         } else {
             alert(res.message);
         }
@@ -282,7 +336,7 @@ async function checkEditDuplicate() {
     const form = UI.getEditFormData();
     if (!form.accountId || !form.date || isNaN(form.amount)) return;
 
-    const date = form.date.replace(/-/g, '/');
+    const date = form.date;
     let time = form.originalTime || '00:00:00';
     if (form.timeDisplay !== time.substring(0, 5)) time = form.timeDisplay + ':00';
 
@@ -339,7 +393,6 @@ async function handleConfirmImport() {
     els.fileSelectionModal.style.display = 'none';
 
     if (files[0].type === "application/pdf") {
-        if (files.length > 1) return alert("PDF 請逐一上傳");
         els.pwdModal.style.display = 'block';
         document.getElementById('pdfPwd').value = '';
         document.getElementById('pdfPwd').focus();
@@ -368,30 +421,67 @@ document.getElementById('btnSubmit').onclick = async () => {
     const btn = document.getElementById('btnSubmit');
     btn.disabled = true; btn.innerText = "⏳處理中...";
     els.pwdModal.style.display = 'none';
-    UI.showStatus("正在解析 PDF...");
+    UI.showStatus(`正在上傳 PDF (${els.fileInput.files.length} 個檔案)...`);
 
     try {
+        // 以背景工作解析，可一次排入多份對帳單
         const formData = new FormData();
-        formData.append('file', els.fileInput.files[0]);
+        for (const file of els.fileInput.files) formData.append('files', file);
         formData.append('password', pwd);
         formData.append('bank_code', bankCode);
         formData.append('target_account', targetAccountNum);
-
-        const res = await API.previewPdf(formData);
-        if (res.success) {
-            UI.showStatus("✅ 解析完成", 'success');
-            openOcrBatchModal(res.data.transactions);
+        formData.append('account_id', accountId);
+
+        const submitted = await API.submitImportJob(formData);
+        if (!submitted.success) return UI.showStatus("❌ " + submitted.message, 'error');
+
+        state.importJobId = submitted.data.job_id;
+        els.btnCancelJob.style.display = '';
+        const job = await API.watchImportJob(state.importJobId, showImportJobProgress);
+
+        if (job.status === 'succeeded') {
+            const { data, errors } = job.result;
+            if (errors && errors.length) {
+                UI.showStatus("⚠️ 部分檔案解析失敗: " + errors.join('; '), 'error');
+            } else {
+                UI.showStatus("✅ 解析完成", 'success');
+            }
+            openOcrBatchModal(data.transactions, data);
+        } else if (job.status === 'cancelled') {
+            UI.showStatus("已取消匯入", 'info', true);
         } else {
-            UI.showStatus("❌ " + res.message, 'error');
+            UI.showStatus("❌ " + job.error, 'error');
         }
     } catch (e) {
         UI.showStatus("連線錯誤", 'error');
     } finally {
         state.isPdfUploading = false;
+        state.importJobId = null;
+        els.btnCancelJob.style.display = 'none';
         btn.disabled = false; btn.innerText = "確認上傳";
     }
 };
 
+function showImportJobProgress(job) {
+    if (job.status === 'queued') {
+        UI.showStatus("⏳ 排隊中...");
+    } else if (job.stage === 'parse') {
+        UI.showStatus(`⏳ 正在解析 PDF (${job.done}/${job.total} 個檔案)...`);
+    } else if (job.stage === 'preview') {
+        UI.showStatus("⏳ 正在比對重複資料...");
+    }
+}
+
+window.cancelImportJob = async () => {
+    if (!state.importJobId) return;
+    try {
+        const res = await API.cancelImportJob(state.importJobId);
+        if (!res.success) UI.showStatus("❌ " + res.message, 'error');
+    } catch (e) {
+        UI.showStatus("連線錯誤", 'error');
+    }
+};
+
 document.getElementById('btnCancel').onclick = () => {
     els.pwdModal.style.display = 'none'; els.fileInput.value = '';
 };
@@ -406,20 +496,33 @@ async function handleBatchImageUpload(files) {
     for (let i = 0; i < files.length; i++) formData.append('files', files[i]);
     formData.append('bank_code', targetAccountObj.bank_code);
 
-    UI.showStatus(`⏳ 辨識中 (${files.length} 張)...`);
+    UI.showStatus(`⏳ 辨識中 (0/${files.length} 張)...`);
     
     try {
-        const res = await API.identifyOcr(formData);
-        if (res.success) {
-            UI.showStatus("✅ 辨識完成", 'success');
-            openOcrBatchModal(res.data);
+        // 結果依完成順序回傳，依上傳順序放回
+        const results = new Array(files.length).fill(null);
+        const errors = [];
+        let finished = 0;
+        await API.identifyOcrStream(formData, (item) => {
+            finished++;
+            if (item.success) results[item.index] = item.data;
+            else errors.push(`${item.filename}: ${item.message}`);
+            UI.showStatus(`⏳ 辨識中 (${finished}/${files.length} 張)...`);
+        });
+
+        const items = results.filter(data => data !== null);
+        if (items.length === 0) {
+            UI.showStatus("❌ 辨識失敗: " + errors.join('; '), 'error');
         } else {
-            UI.showStatus("❌ 辨識失敗: " + res.message, 'error');
+            if (errors.length) UI.showStatus("⚠️ 部分圖片辨識失敗: " + errors.join('; '), 'error');
+            else UI.showStatus("✅ 辨識完成", 'success');
+            openOcrBatchModal(items);
         }
     } catch (e) { UI.showStatus("❌ 連線錯誤", 'error'); }
 }
 
-function openOcrBatchModal(items) {
+// preview: pdf-preview 回傳的 {preview_token, duplicates}；OCR 結果沒有預覽 token
+function openOcrBatchModal(items, preview = null) {
     const accountId = state.targetAccountId;
     const targetAccountObj = state.accounts.find(a => a.account_id === accountId);
     const accLabel = targetAccountObj ? `${targetAccountObj.account_name} (${targetAccountObj.account_number})` : '未知帳戶';
@@ -428,13 +531,19 @@ function openOcrBatchModal(items) {
     
     items.forEach(item => item.date = Utils.normalizeDate(item.date));
     UI.renderBatchCards(items);
-    checkBatchDuplicates();
+    state.importPreview = preview && preview.preview_token ? preview.preview_token : null;
+    if (state.importPreview) {
+        UI.updateBatchDuplicates(preview.duplicates);
+    } else {
+        checkBatchDuplicates();
+    }
     els.ocrBatchModal.style.display = 'block';
 }
 
 window.closeOcrBatchModal = () => {
     els.ocrBatchModal.style.display = 'none';
     els.fileInput.value = '';
+    state.importPreview = null;
     UI.clearStatus();
 };
 
@@ -446,39 +555,61 @@ async function checkBatchDuplicates() {
     const accountId = state.targetAccountId;
     if (!accountId) return;
 
-    const transactions = UI.getBatchTransactions();
-    if (transactions.length === 0) return;
+    // 有預覽 token 時，未修改的資料已由伺服器標記，只需重新檢查修改過的卡片
+    const cards = Array.from(document.querySelectorAll('.ocr-card'))
+        .filter(card => !state.importPreview || card.dataset.edited);
+    if (cards.length === 0) return;
 
     try {
         const res = await API.checkDuplicates({
             account_id: accountId,
-            transactions: transactions
+            transactions: cards.map(UI.readBatchCard)
         });
         if (res.success) {
-            UI.updateBatchDuplicates(res.duplicates);
+            cards.forEach((card, i) => UI.setCardDuplicate(card, res.duplicates[i]));
         }
     } catch (e) { console.error(e); }
 }
 
+// 預覽 token 匯入：只送出被移除的索引與修改過的資料
+function buildPreviewPayload() {
+    const cards = Array.from(document.querySelectorAll('.ocr-card'));
+    const kept = new Set(cards.map(card => parseInt(card.dataset.index)));
+    const total = parseInt(els.ocrBatchList.dataset.total);
+    const exclude = [];
+    for (let i = 0; i < total; i++) {
+        if (!kept.has(i)) exclude.push(i);
+    }
+
+    const edits = {};
+    cards.forEach(card => {
+        const tx = UI.readBatchCard(card);
+        if (!tx.date || isNaN(tx.amount)) exclude.push(parseInt(card.dataset.index));
+        else if (card.dataset.edited) edits[card.dataset.index] = tx;
+    });
+    return { preview_token: state.importPreview, exclude, edits, count: total - exclude.length };
+}
+
 window.saveOcrBatch = async () => {
     const accountId = state.targetAccountId;
-    const transactions = UI.getBatchTransactions().filter(t => t.date && !isNaN(t.amount));
+    const payload = state.importPreview ? buildPreviewPayload() : {
+        account_id: parseInt(accountId),
+        transactions: UI.getBatchTransactions().filter(t => t.date && !isNaN(t.amount))
+    };
     
-    if (transactions.length === 0) return alert("無有效資料");
+    if (payload.transactions && payload.transactions.length === 0) return alert("無有效資料");
+    if (payload.preview_token && payload.count === 0) return alert("無有效資料");
+    delete payload.count;
 
     const btn = document.getElementById('btnBatchSave');
     btn.innerText = "⏳ 匯入中..."; btn.disabled = true;
 
     try {
-        const res = await API.saveBatch({
-            account_id: parseInt(accountId),
-            transactions: transactions
-        });
+        const res = await API.saveBatch(payload);
         if (res.success) {
             window.closeOcrBatchModal();
             UI.showStatus("✅ " + res.message, 'success', true);
-            loadTransactions();
-            loadAccounts();
+            syncChanges();
         } else {
             alert(res.message);
         }
@@ -14,8 +14,62 @@ async function request(url, options = {}) {
     }
 }
 
+// Read an NDJSON response line by line, calling onItem for each parsed object
+async function streamNdjson(url, options, onItem) {
+    const res = await fetch(url, options);
+    if (!res.ok) throw new Error(`HTTP error! status: ${res.status}`);
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter(line => line.trim()).forEach(line => onItem(JSON.parse(line)));
+    }
+    if (buffer.trim()) onItem(JSON.parse(buffer));
+}
+
+const FINISHED_JOB_STATES = ['succeeded', 'failed', 'cancelled'];
+
+// Poll an import job once per second until it finishes (fallback when SSE is unavailable)
+async function pollImportJob(jobId, onUpdate) {
+    while (true) {
+        const res = await request(`${API_BASE}/import-jobs/${jobId}`);
+        if (!res.success) throw new Error(res.message);
+        onUpdate(res.data);
+        if (FINISHED_JOB_STATES.includes(res.data.status)) return res.data;
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
+// Row-heavy endpoints send { columns: [...], data: [[...], ...] }; rebuild row objects
+function rowsToObjects(res) {
+    if (res.success && res.columns) {
+        const { columns } = res;
+        res.data = res.data.map(row => {
+            const obj = {};
+            columns.forEach((col, i) => { obj[col] = row[i]; });
+            return obj;
+        });
+    }
+    return res;
+}
+
+function toQuery(params) {
+    const query = new URLSearchParams();
+    Object.entries(params).forEach(([k, v]) => {
+        if (v !== null && v !== undefined && v !== '') query.append(k, v);
+    });
+    const qs = query.toString();
+    return qs ? '?' + qs : '';
+}
+
 export const API = {
-    getAccounts: () => request(`${API_BASE}/accounts`),
+    getAccounts: async () => rowsToObjects(await request(`${API_BASE}/accounts`)).data,
     
     createAccount: (payload) => request(`${API_BASE}/account`, {
         method: 'POST',
@@ -31,7 +85,18 @@ export const API = {
 
     deleteAccount: (id) => request(`${API_BASE}/account/${id}`, { method: 'DELETE' }),
 
-    getTransactions: () => request(`${API_BASE}/transactions`),
+    // params: { account_id, month, start_date, end_date, min_amount, max_amount, cursor, limit }
+    getTransactions: async (params = {}) =>
+        rowsToObjects(await request(`${API_BASE}/transactions${toQuery(params)}`)),
+
+    // params: { q, account_id, cursor, limit }
+    searchTransactions: async (params = {}) =>
+        rowsToObjects(await request(`${API_BASE}/transactions/search${toQuery(params)}`)),
+
+    // params: { month, year, account_id }
+    getStats: (params = {}) => request(`${API_BASE}/stats${toQuery(params)}`),
+
+    getChanges: (since) => request(`${API_BASE}/changes${toQuery({ since })}`),
 
     deleteTransaction: (id) => request(`${API_BASE}/transaction/${id}`, { method: 'DELETE' }),
 
@@ -63,6 +128,36 @@ export const API = {
         body: formData
     }),
 
+    // Streams per-file OCR results ({index, filename, success, data|message}) as they complete
+    identifyOcrStream: (formData, onItem) => streamNdjson(`${API_BASE}/ocr-identify?stream=true`, {
+        method: 'POST',
+        body: formData
+    }, onItem),
+
+    submitImportJob: (formData) => request(`${API_BASE}/import-jobs`, {
+        method: 'POST',
+        body: formData
+    }),
+
+    cancelImportJob: (jobId) => request(`${API_BASE}/import-jobs/${jobId}/cancel`, { method: 'POST' }),
+
+    // Follows a background import job over SSE, calling onUpdate on every change; resolves with the finished job
+    watchImportJob: (jobId, onUpdate) => new Promise((resolve, reject) => {
+        const source = new EventSource(`${API_BASE}/import-jobs/${jobId}/events`);
+        source.onmessage = (e) => {
+            const job = JSON.parse(e.data);
+            onUpdate(job);
+            if (FINISHED_JOB_STATES.includes(job.status)) {
+                source.close();
+                resolve(job);
+            }
+        };
+        source.onerror = () => {
+            source.close();
+            pollImportJob(jobId, onUpdate).then(resolve, reject);
+        };
+    }),
+
     saveManual: (payload) => request(`${API_BASE}/save-manual`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
@@ -1,24 +1,27 @@
 // State Management
 export const state = {
-    allTransactions: [],
+    transactions: [], // 目前檢視 (月份 + 帳戶) 的交易，由後端分頁查詢取得
+    dataVersion: null, // 載入 transactions 時的資料版本，用於差異同步 (/api/changes)
     currentFilterAccountId: null, // null represents 'All'
     isPdfUploading: false,
+    importJobId: null, // 執行中的背景匯入工作
+    importPreview: null, // PDF 預覽的 token (解析結果暫存於伺服器)，OCR 匯入時為 null
     currentYearMonth: "",
     currentView: "details",
     editOriginal: null,
     editDuplicateFlag: false
 };
 
-// Helper: Get transactions based on current filters logic
-export function getFilteredTransactions() {
-    return state.allTransactions.filter(tx => {
-        // 1. Account Filter
-        const matchAccount = state.currentFilterAccountId === null || tx.account_id === state.currentFilterAccountId;
-        // 2. Month Filter
-        if (!tx.trans_date) return false;
-        const txYearMonth = tx.trans_date.substring(0, 4) + '-' + tx.trans_date.substring(5, 7);
-        const matchMonth = txYearMonth === state.currentYearMonth;
-        
-        return matchAccount && matchMonth;
-    });
+// Helper: Does a transaction belong to the current view (month + account)?
+export function matchesCurrentView(tx) {
+    const matchAccount = state.currentFilterAccountId === null || tx.account_id === state.currentFilterAccountId;
+    return matchAccount && (tx.trans_date || '').substring(0, 7) === state.currentYearMonth;
+}
+
+// Helper: Build server-side query params from current filters
+export function getTransactionQuery() {
+    return {
+        account_id: state.currentFilterAccountId,
+        month: state.currentYearMonth
+    };
 }
\ No newline at end of file
@@ -5,6 +5,7 @@ import { state } from './state.js';
 export const els = {
     fileInput: document.getElementById('fileInput'),
     statusMsg: document.getElementById('statusMsg'),
+    btnCancelJob: document.getElementById('btnCancelJob'),
     accountList: document.getElementById('account-list'),
     accountSummary: document.getElementById('account-summary'),
     txTableBody: document.querySelector('#txTable tbody'),
@@ -174,25 +175,17 @@ export const UI = {
         }).join('');
     },
 
-    renderStatsTable: (filteredData) => {
+    // stats: /api/stats 回傳的彙總 (rows 依月份/帳戶/摘要分列，此處依摘要合併)
+    renderStatsTable: (stats) => {
         const incomeMap = {};
         const expenseMap = {};
-        let inc = 0, exp = 0;
+        const inc = stats.income.total, exp = stats.expense.total;
         
-        filteredData.forEach(tx => {
-            const name = tx.summary.trim(); 
-            const amt = tx.amount;
-            if (amt >= 0) {
-                inc += amt;
-                if (!incomeMap[name]) incomeMap[name] = { count: 0, total: 0 };
-                incomeMap[name].count++;
-                incomeMap[name].total += amt;
-            } else {
-                exp += amt;
-                if (!expenseMap[name]) expenseMap[name] = { count: 0, total: 0 };
-                expenseMap[name].count++;
-                expenseMap[name].total += amt; 
-            }
+        stats.rows.forEach(row => {
+            const map = row.is_income ? incomeMap : expenseMap;
+            if (!map[row.summary]) map[row.summary] = { count: 0, total: 0 };
+            map[row.summary].count += row.count;
+            map[row.summary].total += row.total;
         });
 
         if (els.statsIncomeTotal) els.statsIncomeTotal.textContent = `總計：$${inc.toLocaleString()}`;
@@ -273,6 +266,7 @@ export const UI = {
     // --- OCR Batch Logic ---
     renderBatchCards: (items) => {
         els.ocrBatchList.innerHTML = '';
+        els.ocrBatchList.dataset.total = items.length;
         items.forEach((item, index) => {
             const div = document.createElement('div');
             div.className = 'ocr-card';
@@ -282,7 +276,7 @@ export const UI = {
                 <div class="ocr-grid">
                     <div>
                         <label>日期</label>
-                        <input type="text" class="inp-date" value="${item.date || ''}" placeholder="YYYY/MM/DD">
+                        <input type="text" class="inp-date" value="${item.date || ''}" placeholder="YYYY-MM-DD">
                     </div>
                     <div>
                         <label>時間</label>
@@ -306,37 +300,36 @@ export const UI = {
         });
     },
 
+    readBatchCard: (card) => ({
+        date: card.querySelector('.inp-date').value,
+        time: card.querySelector('.inp-time').value,
+        summary: card.querySelector('.inp-summary').value,
+        amount: parseFloat(card.querySelector('.inp-amount').value),
+        ref_no: card.querySelector('.inp-ref').value
+    }),
+
     getBatchTransactions: () => {
-        const cards = document.querySelectorAll('.ocr-card');
-        const transactions = [];
-        cards.forEach(card => {
-            transactions.push({
-                date: card.querySelector('.inp-date').value,
-                time: card.querySelector('.inp-time').value,
-                summary: card.querySelector('.inp-summary').value,
-                amount: parseFloat(card.querySelector('.inp-amount').value),
-                ref_no: card.querySelector('.inp-ref').value
-            });
-        });
-        return transactions;
+        return Array.from(document.querySelectorAll('.ocr-card')).map(UI.readBatchCard);
+    },
+
+    setCardDuplicate: (card, isDuplicate) => {
+        if (isDuplicate) {
+            card.classList.add('duplicate');
+            if (!card.querySelector('.duplicate-badge')) {
+                const badge = document.createElement('div');
+                badge.className = 'duplicate-badge';
+                badge.innerText = '⚠️ 已存在';
+                card.appendChild(badge);
+            }
+        } else {
+            card.classList.remove('duplicate');
+            const badge = card.querySelector('.duplicate-badge');
+            if (badge) badge.remove();
+        }
     },
 
     updateBatchDuplicates: (duplicates) => {
         const cards = document.querySelectorAll('.ocr-card');
-        cards.forEach((card, index) => {
-            if (duplicates[index]) {
-                card.classList.add('duplicate');
-                if (!card.querySelector('.duplicate-badge')) {
-                    const badge = document.createElement('div');
-                    badge.className = 'duplicate-badge';
-                    badge.innerText = '⚠️ 已存在';
-                    card.appendChild(badge);
-                }
-            } else {
-                card.classList.remove('duplicate');
-                const badge = card.querySelector('.duplicate-badge');
-                if (badge) badge.remove();
-            }
-        });
+        cards.forEach((card, index) => UI.setCardDuplicate(card, duplicates[index]));
     }
 };window.UI = UI;
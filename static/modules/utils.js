@@ -20,7 +20,7 @@ export function normalizeDate(dateStr) {
         if (year < 1911) {
             year += 1911;
         }
-        return `${year}/${month}/${day}`;
+        return `${year}-${month}-${day}`;
     }
     return dateStr;
 }
@@ -0,0 +1,24 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import database
+from services import account_service
+from routers import transactions, imports
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """使用暫存資料庫 (已初始化並建立一個帳戶)，結束時關閉連線池中的連線"""
+    monkeypatch.setattr(database, "DB_NAME", str(tmp_path / "finance.db"))
+    database.init_db()
+    success, account_id = account_service.create_account("a", "12345", "700")
+    assert success
+    yield account_id
+    database.pool.close_all()
+
+@pytest.fixture
+def client(db):
+    """只掛載 API router 的測試用 app (不執行 startup，避免關閉共用的 DB executor)"""
+    app = FastAPI()
+    app.include_router(transactions.router)
+    app.include_router(imports.router)
+    return TestClient(app)
@@ -0,0 +1,37 @@
+def _save(client, account_id, ref_no):
+    response = client.post("/api/save-batch", json={"account_id": account_id, "transactions": [
+        {"date": "2024-01-01", "ref_no": ref_no, "amount": 1},
+    ]}).json()
+    assert response["inserted"] == [0]
+
+def test_etag_and_not_modified(client, db):
+    first = client.get("/api/transactions")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    cached = client.get("/api/transactions", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b""
+    assert cached.headers["ETag"] == etag
+    # 強比較形式的 ETag 也視為相同
+    assert client.get("/api/transactions", headers={"If-None-Match": etag[2:]}).status_code == 304
+
+    _save(client, db, "r1")
+    changed = client.get("/api/transactions", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert len(changed.json()["data"]) == 1
+
+def test_error_response_has_no_etag(client, db):
+    response = client.get("/api/transactions", params={"month": "2024-13"})
+    assert response.json()["success"] is False
+    assert "ETag" not in response.headers
+
+def test_changes_since_version(client, db):
+    _save(client, db, "r1")
+    version = client.get("/api/transactions").json()["version"]
+    _save(client, db, "r2")
+
+    changes = client.get("/api/changes", params={"since": version}).json()
+    assert changes["success"]
+    assert [tx["ref_no"] for tx in changes["transactions"]] == ["r2"]
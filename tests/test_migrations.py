@@ -0,0 +1,107 @@
+import sqlite3
+import pytest
+import database
+from services.transaction_service import compute_transaction_hash
+
+# 最初版本 (baseline) 的資料表結構：trace_hash 為 SHA-256 hex，日期為原始字串，沒有 user_version
+BASELINE_SCHEMA = """
+CREATE TABLE accounts (
+    account_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account_name TEXT NOT NULL UNIQUE,
+    account_number TEXT NOT NULL,
+    bank_code TEXT NOT NULL,
+    initial_balance REAL DEFAULT 0.0
+);
+CREATE TABLE transactions (
+    transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account_id INTEGER NOT NULL,
+    trans_date TEXT NOT NULL,
+    trans_time TEXT,
+    summary TEXT,
+    ref_no TEXT,
+    amount REAL NOT NULL,
+    trace_hash TEXT UNIQUE NOT NULL,
+    FOREIGN KEY (account_id) REFERENCES accounts(account_id) ON DELETE CASCADE
+);
+"""
+
+# (日期, 時間, 摘要, 序號, 金額, 來源類型)；最後一筆正規化後與第一筆相同
+BASELINE_ROWS = [
+    ("113/01/01", "10:00", "薪資", "r1", 100, "BATCH"),
+    ("113/01/02", "10:00", "薪資", "r2", 200, "BATCH"),
+    ("2024/02/01", "09:00", "手動轉帳", "m1", -50, "MANUAL"),
+    ("2024-01-01", "10:00:00", "重複", "r1", 100, "MANUAL"),
+]
+
+@pytest.fixture
+def baseline_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "finance.db")
+    with sqlite3.connect(path) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+        conn.execute("INSERT INTO accounts (account_name, account_number, bank_code) VALUES ('a', '12345', '700')")
+        for date, time, summary, ref_no, amount, source_type in BASELINE_ROWS:
+            conn.execute("""
+                INSERT INTO transactions (account_id, trans_date, trans_time, summary, ref_no, amount, trace_hash)
+                VALUES (1, ?, ?, ?, ?, ?, ?)
+            """, (date, time, summary, ref_no, amount,
+                  database._legacy_trace_hash(1, date, time, ref_no, amount, source_type)))
+    conn.close()
+    monkeypatch.setattr(database, "DB_NAME", path)
+    return path
+
+def test_upgrade_from_baseline(baseline_db):
+    database.init_db()
+    # 再次啟動不應重新執行 migration
+    database.init_db()
+
+    conn = sqlite3.connect(baseline_db)
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == database.SCHEMA_VERSION
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+        rows = conn.execute("""
+            SELECT transaction_id, trans_date, trans_time, ref_no, amount, trace_hash, trans_day
+            FROM transactions ORDER BY transaction_id
+        """).fetchall()
+        assert [row[1] for row in rows] == ["2024-01-01", "2024-01-02", "2024-02-01", "2024-01-01"]
+        assert rows[0][5] == compute_transaction_hash(1, "2024-01-01", "10:00:00", "r1", 100)
+        # 正規化後重複的交易保留，改用獨立雜湊
+        assert rows[3][5] != rows[0][5] and len(rows[3][5]) == 16
+        assert rows[2][6] == 20240201
+
+        assert database.verify_account_balances(conn) == []
+        assert conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0] == 5
+        assert conn.execute(
+            "SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH '手動轉'"
+        ).fetchall() == [(3,)]
+    finally:
+        conn.close()
+
+def test_failed_migration_rolls_back(baseline_db, monkeypatch):
+    def broken(conn):
+        conn.execute("DELETE FROM transactions")
+        raise RuntimeError("broken migration")
+
+    target, _ = database.MIGRATIONS[2]
+    migrations = list(database.MIGRATIONS)
+    migrations[2] = (target, broken)
+    monkeypatch.setattr(database, "MIGRATIONS", migrations)
+    with pytest.raises(RuntimeError):
+        database.init_db()
+
+    conn = sqlite3.connect(baseline_db)
+    try:
+        # 失敗的步驟完全還原，之前的步驟已提交
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == target - 1
+        assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == len(BASELINE_ROWS)
+    finally:
+        conn.close()
+
+    # 修正後重新啟動即可繼續升級
+    monkeypatch.undo()
+    monkeypatch.setattr(database, "DB_NAME", baseline_db)
+    database.init_db()
+    conn = sqlite3.connect(baseline_db)
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == database.SCHEMA_VERSION
+    finally:
+        conn.close()
@@ -0,0 +1,57 @@
+import database
+from services import preview_service, transaction_service
+
+def _tx(date, ref_no, amount):
+    return {"date": date, "time": "10:00", "summary": "s", "ref_no": ref_no, "amount": amount}
+
+def _stored(account_id):
+    with database.get_db_connection() as conn:
+        return conn.execute(
+            "SELECT ref_no, amount FROM transactions WHERE account_id = ? ORDER BY transaction_id", (account_id,)
+        ).fetchall()
+
+def test_save_preview_with_exclude_and_edits(client, db):
+    success, _ = transaction_service.create_transactions_batch(db, [_tx("2024-01-04", "r3", 30)])
+    assert success
+
+    preview = preview_service.create_preview(db, [
+        _tx("2024-01-01", "r0", 10),
+        _tx("2024-01-02", "r1", 20),
+        _tx("2024-01-03", "r2", None),
+        _tx("2024/01/04", "r3", "30"),
+        _tx("2024-01-05", "r4", 40),
+    ])
+    assert preview["duplicates"] == [False, False, False, True, False]
+
+    response = client.post("/api/save-batch", json={
+        "preview_token": preview["token"],
+        "exclude": [1],
+        # JSON 物件的 key 為字串
+        "edits": {"2": _tx("2024-01-03", "r2", 25), "4": _tx("2024-01-05", "r4", 45)},
+    }).json()
+    assert response["success"]
+    assert response["inserted"] == [0, 2, 4]
+    assert response["duplicates"] == [3]
+    assert response["invalid"] == []
+    assert response["message"] == "成功匯入 3 筆 (共 4 筆)"
+    assert [tuple(row) for row in _stored(db)] == [("r3", 30), ("r0", 10), ("r2", 25), ("r4", 45)]
+
+    # 未修改的資料直接使用預覽時的雜湊，之後的查重仍然一致
+    assert transaction_service.check_duplicates(db, [_tx("2024-01-01", "r0", 10)]) == [True]
+
+    # 匯入後預覽即刪除
+    again = client.post("/api/save-batch", json={"preview_token": preview["token"]}).json()
+    assert again["success"] is False
+
+def test_invalid_rows_stay_invalid(client, db):
+    preview = preview_service.create_preview(db, [_tx("2024-01-01", "r0", 10), _tx("bad", "r1", 1)])
+    response = client.post("/api/save-batch", json={"preview_token": preview["token"]}).json()
+    assert response["inserted"] == [0]
+    assert response["invalid"] == [1]
+
+def test_expired_preview(client, db, monkeypatch):
+    preview = preview_service.create_preview(db, [_tx("2024-01-01", "r0", 10)])
+    monkeypatch.setattr(preview_service, "PREVIEW_TTL", -1)
+    response = client.post("/api/save-batch", json={"preview_token": preview["token"]}).json()
+    assert response == {"success": False, "message": "預覽已過期或不存在，請重新上傳"}
+    assert _stored(db) == []
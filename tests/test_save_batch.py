@@ -0,0 +1,58 @@
+import json
+import database
+
+def _count(account_id):
+    with database.get_db_connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM transactions WHERE account_id = ?", (account_id,)).fetchone()[0]
+
+def test_per_row_outcome(client, db):
+    response = client.post("/api/save-batch", json={"account_id": db, "transactions": [
+        {"date": "2024-01-01", "time": "10:00", "ref_no": "r1", "amount": 100},
+        {"date": "2024-01-01", "time": "10:00", "ref_no": "r1", "amount": None},
+        {"date": "2024-01-01", "time": "10:00", "ref_no": "r1", "amount": "abc"},
+        {"date": "not a date", "ref_no": "r2", "amount": 1},
+        # 與第一筆正規化後相同
+        {"date": "113/01/01", "time": "10:00:00", "ref_no": "r1", "amount": "100"},
+        {"date": "2024-01-02", "ref_no": "r3", "amount": -5},
+        "not an object",
+    ]}).json()
+    assert response["success"]
+    assert response["inserted"] == [0, 5]
+    assert response["duplicates"] == [4]
+    assert response["invalid"] == [1, 2, 3, 6]
+    assert _count(db) == 2
+
+    # 再次送出相同資料全部為重複
+    again = client.post("/api/save-batch", json={"account_id": db, "transactions": [
+        {"date": "2024-01-01", "time": "10:00", "ref_no": "r1", "amount": 100},
+    ]}).json()
+    assert again["inserted"] == [] and again["duplicates"] == [0]
+
+def test_ndjson_outcome(client, db):
+    lines = [
+        {"date": "2024-01-01", "ref_no": "n1", "amount": 1},
+        None,
+        {"date": "2024-01-01", "ref_no": "n1", "amount": 1},
+        {"date": "2024-01-02", "ref_no": "n2"},
+    ]
+    body = b"\n".join(json.dumps(line).encode() for line in lines) + b"\n{broken\n"
+    response = client.post(
+        f"/api/save-batch?account_id={db}", content=body, headers={"Content-Type": "application/x-ndjson"}
+    ).json()
+    assert response["success"]
+    assert response["inserted"] == [0]
+    assert response["duplicates"] == [2]
+    assert response["invalid"] == [1, 3, 4]
+
+def test_unknown_account(client, db):
+    response = client.post("/api/save-batch", json={"account_id": db + 1, "transactions": [
+        {"date": "2024-01-01", "amount": 1},
+    ]}).json()
+    assert response == {"success": False, "message": "匯入帳戶不存在"}
+
+def test_malformed_body(client, db):
+    assert client.post("/api/save-batch", json=[1, 2]).json()["success"] is False
+    assert client.post("/api/save-batch", json={"account_id": db, "transactions": {"a": 1}}).json()["success"] is False
+    assert client.post(
+        "/api/save-batch", content=b"{broken", headers={"Content-Type": "application/json"}
+    ).json()["success"] is False
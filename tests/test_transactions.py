@@ -0,0 +1,56 @@
+import pytest
+from services import transaction_service
+
+def _tx(date, time, ref_no, amount=100):
+    return {"date": date, "time": time, "summary": "s", "ref_no": ref_no, "amount": amount}
+
+def _insert(account_id, transactions):
+    success, outcome = transaction_service.create_transactions_batch(account_id, transactions)
+    assert success and len(outcome["inserted"]) == len(transactions)
+
+def _read_page(**kwargs):
+    page = transaction_service.list_transactions(**kwargs)
+    rows = [dict(zip(page.columns, row)) for batch in page for row in batch]
+    return rows, transaction_service.next_cursor(page)
+
+def _read_all(limit, **kwargs):
+    pages = []
+    cursor = None
+    while True:
+        rows, cursor = _read_page(cursor=cursor, limit=limit, **kwargs)
+        pages.append(rows)
+        if cursor is None:
+            return pages
+
+def test_cursor_round_trip(db):
+    _insert(db, [_tx(f"2024-01-{day:02d}", "10:00", f"r{day}") for day in range(1, 8)])
+
+    pages = _read_all(limit=3)
+    assert [len(rows) for rows in pages] == [3, 3, 1]
+    dates = [row["trans_date"] for rows in pages for row in rows]
+    assert dates == [f"2024-01-{day:02d}" for day in range(7, 0, -1)]
+
+def test_has_more_uses_extra_row(db):
+    _insert(db, [_tx(f"2024-01-{day:02d}", "10:00", f"r{day}") for day in range(1, 5)])
+
+    # 剛好一頁：多取的一筆不存在，沒有下一頁
+    rows, cursor = _read_page(limit=4)
+    assert len(rows) == 4 and cursor is None
+
+    rows, cursor = _read_page(limit=3)
+    assert len(rows) == 3 and cursor == transaction_service.encode_cursor(rows[-1])
+    rows, cursor = _read_page(limit=3, cursor=cursor)
+    assert [row["trans_date"] for row in rows] == ["2024-01-01"] and cursor is None
+
+def test_same_date_and_time_ordered_by_id(db):
+    _insert(db, [_tx("2024-01-01", "10:00", f"r{i}") for i in range(5)])
+    _insert(db, [_tx("2024-01-02", "09:00", "later")])
+
+    pages = _read_all(limit=2, month="2024-01")
+    ids = [row["transaction_id"] for rows in pages for row in rows]
+    # 日期、時間相同時以 transaction_id 排序，換頁不會重複或遺漏
+    assert ids == [6, 5, 4, 3, 2, 1]
+
+def test_invalid_cursor(db):
+    with pytest.raises(ValueError):
+        transaction_service.list_transactions(cursor="abc")